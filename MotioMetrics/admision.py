@@ -0,0 +1,118 @@
+# admision.py
+# Control de admisión para /api/analizar_datos
+# Con un único worker eventlet, muchos análisis simultáneos vuelven lentos a todos
+# (y también a la ingesta en vivo). Acá se limita cuántos corren a la vez, cuántos
+# pueden esperar, y se rechaza rápido (503 + Retry-After) al resto.
+
+import os
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# Configuración (se puede cambiar por variables de entorno en Render)
+MAX_ANALISIS_CONCURRENTES = int(os.environ.get("MOTIO_MAX_ANALISIS", 2))
+MAX_ANALISIS_EN_COLA = int(os.environ.get("MOTIO_MAX_COLA_ANALISIS", 4))
+ESPERA_MAX_COLA = float(os.environ.get("MOTIO_ESPERA_MAX_COLA", 30))  # segundos
+
+# Archivos con más muestras que esto van por el camino rápido (Burg vectorizado)
+MAX_MUESTRAS_COMPLETO = int(os.environ.get("MOTIO_MAX_MUESTRAS_COMPLETO", 100_000))  # ~1 h a 25 Hz
+
+
+class AnalisisRechazado(Exception):
+    """No hay lugar para el análisis: el endpoint responde 503 con Retry-After"""
+
+    def __init__(self, motivo, retry_after):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+class ControlAdmision:
+    """
+    Semáforo con cola acotada.
+    - Hasta `max_concurrentes` análisis corren a la vez.
+    - Hasta `max_cola` esperan turno (como mucho `espera_max` segundos).
+    - El resto se rechaza al instante con una estimación de cuándo reintentar.
+    """
+
+    def __init__(self, max_concurrentes=MAX_ANALISIS_CONCURRENTES,
+                 max_cola=MAX_ANALISIS_EN_COLA, espera_max=ESPERA_MAX_COLA):
+        self.max_concurrentes = max(1, max_concurrentes)
+        self.max_cola = max(0, max_cola)
+        self.espera_max = espera_max
+        self._cond = threading.Condition()
+        self.activos = 0
+        self.en_cola = 0
+        self.rechazados = 0
+        self.completados = 0
+        # Promedio móvil (EWMA) de la duración de un análisis, para estimar la espera
+        self.duracion_media = 2.0
+
+    def estimar_espera(self, posicion=None):
+        """Segundos estimados hasta que se libere un lugar para la posición dada de la cola"""
+        if posicion is None:
+            posicion = self.en_cola
+        tandas = (posicion // self.max_concurrentes) + 1
+        return self.duracion_media * tandas
+
+    def _retry_after(self):
+        return max(1, math.ceil(self.estimar_espera()))
+
+    def adquirir(self):
+        with self._cond:
+            if self.activos < self.max_concurrentes and self.en_cola == 0:
+                self.activos += 1
+                return
+
+            if self.en_cola >= self.max_cola:
+                self.rechazados += 1
+                raise AnalisisRechazado("Servidor ocupado: cola de análisis llena", self._retry_after())
+
+            self.en_cola += 1
+            try:
+                hay_lugar = self._cond.wait_for(lambda: self.activos < self.max_concurrentes,
+                                                timeout=self.espera_max)
+            finally:
+                self.en_cola -= 1
+
+            if not hay_lugar:
+                self.rechazados += 1
+                raise AnalisisRechazado("Tiempo de espera en cola agotado", self._retry_after())
+            self.activos += 1
+
+    def liberar(self, duracion):
+        with self._cond:
+            self.activos -= 1
+            self.completados += 1
+            self.duracion_media = 0.8 * self.duracion_media + 0.2 * duracion
+            self._cond.notify()
+
+    @contextmanager
+    def turno(self):
+        """Uso: `with control.turno(): ...` (lanza AnalisisRechazado si no hay lugar)"""
+        self.adquirir()
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            self.liberar(time.monotonic() - inicio)
+
+    def estado(self):
+        return {
+            "activos": self.activos,
+            "en_cola": self.en_cola,
+            "max_concurrentes": self.max_concurrentes,
+            "max_cola": self.max_cola,
+            "espera_estimada_s": round(self.estimar_espera(), 2),
+            "rechazados": self.rechazados,
+            "completados": self.completados
+        }
+
+
+def contar_muestras(raw: bytes):
+    """Cantidad aproximada de muestras de un CSV (líneas menos el encabezado) sin parsearlo"""
+    return max(0, raw.count(b"\n") - 1)
+
+
+control_analisis = ControlAdmision()
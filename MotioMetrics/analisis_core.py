@@ -9,6 +9,28 @@ import datetime as datetime
 import datetime
 import os
 
+ZONA_HORARIA = "America/Argentina/Salta"  # la misma que usa el modo en vivo
+
+def convertir_timestamps(serie):
+    """
+    Columna de tiempos (Timestamp, o inicio/fin de las notas) -> datetime.
+    - Enteros: epoch en nanosegundos (grabaciones en vivo). Conversión directa, sin
+      parsear texto, y con fecha (las grabaciones que cruzan medianoche no retroceden).
+    - Texto 'HH:MM:SS.mmm' (grabaciones viejas) o cualquier formato que pandas entienda.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return pd.to_datetime(serie, unit='ns', utc=True).dt.tz_convert(ZONA_HORARIA).dt.tz_localize(None)
+    try:
+        return pd.to_datetime(serie, format='%H:%M:%S.%f')
+    except ValueError:
+        return pd.to_datetime(serie)
+
+def fijar_fecha(serie, fecha):
+    """Le pone `fecha` a tiempos que vinieron sin fecha (pandas los deja en 1900-01-01)"""
+    if len(serie) == 0 or serie.iloc[0].year != 1900:
+        return serie
+    return serie.apply(lambda x: x.replace(year=fecha.year, month=fecha.month, day=fecha.day))
+
 def cargar_datos(path):
     # Leer archivo
     df = pd.read_csv(path, sep=",", encoding="latin1", on_bad_lines="skip")
@@ -16,12 +38,8 @@ def cargar_datos(path):
     df.columns = df.columns.str.strip()  # limpiar nombres
 
     # Convertir la columna 'Timestamp' a formato datetime
-    # Intentamos primero con el formato de hora que usa el análisis en vivo
-    try:
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'], format='%H:%M:%S.%f')
-    except ValueError:
-        # Si falla (ej: archivo viejo con fecha), dejamos que pandas adivine
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    # (epoch en ns del análisis en vivo, 'HH:MM:SS.mmm' de grabaciones viejas, o con fecha)
+    df['Timestamp'] = convertir_timestamps(df['Timestamp'])
     # Normalizar el tiempo para que comience en 0 segundos
     #df['Timestamp'] = (df['Timestamp'] - df['Timestamp'].iloc[0]).dt.total_seconds()
 
@@ -131,6 +149,87 @@ def metodo_burg_umbralizado(window, SR):
 
     return temblor, f_dom, amp_dom
 
+def burg_lote(ventanas, order=6):
+    """
+    Algoritmo de Burg aplicado a todas las filas de `ventanas` a la vez (una ventana por fila).
+    Es la misma recursión que spectrum.arburg, pero cada paso opera sobre la matriz completa
+    en lugar de recorrer muestra por muestra en Python.
+
+    Returns:
+        a   : matriz (n_ventanas, order) con los coeficientes AR (sin el 1 inicial)
+        rho : varianza del ruido de predicción de cada ventana
+    """
+    x = np.asarray(ventanas, dtype=float)
+    N = x.shape[1]
+    rho = np.sum(x**2, axis=1) / N
+    a = np.zeros((x.shape[0], order))
+    ef = x.copy()
+    eb = x.copy()
+
+    for m in range(order):
+        efp = ef[:, 1:]
+        ebp = eb[:, :-1]
+        num = -2. * np.sum(ebp * efp, axis=1)
+        den = np.sum(efp**2, axis=1) + np.sum(ebp**2, axis=1)
+        # Ventanas planas (den = 0): coeficiente nulo en lugar de NaN
+        kp = np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+        ef, eb = efp + kp[:, None] * ebp, ebp + kp[:, None] * efp
+
+        a_prev = a[:, :m].copy()
+        a[:, :m] = a_prev + kp[:, None] * a_prev[:, ::-1]
+        a[:, m] = kp
+        rho = rho * (1. - kp**2)
+
+    return a, rho
+
+def psd_burg_lote(ventanas, order=6, NFFT=None):
+    """
+    Equivalente vectorizado de pburg(ventana, order=order, NFFT=NFFT).psd para cada fila
+    de `ventanas` (por defecto NFFT = largo de la ventana, espectro unilateral igual que spectrum).
+    """
+    a, rho = burg_lote(ventanas, order)
+    N = NFFT or np.asarray(ventanas).shape[1]
+    den = np.fft.fft(np.hstack([np.ones((a.shape[0], 1)), a]), N, axis=1)
+    psd = rho[:, None] / np.abs(den)**2
+    n_unilateral = N // 2 + 1 if N % 2 == 0 else (N + 1) // 2
+    return psd[:, :n_unilateral] * 2
+
+def psd_burg(segmento, order=6, rapido=False):
+    """PSD de Burg de un segmento. Con rapido=True usa psd_burg_lote (mismo resultado, sin loop en Python)."""
+    if rapido:
+        return psd_burg_lote(np.asarray(segmento, dtype=float)[None, :], order)[0]
+    return np.asarray(pburg(segmento, order=order).psd)
+
+def metodo_burg_umbralizado_lote(ventanas, SR):
+    """
+    Versión vectorizada de metodo_burg_umbralizado: mismo orden AR, mismos umbrales.
+    Devuelve una lista de tuplas (temblor, f_dom, amp_dom), una por ventana.
+    """
+    if len(ventanas) == 0:
+        return []
+    return umbralizar_psd_lote(psd_burg_lote(ventanas, order=6), SR)
+
+def umbralizar_psd_lote(psd, SR, flow=3.5, fhigh=7.5, umbral=0.05):
+    """
+    Criterio de metodo_burg_umbralizado aplicado a una matriz de PSD (una ventana por fila).
+    Separado del cálculo de Burg para poder re-umbralizar espectros ya calculados.
+    """
+    if len(psd) == 0:
+        return []
+    freqs = np.linspace(0, SR/2, psd.shape[1])
+
+    idx_max = np.argmax(psd, axis=1)
+    f_dom = freqs[idx_max]
+    # tomar el siguiente pico si el dominante es 0
+    f_dom = np.where(f_dom == 0, freqs[np.argsort(psd, axis=1)[:, -2]], f_dom)
+
+    psd_norm = psd / np.sum(psd, axis=1, keepdims=True)
+    amp_dom = psd_norm[np.arange(len(psd)), idx_max]
+
+    temblor = (f_dom < fhigh) & (f_dom > flow) & (amp_dom > umbral)
+    return [(bool(t), f, A) for t, f, A in zip(temblor, f_dom, amp_dom)]
+
 def eliminar_ventanas_aisladas(temblores, min_consecutivos=2):
     """
     Elimina ventanas aisladas de detección de temblor.
@@ -229,12 +328,9 @@ def graficar_temblor_coloreado(
     base_date = datetime.datetime.today().date()  # Fecha base (puede ser cualquier día)
 
     # df['Timestamp']
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'], format='%H:%M:%S.%f')
-    df['Timestamp'] = df['Timestamp'].apply(lambda x: x.replace(year=base_date.year,month=base_date.month,day=base_date.day))
-
-
     if not np.issubdtype(df['Timestamp'].dtype, np.datetime64):
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+        df['Timestamp'] = convertir_timestamps(df['Timestamp'])
+    df['Timestamp'] = fijar_fecha(df['Timestamp'], base_date)
 
     ventana_muestras = int(3 * SR)
     n_rows = 3 + (1 if rms is not None else 0) + 1
@@ -320,14 +416,8 @@ def graficar_temblor_coloreado(
         ann = anotaciones.copy()
 
         ann = anotaciones.copy()
-        ann['inicio'] = pd.to_datetime(ann['inicio'], format='%H:%M:%S.%f')
-        ann['inicio'] = ann['inicio'].apply(lambda x: x.replace(year=base_date.year,
-                                                                month=base_date.month,
-                                                                day=base_date.day))
-        ann['fin'] = pd.to_datetime(ann['fin'], format='%H:%M:%S.%f')
-        ann['fin'] = ann['fin'].apply(lambda x: x.replace(year=base_date.year,
-                                                        month=base_date.month,
-                                                        day=base_date.day))
+        ann['inicio'] = fijar_fecha(convertir_timestamps(ann['inicio']), base_date)
+        ann['fin'] = fijar_fecha(convertir_timestamps(ann['fin']), base_date)
 
         ann = ann.sort_values('inicio')
         for _, row in ann.iterrows():
@@ -407,46 +497,92 @@ def graficar_filtrados(df, df_filtered):
         plt.tight_layout()
         plt.show()
 
-def detectar_temblor(df, SR, mostrar_pasos = False):
-    # 1. Eliminaar deriva con filtro pasa altos iir
-    yaw_filtered = pasa_altos_iir(df['Yaw'], SR)
-    pitch_filtered = pasa_altos_iir(df['Pitch'], SR)
-    roll_filtered = pasa_altos_iir(df['Roll'], SR)
-
-    df_filtered = pd.DataFrame({
+def calcular_factor_diezmo(n_muestras):
+    """Diezmado de las series de tiempo para que el frontend reciba ~1000 puntos"""
+    return 1 if n_muestras < 1000 else int(n_muestras/1000)
+
+def serializar_episodios(episodios):
+    """Episodios (inicio_ts, fin_ts, amp) en el formato JSON que espera el frontend"""
+    return [{
+        "inicio": inicio_ts.strftime("%Y-%m-%d %H:%M:%S"),
+        "fin":    fin_ts.strftime("%Y-%m-%d %H:%M:%S"),
+        "amplitud": round(float(amp), 2)
+    } for inicio_ts, fin_ts, amp in episodios]
+
+def filtrar_deriva(df, SR):
+    """Paso 1 de detectar_temblor: elimina la deriva de Yaw, Pitch y Roll con un pasa altos IIR."""
+    return pd.DataFrame({
         'Timestamp': df['Timestamp'],
-        'Yaw': yaw_filtered,
-        'Pitch': pitch_filtered,
-        'Roll': roll_filtered
+        'Yaw': pasa_altos_iir(df['Yaw'], SR),
+        'Pitch': pasa_altos_iir(df['Pitch'], SR),
+        'Roll': pasa_altos_iir(df['Roll'], SR)
     })
 
-    if mostrar_pasos:
-        graficar_filtrados(df, df_filtered)
+def detectar_ventanas(df_filtered, SR, rapido=False):
+    """
+    Pasos 2 y 3 de detectar_temblor como generador: ventanea la señal filtrada en
+    bloques de 3 s y aplica Burg a cada ventana a medida que se recorre.
+
+    Devuelve, por ventana, una tupla (i, temblor_yaw, temblor_pitch, temblor_roll)
+    donde cada eje es (temblor, f_dom, amp_dom) sin limpiar ventanas aisladas.
 
-    # 2. Ventaneo 
+    Con rapido=True todas las ventanas se resuelven de una vez con
+    metodo_burg_umbralizado_lote (camino para archivos muy largos).
+    """
     window_size = 3 * SR  # 3 segundos
     overlap = 0
-    yaw_windows = ventaneo(yaw_filtered, window_size, overlap)
-    pitch_windows = ventaneo(pitch_filtered, window_size, overlap)
-    roll_windows = ventaneo(roll_filtered, window_size, overlap)
+    yaw_windows = ventaneo(df_filtered['Yaw'].to_numpy(), window_size, overlap)
+    pitch_windows = ventaneo(df_filtered['Pitch'].to_numpy(), window_size, overlap)
+    roll_windows = ventaneo(df_filtered['Roll'].to_numpy(), window_size, overlap)
+
+    if rapido:
+        yield from zip(
+            range(yaw_windows.shape[0]),
+            metodo_burg_umbralizado_lote(yaw_windows, SR),
+            metodo_burg_umbralizado_lote(pitch_windows, SR),
+            metodo_burg_umbralizado_lote(roll_windows, SR)
+        )
+        return
 
-    #3. Detección de temblor en cada ventana
-    temblores_yaw = []
-    temblores_pitch = []
-    temblores_roll = []
     for i in range(yaw_windows.shape[0]):
-        temblor_yaw, f_dom_yaw, amp_dom_yaw = metodo_burg_umbralizado(yaw_windows[i], SR)
-        #print("Ciclo:", i+1) 
-        #print("Yaw. Frecuencia dominante: ", f_dom_yaw, "Amplitud dominante: ", amp_dom_yaw, "Temblor: ", temblor_yaw)
-        temblor_pitch, f_dom_pitch, amp_dom_pitch = metodo_burg_umbralizado(pitch_windows[i], SR)
-        #print("Pitch. Frecuencia dominante: ", f_dom_pitch, "Amplitud dominante: ", amp_dom_pitch, "Temblor: ", temblor_pitch)
+        yield (
+            i,
+            metodo_burg_umbralizado(yaw_windows[i], SR),
+            metodo_burg_umbralizado(pitch_windows[i], SR),
+            metodo_burg_umbralizado(roll_windows[i], SR)
+        )
+
+def unificar_ejes(temblores_yaw, temblores_pitch, temblores_roll):
+    """
+    Paso 5 de detectar_temblor: si un eje tiene temblor en una ventana, los otros también.
+    Modifica las listas recibidas y devuelve la lista de bool combinada.
+    """
+    temblores = []
+    for i in range(len(temblores_yaw)):
+        if temblores_yaw[i][0] or temblores_pitch[i][0] or temblores_roll[i][0]:
+            temblores_yaw[i] = (True, temblores_yaw[i][1], temblores_yaw[i][2])
+            temblores_pitch[i] = (True, temblores_pitch[i][1], temblores_pitch[i][2])
+            temblores_roll[i] = (True, temblores_roll[i][1], temblores_roll[i][2])
+            temblores.append(True)
+        else:
+            temblores.append(False)
+    return temblores
 
-        temblor_roll, f_dom_roll, amp_dom_roll = metodo_burg_umbralizado(roll_windows[i], SR)
-        #print("Roll. Frecuencia dominante: ", f_dom_roll, "Amplitud dominante: ", amp_dom_roll, "Temblor: ", temblor_roll)
+def detectar_temblor(df, SR, mostrar_pasos = False, rapido = False):
+    # 1. Eliminaar deriva con filtro pasa altos iir
+    df_filtered = filtrar_deriva(df, SR)
+
+    if mostrar_pasos:
+        graficar_filtrados(df, df_filtered)
 
-        temblores_yaw.append((temblor_yaw, f_dom_yaw, amp_dom_yaw))
-        temblores_pitch.append((temblor_pitch, f_dom_pitch, amp_dom_pitch))
-        temblores_roll.append((temblor_roll, f_dom_roll, amp_dom_roll))
+    # 2 y 3. Ventaneo y detección de temblor en cada ventana
+    temblores_yaw = []
+    temblores_pitch = []
+    temblores_roll = []
+    for i, temblor_yaw, temblor_pitch, temblor_roll in detectar_ventanas(df_filtered, SR, rapido):
+        temblores_yaw.append(temblor_yaw)
+        temblores_pitch.append(temblor_pitch)
+        temblores_roll.append(temblor_roll)
 
     # Mostrar resultados
     if mostrar_pasos:
@@ -460,15 +596,7 @@ def detectar_temblor(df, SR, mostrar_pasos = False):
         graficar_temblor_coloreado(df_filtered, SR, temblores_yaw_limpios, temblores_pitch_limpios, temblores_roll_limpios, rms = None, episodios=None)
 
     # 5. Si un eje tiene temblor, los otros también
-    temblores = []
-    for i in range(len(temblores_yaw_limpios)):
-        if temblores_yaw_limpios[i][0] or temblores_pitch_limpios[i][0] or temblores_roll_limpios[i][0]:
-            temblores_yaw_limpios[i] = (True, temblores_yaw_limpios[i][1], temblores_yaw_limpios[i][2])
-            temblores_pitch_limpios[i] = (True, temblores_pitch_limpios[i][1], temblores_pitch_limpios[i][2])
-            temblores_roll_limpios[i] = (True, temblores_roll_limpios[i][1], temblores_roll_limpios[i][2])
-            temblores.append(True)
-        else:
-            temblores.append(False)
+    temblores = unificar_ejes(temblores_yaw_limpios, temblores_pitch_limpios, temblores_roll_limpios)
 
     if mostrar_pasos:
         graficar_temblor_coloreado(df_filtered, SR, temblores_yaw_limpios, temblores_pitch_limpios, temblores_roll_limpios, rms = None, episodios=None)
@@ -477,22 +605,28 @@ def detectar_temblor(df, SR, mostrar_pasos = False):
 
     return temblores, tiene_temblor, df_filtered, temblores_yaw_limpios, temblores_pitch_limpios, temblores_roll_limpios
  
-def cuantificar_temblor(df, SR, temblores, graph=False):
-    # 1. Pasa-bandas IIR 3.5–7.5 Hz
-    yaw_band = pasa_bandas_iir(df['Yaw'], SR, 3.5, 7.5)
-    pitch_band = pasa_bandas_iir(df['Pitch'], SR, 3.5, 7.5)
-    roll_band = pasa_bandas_iir(df['Roll'], SR, 3.5, 7.5)
+def rms_banda_temblor(df, SR, flow=3.5, fhigh=7.5):
+    """Pasos 1 y 2 de cuantificar_temblor: RMS combinado de Yaw+Pitch+Roll en la banda de temblor."""
+    # 1. Pasa-bandas IIR (por defecto 3.5–7.5 Hz)
+    yaw_band = pasa_bandas_iir(df['Yaw'], SR, flow, fhigh)
+    pitch_band = pasa_bandas_iir(df['Pitch'], SR, flow, fhigh)
+    roll_band = pasa_bandas_iir(df['Roll'], SR, flow, fhigh)
 
     # 2. Calcular RMS combinado
-    rms_ypr = np.sqrt(yaw_band**2 + pitch_band**2 + roll_band**2)
+    return np.sqrt(yaw_band**2 + pitch_band**2 + roll_band**2)
 
-    # 3. Detectar episodios de temblor y amplitud
+def detectar_episodios(df, SR, temblores, rms_ypr, duracion_ventana=3):
+    """
+    Paso 3 de cuantificar_temblor: agrupa ventanas consecutivas con temblor en episodios.
+
+    Returns:
+        episodios : lista de tuplas (inicio_ts, fin_ts, amp_max)
+    """
     episodios = []
     in_episode = False
     start_idx = 0
     timestamp_inicial = df['Timestamp'].iloc[0]  # <-- referencia temporal
 
-    duracion_ventana = 3  # segundos, igual que antes
 
     for i, t in enumerate(temblores):
         if t and not in_episode:
@@ -527,6 +661,15 @@ def cuantificar_temblor(df, SR, temblores, graph=False):
         amp_episode = np.max(rms_segment)
         episodios.append((inicio_ts, fin_ts, amp_episode))
 
+    return episodios
+
+def cuantificar_temblor(df, SR, temblores, graph=False):
+    # 1 y 2. RMS combinado en la banda de temblor
+    rms_ypr = rms_banda_temblor(df, SR)
+
+    # 3. Detectar episodios de temblor y amplitud
+    episodios = detectar_episodios(df, SR, temblores, rms_ypr)
+
     # 4. Graficar
     if graph:
         plt.figure(figsize=(10, 5))
@@ -552,7 +695,7 @@ def cuantificar_temblor(df, SR, temblores, graph=False):
 
     return rms_ypr, episodios
 
-def frecuencia_temblor(df, episodios, SR):
+def frecuencia_temblor(df, episodios, SR, rapido=False):
     
     # Pasa altos para eliminar deriva
     df = df.copy()
@@ -560,33 +703,24 @@ def frecuencia_temblor(df, episodios, SR):
     df['Pitch'] = pasa_altos_iir(df['Pitch'], SR, fc=0.5)
     df['Roll'] = pasa_altos_iir(df['Roll'], SR, fc=0.5)
 
+    return espectro_episodios(df, episodios, SR, rapido)
+
+def espectro_episodios(df, episodios, SR, rapido=False):
+    """
+    Parte espectral de frecuencia_temblor sobre un df ya filtrado (pasa altos 0.5 Hz).
+    Separada para reutilizar el filtrado cuando se re-analiza con otros parámetros.
+    """
     # --- CASO 1: NO HAY EPISODIOS DE TEMBLOR DETECTADOS ---
     if not episodios:
         # En lugar de devolver vacío, analizamos la señal completa
         # Promediamos los 3 ejes para tener una señal unificada
         segmento_completo = (df['Yaw'] + df['Pitch'] + df['Roll']) / 3
-        
-        # Calculamos Burg sobre toda la señal
-        order = 6
-        try:
-            burg = pburg(segmento_completo, order=order)
-            psd_mean = np.asarray(burg.psd)
-            freqs_std = np.linspace(0, SR/2, len(psd_mean))
-            
-            # Frecuencia dominante global
-            idx_max = np.argmax(psd_mean)
-            f_dom_mean = freqs_std[idx_max]
-            
-            # Devolvemos:
-            # - Lista de frecuencias por episodio: vacía (porque no hay episodios)
-            # - f_dom_mean: la del análisis global
-            # - freqs_std y psd_mean: datos para graficar el espectro completo
-            return [], f_dom_mean, freqs_std, psd_mean
-            
-        except Exception as e:
-            # Si falla Burg por señal muy corta o plana, devolvemos arrays vacíos seguros
-            print(f"Error en Burg fallback: {e}")
-            return [], 0.0, np.array([]), np.array([])
+
+        # Devolvemos:
+        # - Lista de frecuencias por episodio: vacía (porque no hay episodios)
+        # - f_dom_mean: la del análisis global
+        # - freqs_std y psd_mean: datos para graficar el espectro completo
+        return ([], *espectro_global(segmento_completo, SR, rapido))
 
     # --- CASO 2: SÍ HAY EPISODIOS (Lógica original) ---
     # Lista para guardar todas las PSD
@@ -607,19 +741,43 @@ def frecuencia_temblor(df, episodios, SR):
         ) / 3
 
         # Burg
-        order = 6
-        burg = pburg(segmento, order=order)
-        psd = np.asarray(burg.psd)
-        freqs = np.linspace(0, SR/2, len(psd))
+        psd, f_dom = espectro_segmento(segmento, SR, rapido)
 
         # Guardamos para promediarlas más tarde
         todas_psd.append(psd)
-
-        # Frecuencia dominante de este episodio
-        idx_max = np.argmax(psd)
-        f_dom = freqs[idx_max]
         frecuencias.append(f_dom)
 
+    return (frecuencias, *promediar_espectros(todas_psd, SR))
+
+def espectro_global(segmento_completo, SR, rapido=False):
+    """Caso sin episodios de espectro_episodios: Burg sobre toda la señal -> (f_dom, freqs, psd)"""
+    order = 6
+    try:
+        psd_mean = psd_burg(segmento_completo, order, rapido)
+        freqs_std = np.linspace(0, SR/2, len(psd_mean))
+
+        # Frecuencia dominante global
+        idx_max = np.argmax(psd_mean)
+        f_dom_mean = freqs_std[idx_max]
+        return f_dom_mean, freqs_std, psd_mean
+
+    except Exception as e:
+        # Si falla Burg por señal muy corta o plana, devolvemos arrays vacíos seguros
+        print(f"Error en Burg fallback: {e}")
+        return 0.0, np.array([]), np.array([])
+
+def espectro_segmento(segmento, SR, rapido=False):
+    """PSD de Burg de un episodio (promedio de los 3 ejes) y su frecuencia dominante"""
+    order = 6
+    psd = psd_burg(segmento, order, rapido)
+    freqs = np.linspace(0, SR/2, len(psd))
+    return psd, freqs[np.argmax(psd)]
+
+def promediar_espectros(todas_psd, SR):
+    """
+    Promedio de las PSD de los episodios -> (f_dom_mean, freqs_std, psd_mean).
+    Separado para poder calcular la PSD de cada episodio apenas termina (análisis en vivo).
+    """
     # ============================
     #   PROMEDIO DEL ESPECTRO
     # ============================
@@ -640,4 +798,4 @@ def frecuencia_temblor(df, episodios, SR):
     idx_max = np.argmax(psd_mean)
     f_dom_mean = freqs_std[idx_max]
 
-    return frecuencias, f_dom_mean, freqs_std, psd_mean
\ No newline at end of file
+    return f_dom_mean, freqs_std, psd_mean
@@ -0,0 +1,337 @@
+# analisis_incremental.py
+# Análisis de temblor "mientras se graba" para las sesiones en vivo.
+# Es el mismo pipeline que procesar_csv_logic (filtros, Burg por ventana de 3 s,
+# ventanas aisladas, RMS en banda, episodios y espectro de episodios), pero
+# avanzando a medida que llegan las muestras grabadas: al detener la grabación
+# sólo falta la cola de los últimos MARGEN_S segundos y el resultado sale al
+# instante, sin volver a subir y parsear el CSV.
+#
+# Los filtros del análisis offline son de fase cero (filtfilt) sobre la señal
+# completa: la salida en una muestra depende también de lo que viene después.
+# Acá cada tramo se filtra con MARGEN_S segundos de contexto a cada lado y se da
+# por definitivo recién cuando hay ese margen por delante. Con el pasa altos de
+# 0.25 Hz (el más lento) la diferencia con filtrar todo de una vez es del orden
+# de exp(-2π·0.25·MARGEN_S) ≈ 1e-7 relativo: las detecciones son las mismas salvo
+# ventanas que caen exactamente en el umbral. El principio y el final de la
+# grabación se filtran igual que offline (con los bordes reales).
+#
+# Igual que cargar_datos, el resultado final descarta la última muestra y estima
+# SR con todas las demás; si el SR final no coincide con el que se venía usando,
+# se recalcula todo desde la memoria (sin E/S).
+#
+# Uso (SesionVivo): agregar()/agregar_lote() desde la ingesta (sólo encolan),
+# actualizar() desde un hilo de fondo, finalizar() al detener la grabación.
+
+import os
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from analisis_core import (
+    convertir_timestamps,
+    pasa_altos_iir,
+    pasa_bandas_iir,
+    metodo_burg_umbralizado_lote,
+    espectro_global,
+    espectro_segmento,
+    promediar_espectros,
+    calcular_factor_diezmo,
+    serializar_episodios
+)
+
+MARGEN_S = float(os.environ.get("MOTIO_ANALISIS_VIVO_MARGEN_S", 10))
+DURACION_VENTANA = 3  # segundos, como detectar_ventanas
+MIN_MUESTRAS = 30     # por debajo, filtfilt no tiene con qué rellenar los bordes
+COLUMNAS = ["Yaw", "Pitch", "Roll", "Ax", "Ay", "Az"]
+
+
+class AnalisisIncremental:
+    """
+    Pipeline de procesar_csv_logic por tramos sobre las muestras de una grabación.
+    - agregar(t_ns, valores) / agregar_lote(t_ns, valores): lo llama la ingesta (no bloquea)
+    - actualizar(): avanza lo que ya se puede dar por definitivo; devuelve las ventanas nuevas
+    - finalizar(): completa la cola y devuelve el resultado de procesar_csv_logic
+    """
+
+    def __init__(self, margen_s=MARGEN_S, duracion_ventana=DURACION_VENTANA):
+        self.margen_s = margen_s
+        self.duracion_ventana = duracion_ventana
+        self._cola = deque()
+        self._lock = threading.RLock()
+
+        # Muestras y sus filtrados, alineados (arrays con capacidad que se duplica al llenarse)
+        self.n = 0
+        self._t = np.zeros(0, dtype=np.int64)
+        self._valores = np.zeros((0, len(COLUMNAS)))
+        self._hp = np.zeros((0, 3))           # pasa altos 0.25 Hz (detección)
+        self._hp_espectro = np.zeros((0, 3))  # pasa altos 0.5 Hz (espectro de episodios)
+        self._rms = np.zeros(0)               # RMS combinado en la banda de temblor
+        self._suma_pasos_ns = 0  # para estimar SR como cargar_datos (promedio de pasos > 0)
+        self._n_pasos = 0
+
+        self.SR = None
+        self.resultado = None
+        self._reiniciar_calculos()
+
+    def _reiniciar_calculos(self):
+        self.definitivas = 0  # muestras con los filtros ya definitivos (_hp, _hp_espectro, _rms)
+        self._crudas = ([], [], [])       # (temblor, f_dom, amp_dom) por ventana y eje
+        self.temblores = []               # ventanas limpias y unificadas (definitivas)
+
+        # Episodios: (ventana inicial, ventana final, amplitud) y su PSD cuando ya se puede calcular
+        self._en_episodio = False
+        self._inicio_episodio = 0
+        self.episodios = []
+        self._psd_episodios = []
+
+    # --- Productor ---
+
+    def agregar(self, t_ns, valores):
+        self._cola.append(([t_ns], [valores]))
+
+    def agregar_lote(self, t_ns, valores):
+        self._cola.append((t_ns, valores))
+
+    # --- Consumidor ---
+
+    def _vaciar_cola(self):
+        n = len(self._cola)
+        if not n:
+            return
+        lotes = [self._cola.popleft() for _ in range(n)]
+        t = np.concatenate([np.asarray(t, dtype=np.int64) for t, _ in lotes])
+        valores = np.concatenate([np.asarray(v, dtype=float).reshape(-1, len(COLUMNAS)) for _, v in lotes])
+        # Como cargar_datos: las filas con algún NaN no entran
+        validas = ~np.isnan(valores).any(axis=1)
+        t, valores = t[validas], valores[validas]
+        if not len(t):
+            return
+
+        if self.n + len(t) > len(self._t):
+            capacidad = max(2 * len(self._t), self.n + len(t), 1024)
+            self._t = self._agrandar(self._t, capacidad)
+            self._valores = self._agrandar(self._valores, capacidad)
+            self._hp = self._agrandar(self._hp, capacidad)
+            self._hp_espectro = self._agrandar(self._hp_espectro, capacidad)
+            self._rms = self._agrandar(self._rms, capacidad)
+        pasos = np.diff(t, prepend=self._t[self.n - 1] if self.n else t[0])
+        pasos = pasos[pasos > 0]
+        self._suma_pasos_ns += int(pasos.sum())
+        self._n_pasos += len(pasos)
+        self._t[self.n:self.n + len(t)] = t
+        self._valores[self.n:self.n + len(t)] = valores
+        self.n += len(t)
+
+    @staticmethod
+    def _agrandar(arreglo, capacidad):
+        nuevo = np.zeros((capacidad, *arreglo.shape[1:]), dtype=arreglo.dtype)
+        nuevo[:len(arreglo)] = arreglo
+        return nuevo
+
+    @staticmethod
+    def _estimar_sr(suma_pasos_ns, n_pasos):
+        """SR como cargar_datos: 1 / paso medio, redondeado (10 si no se puede)"""
+        if n_pasos == 0:
+            return 10
+        SR = int(round(n_pasos / (suma_pasos_ns / 1e9)))
+        return SR if SR >= 1 else 10
+
+    def actualizar(self):
+        """
+        Procesa lo que llegó. Devuelve las ventanas nuevas con detección definitiva
+        (como los lotes de procesar_csv_stream), o [] si todavía no completó ninguna.
+        """
+        with self._lock:
+            if self.resultado is not None:
+                return []
+            self._vaciar_cola()
+            if self.n < MIN_MUESTRAS:
+                return []
+            SR = self._estimar_sr(self._suma_pasos_ns, self._n_pasos)
+            if SR != self.SR:
+                # Cambió la estimación (suele pasar sólo en los primeros segundos): de nuevo
+                self.SR = SR
+                self._reiniciar_calculos()
+            desde = len(self.temblores)
+            self._avanzar(self.n, final=False)
+            return [self.resumen_ventana(i) for i in range(desde, len(self.temblores))]
+
+    def finalizar(self):
+        """Completa el análisis con la grabación entera; mismo formato que procesar_csv_logic"""
+        with self._lock:
+            if self.resultado is not None:
+                return self.resultado
+            self._vaciar_cola()
+            n = self.n - 1  # cargar_datos descarta la última fila
+            if n < MIN_MUESTRAS:
+                return None
+            pasos = np.diff(self._t[:n])
+            pasos = pasos[pasos > 0]
+            SR = self._estimar_sr(int(pasos.sum()), len(pasos))
+            if SR != self.SR:
+                self.SR = SR
+                self._reiniciar_calculos()
+            self._avanzar(n, final=True)
+            self.resultado = self._armar_resultado(n)
+            return self.resultado
+
+    # --- Pipeline ---
+
+    def _avanzar(self, n, final):
+        """Filtros, ventanas, episodios y espectros hasta donde ya son definitivos"""
+        margen = int(self.margen_s * self.SR)
+        W = self.duracion_ventana * self.SR
+        limite = n if final else n - margen
+        # En vivo se filtra de a una ventana o más (el costo fijo de cada filtrado no depende del largo)
+        if limite > self.definitivas and (final or limite - self.definitivas >= W):
+            self._filtrar(self.definitivas, limite, n, margen)
+            self.definitivas = limite
+
+        nuevas = range(len(self._crudas[0]), self.definitivas // W if W > 0 else 0)
+        if len(nuevas):
+            for eje, crudas in enumerate(self._crudas):
+                ventanas = self._hp[nuevas.start * W:nuevas.stop * W, eje].reshape(len(nuevas), W)
+                crudas.extend(metodo_burg_umbralizado_lote(ventanas, self.SR))
+
+        # Una ventana queda limpia (eliminar_ventanas_aisladas) cuando se conoce la siguiente
+        hasta = len(self._crudas[0]) if final else len(self._crudas[0]) - 1
+        for i in range(len(self.temblores), max(hasta, 0)):
+            self._agregar_ventana(i)
+        if final and self._en_episodio:
+            self._cerrar_episodio(len(self.temblores) - 1)
+
+        # PSD de los episodios cerrados cuyas muestras ya están filtradas
+        for k in range(len(self._psd_episodios), len(self.episodios)):
+            psd = self._espectro_episodio(k, self.definitivas, final)
+            if psd is None:
+                break
+            self._psd_episodios.append(psd)
+
+    def _filtrar(self, desde, hasta, n, margen):
+        """Filtra [desde, hasta) con `margen` muestras de contexto antes y todo lo que hay después"""
+        inicio = max(0, desde - margen)
+        ypr = self._valores[inicio:n, :3]
+        recorte = slice(desde - inicio, hasta - inicio)
+        banda = []
+        for j in range(3):
+            self._hp[desde:hasta, j] = pasa_altos_iir(ypr[:, j], self.SR)[recorte]
+            self._hp_espectro[desde:hasta, j] = pasa_altos_iir(ypr[:, j], self.SR, fc=0.5)[recorte]
+            banda.append(pasa_bandas_iir(ypr[:, j], self.SR, 3.5, 7.5)[recorte])
+        self._rms[desde:hasta] = np.sqrt(banda[0]**2 + banda[1]**2 + banda[2]**2)
+
+    @staticmethod
+    def _limpia(crudas, i):
+        """crudas[i] después de eliminar_ventanas_aisladas"""
+        if not crudas[i][0]:
+            return False
+        anterior = crudas[i - 1][0] if i > 0 else False
+        siguiente = crudas[i + 1][0] if i + 1 < len(crudas) else False
+        return anterior or siguiente
+
+    def _agregar_ventana(self, i):
+        """unificar_ejes + el recorrido de detectar_episodios, una ventana a la vez"""
+        t = any(self._limpia(crudas, i) for crudas in self._crudas)
+        self.temblores.append(t)
+        if t and not self._en_episodio:
+            self._en_episodio = True
+            self._inicio_episodio = i
+        elif not t and self._en_episodio:
+            self._cerrar_episodio(i - 1)
+
+    def _cerrar_episodio(self, fin):
+        self._en_episodio = False
+        W = self.duracion_ventana * self.SR
+        amp = np.max(self._rms[self._inicio_episodio * W:(fin + 1) * W])
+        self.episodios.append((self._inicio_episodio, fin, amp))
+
+    def _espectro_episodio(self, k, hasta, final):
+        """(PSD, f_dom) del episodio k (por tiempo, como espectro_episodios); None si faltan muestras"""
+        inicio, fin, _ = self.episodios[k]
+        t0 = self._t[0]
+        t = self._t[:hasta]
+        inicio_ns = t0 + inicio * self.duracion_ventana * 1_000_000_000
+        fin_ns = t0 + (fin + 1) * self.duracion_ventana * 1_000_000_000
+        if not final and t[-1] <= fin_ns:
+            return None  # todavía pueden llegar muestras dentro del episodio
+        inicio_idx = np.flatnonzero(t >= inicio_ns)[0]
+        fin_idx = np.flatnonzero(t <= fin_ns)[-1]
+        hp = self._hp_espectro[inicio_idx:fin_idx + 1]
+        segmento = (hp[:, 0] + hp[:, 1] + hp[:, 2]) / 3
+        return espectro_segmento(segmento, self.SR, rapido=True)
+
+    # --- Resultados ---
+
+    def resumen_ventana(self, i):
+        """Detección cruda de la ventana i, con el formato de los lotes de procesar_csv_stream"""
+        ejes = [crudas[i] for crudas in self._crudas]
+        return {
+            "i": i,
+            "temblor": bool(self.temblores[i]),
+            "f_dom": [round(float(e[1]), 2) for e in ejes],
+            "amp_dom": [round(float(e[2]), 3) for e in ejes]
+        }
+
+    def _timestamps(self, n):
+        return convertir_timestamps(pd.Series(self._t[:n]))
+
+    def _episodios_ts(self, timestamps):
+        """(ventana inicial, final, amp) -> (inicio_ts, fin_ts, amp) como detectar_episodios"""
+        timestamp_inicial = timestamps.iloc[0]
+        return [(timestamp_inicial + pd.to_timedelta(inicio * self.duracion_ventana, unit='s'),
+                 timestamp_inicial + pd.to_timedelta((fin + 1) * self.duracion_ventana, unit='s'),
+                 amp) for inicio, fin, amp in self.episodios]
+
+    def _armar_resultado(self, n):
+        timestamps = self._timestamps(n)
+        if self._psd_episodios:
+            f_dom_mean, freqs_std, psd_mean = promediar_espectros([psd for psd, _ in self._psd_episodios], self.SR)
+        else:
+            hp = self._hp_espectro[:n]
+            f_dom_mean, freqs_std, psd_mean = espectro_global((hp[:, 0] + hp[:, 1] + hp[:, 2]) / 3,
+                                                              self.SR, rapido=True)
+        psd_pico = np.max(psd_mean) if len(psd_mean) > 0 else 0
+        factor_diezmo = calcular_factor_diezmo(n)
+
+        return {
+            "metricas": {
+                "frecuencia_dominante": round(float(f_dom_mean), 2),
+                "psd_pico": round(float(psd_pico), 2),
+                "sr": self.SR,
+                "tiene_temblor": bool(np.any(self.temblores)),
+                "modo_rapido": True
+            },
+            "graficos": {
+                "tiempo": timestamps.astype(str).iloc[::factor_diezmo].tolist(),
+                "rms": self._rms[:n:factor_diezmo].tolist(),
+                "freq_x": freqs_std.tolist(),
+                "freq_y": psd_mean.tolist(),
+                "episodios": serializar_episodios(self._episodios_ts(timestamps))
+            }
+        }
+
+    def crear_sesion(self, registro, nombre=None):
+        """
+        Deja la grabación terminada en una sesión de re-análisis (zoom, espectrograma,
+        otros umbrales) con los intermedios ya calculados. Llamar después de finalizar().
+        """
+        with self._lock:
+            n = self.n - 1
+            timestamps = self._timestamps(n)
+            df = pd.DataFrame(self._valores[:n], columns=COLUMNAS)
+            df.insert(0, "Timestamp", timestamps)
+            df_filtrado = pd.DataFrame({"Timestamp": timestamps, "Yaw": self._hp[:n, 0],
+                                        "Pitch": self._hp[:n, 1], "Roll": self._hp[:n, 2]})
+            sesion = registro.crear(df, self.SR, nombre=nombre)
+            sesion.cachear(df_filtrado=df_filtrado, rms=self._rms[:n].copy())
+            return sesion
+
+    def estado(self):
+        return {
+            "muestras": self.n + sum(len(t) for t, _ in list(self._cola)),
+            "sr": self.SR,
+            "ventanas_analizadas": len(self.temblores),
+            "ventanas_con_temblor": int(sum(self.temblores)),
+            "episodios": len(self.episodios) + int(self._en_episodio)
+        }
@@ -1,14 +1,36 @@
 # analisis_vivo_core_websockets.py
 # Versión WebSocket del modo "Análisis en Vivo"
 # Reemplaza completamente al antiguo analisis_vivo_core.py (UDP)
+#
+# Cada sensor (dispositivo) tiene su propia SesionVivo: buffer, grabación y notas.
+# Los dashboards se suscriben a un dispositivo y reciben sólo sus datos (sala de
+# Socket.IO "vivo:<dispositivo>"). El firmware actual no manda identificador:
+# sus muestras van al DISPOSITIVO_DEFECTO.
+# Con varios workers, cada dispositivo vive en un solo worker (su dueño) y los
+# demás le reenvían lo suyo: ver backend_vivo.py.
 
-from collections import deque
 import csv
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import os
+import time
+import uuid
+import functools
+import threading
+import numpy as np
 from flask_socketio import SocketIO
 
+from buffer_vivo import BufferVivo
+from grabador import Grabador
+from detector_vivo import DetectorTemblorVivo
+from analisis_incremental import AnalisisIncremental
+from espectro_vivo import calcular_espectro_vivo, HZ_ESPECTRO, VENTANA_ESPECTRO_S
+from formato_binario import decodificar_frame
+from sincronizacion import RelojSensor, BufferReorden
+from flujo_vivo import ControlFlujo
+from latencia_vivo import LatenciaVivo
+from backend_vivo import crear_backend, BackendLocal, TIMEOUT_COMANDO_S, TTL_DUENO_S
+
 LOCAL_TZ = ZoneInfo("America/Argentina/Salta")
 
 def now_local():
@@ -16,174 +38,778 @@ def now_local():
 
 # Configuración
 MAX_LEN = 50  # puntos visibles en el gráfico en vivo
+FPS_DIFUSION = float(os.environ.get("MOTIO_FPS_VIVO", 10))        # frames 'datos_vivo' por segundo
+KEYFRAME_CADA_S = float(os.environ.get("MOTIO_KEYFRAME_VIVO_S", 5))  # cada cuánto se manda la ventana completa
+DISPOSITIVO_DEFECTO = os.environ.get("MOTIO_DISPOSITIVO_DEFECTO", "motiosensor")
+MAX_POLL = int(os.environ.get("MOTIO_MAX_MUESTRAS_POLL", 1000))          # muestras por respuesta de 'poll'
+ESPERA_POLL_MAX_S = float(os.environ.get("MOTIO_ESPERA_POLL_MAX_S", 25))  # tope del long-polling
+ANALISIS_VIVO = os.environ.get("MOTIO_ANALISIS_VIVO", "1") != "0"  # analizar mientras se graba
+INTERVALO_ANALISIS_S = float(os.environ.get("MOTIO_ANALISIS_VIVO_S", 1.0))
 
-# Buffers para el gráfico en tiempo real (se envían al frontend)
-live_data = {
-    "timestamps": deque(maxlen=MAX_LEN),
-    "yaw": deque(maxlen=MAX_LEN),
-    "pitch": deque(maxlen=MAX_LEN),
-    "roll": deque(maxlen=MAX_LEN)
-}
+# Necesitamos acceso al socketio desde app.py
+socketio: SocketIO = None  # Se asignará desde app.py
+difusor_activo = False
 
-# Variables para grabación CSV
-csv_writer = None
-csv_file = None
-act_writer = None
-act_file = None
 
-actividad_actual = None
-inicio_actual = None
+def _con_lock(metodo):
+    """Con ASGI (app_asgi.py) la ingesta, la difusión y los requests HTTP corren en hilos distintos"""
+    @functools.wraps(metodo)
+    def envuelto(self, *args, **kwargs):
+        with self._lock:
+            return metodo(self, *args, **kwargs)
+    return envuelto
 
-# Necesitamos acceso al socketio desde app.py
-socketio: SocketIO = None  # Se asignará desde app.py
+
+class SesionVivo:
+    """Estado en vivo de un dispositivo: buffer, grabación CSV, notas y suscriptores"""
+
+    def __init__(self, dispositivo):
+        self.dispositivo = dispositivo
+        self.id = uuid.uuid4().hex  # cambia con cada grabación
+        self.buffer = BufferVivo()
+        self._lock = threading.RLock()
+
+        # Grabación CSV (las muestras las escribe el hilo del Grabador)
+        self.grabador: Grabador = None
+        self.csv_filename = None
+        self.act_file = None
+        self.act_writer = None
+        self.actividad_actual = None
+        self.inicio_actual = None
+
+        # Difusión: índice absoluto (buffer.total) hasta donde llegó el último frame
+        self.muestras_emitidas = 0
+        self.ultimo_keyframe = time.monotonic()
+        self.flujo = ControlFlujo(cola_salida)  # suscriptores (sids) y su control de flujo
+        self.latencia = LatenciaVivo(self.buffer.capacidad)  # tiempos por muestra y por frame (latencia_vivo.py)
+
+        # Detección causal de temblor (se alimenta por bloques desde el buffer, no por muestra)
+        self.detector = DetectorTemblorVivo()
+        self.muestras_detector = 0
+
+        # Último espectro (lo calcula bucle_espectro; buffer.total con el que se calculó)
+        self.ultimo_espectro = None
+        self.muestras_espectro = 0
+
+        # Muestras con reloj y secuencia del sensor (lotes JSON y frames binarios)
+        self.reloj = RelojSensor()
+        self.reorden = BufferReorden()
+
+        # Análisis offline hecho mientras se graba (lo avanza bucle_analisis); al detener
+        # la grabación queda en analisis_terminado hasta que se pide el resultado
+        self.analisis: AnalisisIncremental = None
+        self.analisis_terminado: AnalisisIncremental = None
+
+        # Reproducción de una grabación que alimenta este dispositivo (reproduccion_vivo.py)
+        self.reproduccion = None
+
+    @property
+    def sala(self):
+        return sala_de(self.dispositivo)
+
+    @property
+    def suscriptores(self):
+        return self.flujo.clientes
+
+    # --- Ingesta ---
+
+    @_con_lock
+    def agregar_muestra(self, t_ns, valores):
+        """valores = (yaw, pitch, roll, ax, ay, az); t_ns es la hora de llegada"""
+        self.buffer.agregar(t_ns, valores)
+        # Guardar en CSV si está grabando (sólo se encola; el Grabador escribe en bloque)
+        if self.grabador is not None:
+            self.grabador.agregar((t_ns, *valores))
+            if self.analisis is not None:
+                self.analisis.agregar(t_ns, valores)
+        self.latencia.registrar_muestra(t_ns, time.time_ns())
+
+    @_con_lock
+    def agregar_lote(self, t_ns, valores, llegada_ns=None):
+        """
+        Muchas muestras de una vez: t_ns (n,) int64 (epoch del servidor) y valores (n, 6).
+        llegada_ns: hora de llegada del mensaje, si t_ns viene del reloj del sensor.
+        """
+        self.buffer.agregar_lote(t_ns, valores)
+        if self.grabador is not None:
+            self.grabador.agregar_lote(zip(t_ns.tolist(), *valores.T.tolist()))
+            if self.analisis is not None:
+                self.analisis.agregar_lote(t_ns, valores)
+        procesada_ns = time.time_ns()
+        self.latencia.registrar_ingreso(t_ns, procesada_ns if llegada_ns is None else llegada_ns, procesada_ns,
+                                        con_reloj=llegada_ns is not None)
+
+    @_con_lock
+    def ingresar_sensor(self, secuencia, t_sensor_ns, valores, llegada_ns):
+        """
+        Muestras fechadas por el sensor: `secuencia` de la primera, t_sensor_ns (n,) en el
+        reloj del sensor. Pasan por el buffer de reorden (duplicadas/fuera de orden) y se
+        llevan al reloj del servidor con el offset estimado.
+        secuencia=None (p. ej. el gateway UDP): sin reorden ni descarte de duplicadas.
+        """
+        reinicios = self.reloj.reinicios
+        self.reloj.observar(int(t_sensor_ns[-1]), llegada_ns)
+        if secuencia is None:
+            self._agregar_sincronizadas(t_sensor_ns, valores, llegada_ns)
+            return
+        if self.reloj.reinicios != reinicios:
+            # El reloj del sensor volvió atrás (se reinició): la secuencia también empieza de nuevo,
+            # aunque todavía no esté lo bastante atrás como para que BufferReorden lo note solo
+            self.reorden.reiniciar()
+        t, v = self.reorden.agregar(secuencia, t_sensor_ns, valores, llegada_ns / 1e9)
+        self._agregar_sincronizadas(t, v, llegada_ns)
+
+    def _agregar_sincronizadas(self, t_sensor_ns, valores, llegada_ns):
+        if len(t_sensor_ns) == 0:
+            return
+        t_ns = self.reloj.a_servidor(np.asarray(t_sensor_ns, dtype=np.int64))
+        # Si el offset se corrigió hacia atrás, no dejar que el tiempo retroceda en el buffer
+        if self.buffer.disponibles:
+            t_ns = np.maximum(t_ns, self.buffer.ultimas(1)[0][-1])
+        self.agregar_lote(t_ns, valores, llegada_ns)
+
+    # --- Grabación ---
+
+    @_con_lock
+    def iniciar_grabacion(self, nombre_sesion="mpu_data"):
+        """Crea los archivos CSV y prepara la grabación"""
+        # Si había algo abierto por error, lo cerramos antes de abrir uno nuevo
+        self.detener_grabacion()
+
+        self.id = uuid.uuid4().hex
+        timestamp = now_local().strftime("%Y%m%d_%H%M%S")
+        if self.dispositivo != DISPOSITIVO_DEFECTO:
+            nombre_sesion = f"{nombre_sesion}_{self.dispositivo}"
+        csv_filename = f"{nombre_sesion}_{timestamp}.csv"
+        act_filename = f"Notas_{nombre_sesion}_{timestamp}.csv"
+
+        os.makedirs("grabaciones_vivo", exist_ok=True)
+
+        act_path = os.path.join("grabaciones_vivo", act_filename)
+
+        # Timestamp = epoch en nanosegundos (entero): no se formatea por muestra y
+        # cargar_datos lo lee sin parsear texto (ver convertir_timestamps)
+        self.grabador = Grabador("grabaciones_vivo", csv_filename,
+                                 ["Timestamp", "Yaw", "Pitch", "Roll", "Ax", "Ay", "Az"])
+
+        self.act_file = open(act_path, "w", newline="", encoding="utf-8")
+        self.act_writer = csv.writer(self.act_file)
+        self.act_writer.writerow(["inicio", "fin", "actividad"])  # epoch en ns, como Timestamp
+
+        self.analisis = AnalisisIncremental() if ANALISIS_VIVO else None
+        self.analisis_terminado = None
+        self.csv_filename = csv_filename
+        print(f"Grabación iniciada ({self.dispositivo}): {csv_filename}")
+        return csv_filename
+
+    @_con_lock
+    def registrar_actividad(self, descripcion):
+        """Registra o cambia la actividad actual"""
+        # Validación extra
+        if not self.act_file or not self.act_writer:
+            return
+
+        ahora = time.time_ns()
+
+        if self.actividad_actual is not None:
+            # Cerrar actividad anterior
+            try:
+                self.act_writer.writerow([self.inicio_actual, ahora, self.actividad_actual])
+                self.act_file.flush()
+            except: pass
+
+        # Iniciar nueva
+        self.actividad_actual = descripcion
+        self.inicio_actual = ahora
+        print(f"Nueva actividad ({self.dispositivo}): {descripcion}")
+
+    @_con_lock
+    def detener_grabacion(self):
+        """
+        Cierra archivos y registra la última actividad si está abierta.
+        Devuelve los nombres de los segmentos CSV grabados (más de uno si hubo rotación).
+        """
+        if self.actividad_actual is not None and self.act_file and not self.act_file.closed and self.act_writer:
+            try:
+                self.act_writer.writerow([self.inicio_actual, time.time_ns(), self.actividad_actual])
+                self.act_file.flush()
+            except ValueError:
+                pass # Archivo ya estaba cerrado
+
+        segmentos = []
+        if self.grabador is not None:
+            segmentos = self.grabador.cerrar()
+        if self.analisis is not None:
+            # Ya no entran muestras: el resultado se completa fuera del lock (resultado_analisis)
+            self.analisis_terminado = self.analisis
+            self.analisis = None
+        if self.act_file:
+            try:
+                self.act_file.close()
+            except: pass
+
+        # Ponemos todo en None para que agregar_muestra sepa que no debe escribir
+        self.grabador = None
+        self.act_file = None
+        self.act_writer = None
+        self.actividad_actual = None
+
+        print(f"Grabación detenida y archivos cerrados ({self.dispositivo}).")
+
+        # Limpiar buffers
+        self.buffer.limpiar()
+        self.detector.reiniciar()
+        self.muestras_detector = self.buffer.total
+
+        # Opcional: notificar al frontend que se detuvo
+        if socketio:
+            socketio.emit('datos_vivo', self.frame_completo(), to=self.sala)
+            socketio.emit('grabacion_detenida', {"dispositivo": self.dispositivo}, to=self.sala)
+
+        return segmentos
+
+    # --- Frames para el gráfico ---
+
+    def datos_grafico(self, n):
+        """
+        Últimas n muestras en el formato del gráfico en vivo.
+        Los tiempos van como epoch en milisegundos (t_ms); el navegador los formatea.
+        """
+        t, valores = self.buffer.ultimas(n)
+        return {
+            "dispositivo": self.dispositivo,
+            "t_ms": (t // 1_000_000).tolist(),
+            "yaw": valores[:, 0].tolist(),
+            "pitch": valores[:, 1].tolist(),
+            "roll": valores[:, 2].tolist()
+        }
+
+    @_con_lock
+    def datos_desde(self, since=None, limite=MAX_POLL):
+        """
+        Muestras con secuencia > since, para el polling HTTP.
+        La secuencia de una muestra es su índice absoluto en el buffer: crece
+        siempre, también entre grabaciones. Con since=None (o si el cliente se
+        atrasó más de lo que guarda el buffer, o el servidor se reinició) se
+        devuelven las últimas MAX_LEN con "completo": True (el cliente reemplaza
+        lo que tiene en lugar de agregar). Si hay más de `limite` nuevas se
+        devuelven las primeras y "hay_mas": True.
+        """
+        total = self.buffer.total
+        completo = since is None or since >= total
+        if completo:
+            t, valores, primero = self.buffer.desde(total - MAX_LEN)
+        else:
+            t, valores, primero = self.buffer.desde(since + 1)
+            completo = primero > since + 1  # se perdió algo: lo que sigue no empalma
+        hay_mas = len(t) > limite
+        t, valores = t[:limite], valores[:limite]
+        return {
+            "dispositivo": self.dispositivo,
+            "seq": list(range(primero, primero + len(t))),
+            "ultimo": primero + len(t) - 1,  # el `since` del próximo poll
+            "completo": bool(completo),
+            "hay_mas": bool(hay_mas),
+            "t_ms": (t // 1_000_000).tolist(),
+            "yaw": valores[:, 0].tolist(),
+            "pitch": valores[:, 1].tolist(),
+            "roll": valores[:, 2].tolist()
+        }
+
+    def esperar_muestras(self, since, espera_s):
+        """Long-polling: espera hasta `espera_s` a que haya alguna muestra con secuencia > since"""
+        limite = time.monotonic() + min(espera_s, ESPERA_POLL_MAX_S)
+        periodo = 1.0 / FPS_DIFUSION
+        while self.buffer.total == since + 1:  # al día: nada nuevo todavía
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return False
+            (socketio.sleep if socketio else time.sleep)(min(periodo, restante))
+        return True
+
+    def etag(self):
+        """Cambia cuando llega una muestra nueva (o empieza otra grabación)"""
+        return f'"{self.id}-{self.buffer.total}"'
+
+    @_con_lock
+    def suscribir(self, sid, con_ack=False):
+        """Agrega un dashboard y le manda la ventana completa (después recibe deltas)"""
+        self.flujo.agregar(sid, con_ack)
+        frame = self.frame_completo()
+        self.flujo.marcar_enviado(sid, frame["n"])
+        self.latencia.registrar_suscripcion(sid, frame["n"])
+        socketio.emit('datos_vivo', frame, to=sid)
+
+    @_con_lock
+    def quitar_suscriptor(self, sid):
+        self.flujo.quitar(sid)
+        self.latencia.quitar(sid)
+
+    @_con_lock
+    def confirmar_frame(self, sid, numero, recibido_ns):
+        """'ack_vivo' de un dashboard: control de flujo y latencia de entrega"""
+        self.flujo.confirmar(sid, numero)
+        self.latencia.registrar_ack(sid, numero, recibido_ns)
+
+    def frame_completo(self, numero=None):
+        """`numero` identifica el frame para el 'ack_vivo' del cliente (ver flujo_vivo.py)"""
+        numero = self.flujo.numero_frame if numero is None else numero
+        return {"tipo": "completo", "n": numero, "max_len": MAX_LEN, **self.datos_grafico(MAX_LEN)}
+
+    def frame_delta(self, n, numero):
+        """Últimas n muestras del buffer"""
+        return {"tipo": "delta", "n": numero, "max_len": MAX_LEN, **self.datos_grafico(n)}
+
+    def actualizar_detector(self):
+        """Pasa al detector las muestras nuevas; devuelve los estados de los saltos completados"""
+        t, valores, _ = self.buffer.desde(self.muestras_detector)
+        self.muestras_detector = self.buffer.total
+        if len(t) == 0:
+            return []
+        return self.detector.procesar(t, valores)
+
+    @_con_lock
+    def difundir(self):
+        """Emite a la sala del dispositivo lo que llegó desde el frame anterior (si hay a quién)"""
+        if self.reorden.hay_pendientes:
+            # Muestras retenidas esperando un hueco que no llega: liberarlas al vencer la espera
+            # (para la latencia cuentan como llegadas ahora: la espera queda en la etapa "sensor")
+            ahora_ns = time.time_ns()
+            self._agregar_sincronizadas(*self.reorden.entregar(ahora_ns / 1e9), ahora_ns)
+        estados = self.actualizar_detector()
+        desde = self.muestras_emitidas
+        nuevas = self.buffer.total - desde
+        if nuevas <= 0:
+            return
+        self.muestras_emitidas = self.buffer.total
+        if not self.suscriptores:
+            return
+
+        if estados:
+            sids = self.flujo.al_dia()
+            for estado in estados:
+                if sids:
+                    socketio.emit('tremor_estado', {"dispositivo": self.dispositivo, **estado}, to=sids)
+
+        # Cada frame se arma una sola vez y se manda en un solo emit a todos los que
+        # están al día; los atrasados se saltean y después reciben un completo
+        ahora = time.monotonic()
+        completo_para_todos = ahora - self.ultimo_keyframe >= KEYFRAME_CADA_S or nuevas >= MAX_LEN
+        if completo_para_todos:
+            self.ultimo_keyframe = ahora
+        numero, sids_delta, sids_completo = self.flujo.repartir(completo_para_todos)
+        if sids_delta:
+            socketio.emit('datos_vivo', self.frame_delta(nuevas, numero), to=sids_delta)
+        if sids_completo:
+            socketio.emit('datos_vivo', self.frame_completo(numero), to=sids_completo)
+        if sids_delta or sids_completo:
+            self.latencia.registrar_emision(numero, desde, self.buffer.total, time.time_ns())
+
+    def resultado_analisis(self):
+        """
+        Resultado del análisis de la última grabación (mismo formato que procesar_csv_logic)
+        y el analizador, para abrir una sesión de re-análisis; (None, None) si no hay.
+        Se entrega una sola vez.
+        """
+        with self._lock:
+            analizador, self.analisis_terminado = self.analisis_terminado, None
+        if analizador is None:
+            return None, None
+        return analizador.finalizar(), analizador
+
+    def espectro(self):
+        """Espectro de los últimos VENTANA_ESPECTRO_S segundos (se recalcula sólo si hay muestras nuevas)"""
+        with self._lock:
+            if self.buffer.total == self.muestras_espectro:
+                return self.ultimo_espectro
+            self.muestras_espectro = self.buffer.total
+            # Margen x2 sobre la tasa nominal; después se recorta por tiempo
+            t, valores = self.buffer.ultimas(int(2 * VENTANA_ESPECTRO_S * self.detector.SR))
+        # El cálculo, fuera del lock: la ingesta no lo espera
+        if len(t):
+            recientes = t >= t[-1] - int(VENTANA_ESPECTRO_S * 1e9)
+            t, valores = t[recientes], valores[recientes]
+        self.ultimo_espectro = calcular_espectro_vivo(t, valores)
+        return self.ultimo_espectro
+
+    @_con_lock
+    def estado(self):
+        return {
+            "dispositivo": self.dispositivo,
+            "sesion": self.id,
+            "grabando": self.grabador is not None,
+            "csv": self.csv_filename,
+            "muestras": self.buffer.total,
+            "suscriptores": len(self.suscriptores),
+            "flujo": self.flujo.estado(),
+            "secuencia": self.reorden.estado(),
+            "offset_reloj_ms": None if self.reloj.offset_ns is None else round(self.reloj.offset_ns / 1e6, 1),
+            "temblor": self.detector.ultimo,
+            "latencia": self.latencia.estado(),
+            "analisis": self.analisis.estado() if self.analisis is not None else None,
+            "reproduccion": self.reproduccion.estado() if self.reproduccion is not None else None
+        }
+
+
+def sala_de(dispositivo):
+    """Sala de Socket.IO de los dashboards de un dispositivo"""
+    return f"vivo:{dispositivo or DISPOSITIVO_DEFECTO}"
+
+
+class RegistroSesionesVivo:
+    """
+    Sesiones en vivo por dispositivo (se crean con la primera muestra o suscripción).
+    Sólo tiene las de los dispositivos de los que este worker es dueño; del resto
+    sabe quién es el dueño por el backend.
+    """
+
+    def __init__(self, backend=None):
+        self._sesiones = {}
+        self._lock = threading.Lock()
+        self.backend = backend or BackendLocal()
+        self._remotos = {}  # sid -> {dispositivo: worker} dashboards de acá suscriptos a dispositivos de otro worker
+
+    def dueno_remoto(self, dispositivo=None):
+        """Worker dueño del dispositivo si no es este; None si es de este (lo reclama si no tenía dueño)"""
+        dispositivo = dispositivo or DISPOSITIVO_DEFECTO
+        if dispositivo in self._sesiones:
+            return None
+        worker = self.backend.dueno(dispositivo)
+        return None if worker == self.backend.worker else worker
+
+    def obtener(self, dispositivo=None, crear=True):
+        dispositivo = dispositivo or DISPOSITIVO_DEFECTO
+        with self._lock:
+            sesion = self._sesiones.get(dispositivo)
+            if sesion is None and crear:
+                sesion = self._sesiones[dispositivo] = SesionVivo(dispositivo)
+            return sesion
+
+    def por_id(self, sesion_id):
+        with self._lock:
+            return next((s for s in self._sesiones.values() if s.id == sesion_id), None)
+
+    def dispositivo_de_sesion(self, sesion_id):
+        """Dispositivo de una sesión de este worker o de otro (None si no existe)"""
+        sesion = self.por_id(sesion_id)
+        if sesion is not None:
+            return sesion.dispositivo
+        return next((d for d, e in self.backend.estados().items() if e.get("sesion") == sesion_id), None)
+
+    def todas(self):
+        with self._lock:
+            return list(self._sesiones.values())
+
+    def ceder(self, dispositivo):
+        """Otro worker se quedó con el dispositivo: se cierra lo que se estaba grabando y se suelta la sesión"""
+        with self._lock:
+            sesion = self._sesiones.pop(dispositivo, None)
+        if sesion is not None:
+            sesion.detener_grabacion()
+            print(f"El dispositivo {dispositivo} pasó a otro worker, se suelta su sesión")
+
+    def recordar_remoto(self, sid, dispositivo, worker):
+        self._remotos.setdefault(sid, {})[dispositivo or DISPOSITIVO_DEFECTO] = worker
+
+    def olvidar_remoto(self, sid, dispositivo):
+        self._remotos.get(sid, {}).pop(dispositivo or DISPOSITIVO_DEFECTO, None)
+
+    def quitar_suscriptor(self, sid):
+        for sesion in self.todas():
+            sesion.quitar_suscriptor(sid)
+        for dispositivo, worker in self._remotos.pop(sid, {}).items():
+            self.backend.enviar(worker, "desuscribir", {"sid": sid, "dispositivo": dispositivo})
+
+    def estado(self):
+        """Las sesiones de todos los workers (las de otros, como las publicaron sus dueños)"""
+        estados = self.backend.estados()
+        estados.update({s.dispositivo: s.estado() for s in self.todas()})
+        return list(estados.values())
+
+
+sesiones_vivo = RegistroSesionesVivo(crear_backend())
+
+# Lo que otros workers le pueden pedir al dueño de un dispositivo: op -> función(**args)
+COMANDOS = {}
+
+
+def registrar_comando(op, funcion):
+    COMANDOS[op] = funcion
+
+
+def atender_comando(op, args):
+    return COMANDOS[op](**args)
+
+
+def reenviar_al_dueno(op, dispositivo=None, esperar=False, timeout=TIMEOUT_COMANDO_S, **args):
+    """
+    Si el dispositivo es de otro worker, le pasa `op` y devuelve (True, respuesta);
+    si es de este devuelve (False, None) y lo atiende quien llamó.
+    """
+    worker = sesiones_vivo.dueno_remoto(dispositivo)
+    if worker is None:
+        return False, None
+    return True, sesiones_vivo.backend.enviar(worker, op, {"dispositivo": dispositivo, **args}, esperar, timeout)
 
 
 def set_socketio_instance(sio: SocketIO):
     """Llamar desde app.py para inyectar la instancia de SocketIO"""
-    global socketio
+    global socketio, difusor_activo
     socketio = sio
+    if not difusor_activo:
+        difusor_activo = True
+        socketio.start_background_task(bucle_difusion)
+        socketio.start_background_task(bucle_espectro)
+        if ANALISIS_VIVO:
+            socketio.start_background_task(bucle_analisis)
+        if not isinstance(sesiones_vivo.backend, BackendLocal):
+            sesiones_vivo.backend.iniciar(atender_comando, socketio.start_background_task)
+            socketio.start_background_task(bucle_backend)
 
 
-def iniciar_grabacion(nombre_sesion="mpu_data"):
-    """Crea los archivos CSV y prepara la grabación"""
-    global csv_file, csv_writer, act_file, act_writer
-    
-    # Si había algo abierto por error, lo cerramos antes de abrir uno nuevo
-    detener_grabacion()
-
-    timestamp = now_local().strftime("%Y%m%d_%H%M%S")
-    csv_filename = f"{nombre_sesion}_{timestamp}.csv"
-    act_filename = f"Notas_{nombre_sesion}_{timestamp}.csv"
-    
-    os.makedirs("grabaciones_vivo", exist_ok=True)
-    
-    csv_path = os.path.join("grabaciones_vivo", csv_filename)
-    act_path = os.path.join("grabaciones_vivo", act_filename)
-    
-    csv_file = open(csv_path, "w", newline="", encoding="utf-8")
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(["Timestamp", "Yaw", "Pitch", "Roll", "Ax", "Ay", "Az"])
-    
-    act_file = open(act_path, "w", newline="", encoding="utf-8")
-    act_writer = csv.writer(act_file)
-    act_writer.writerow(["inicio", "fin", "actividad"])
-    
-    print(f"Grabación iniciada: {csv_filename}")
-    return csv_filename
-
-
-def registrar_actividad(descripcion):
-    """Registra o cambia la actividad actual"""
-    global actividad_actual, inicio_actual, act_writer, act_file
-    
-    # Validación extra
-    if not act_file or not act_writer:
-        return
-    
-    ahora = now_local()
-    
-    if actividad_actual is not None:
-        # Cerrar actividad anterior
+def bucle_difusion():
+    """
+    Emite 'datos_vivo' a ritmo fijo en lugar de una vez por muestra, una sala por dispositivo.
+    - delta:    sólo las muestras nuevas desde el frame anterior (el cliente las agrega)
+    - completo: la ventana entera, cada KEYFRAME_CADA_S (para clientes que se suman tarde
+                o que perdieron algún frame)
+    Si no llegó nada nuevo, o nadie está suscripto, no se emite.
+    """
+    periodo = 1.0 / FPS_DIFUSION
+    while True:
+        socketio.sleep(periodo)
+        for sesion in sesiones_vivo.todas():
+            try:
+                sesion.difundir()
+            except Exception as e:
+                print(f"Error en difusión en vivo ({sesion.dispositivo}): {e}")
+
+
+def bucle_espectro():
+    """
+    Cada 1/HZ_ESPECTRO segundos calcula, para cada dispositivo con dashboards
+    suscriptos, el espectro de la última ventana y lo emite una vez a los que
+    están al día ('espectro_vivo'; a los atrasados se les omite, ver flujo_vivo.py).
+    Corre aparte de la ingesta y de la difusión de muestras.
+    """
+    periodo = 1.0 / HZ_ESPECTRO
+    while True:
+        socketio.sleep(periodo)
+        for sesion in sesiones_vivo.todas():
+            if not sesion.suscriptores or sesion.buffer.total == sesion.muestras_espectro:
+                continue
+            try:
+                espectro = sesion.espectro()
+                sids = sesion.flujo.al_dia() if espectro is not None else None
+                if sids:
+                    socketio.emit('espectro_vivo', {"dispositivo": sesion.dispositivo, **espectro}, to=sids)
+            except Exception as e:
+                print(f"Error en espectro en vivo ({sesion.dispositivo}): {e}")
+
+
+def bucle_analisis():
+    """
+    Avanza el análisis de cada grabación en curso (AnalisisIncremental) y, si hay
+    dashboards, les manda las ventanas de 3 s que se completaron ('analisis_vivo').
+    """
+    while True:
+        socketio.sleep(INTERVALO_ANALISIS_S)
+        for sesion in sesiones_vivo.todas():
+            analizador = sesion.analisis
+            if analizador is None:
+                continue
+            try:
+                ventanas = analizador.actualizar()
+                sids = sesion.flujo.al_dia() if ventanas and sesion.suscriptores else None
+                if sids:
+                    socketio.emit('analisis_vivo', {"dispositivo": sesion.dispositivo, "ventanas": ventanas,
+                                                    **analizador.estado()}, to=sids)
+            except Exception as e:
+                print(f"Error en análisis en vivo ({sesion.dispositivo}): {e}")
+
+
+def bucle_backend():
+    """
+    Con backend compartido: renueva los dispositivos de este worker (para que
+    ningún otro los reclame), suelta los que ya reclamó otro y publica sus
+    estados para /api/sesiones_vivo.
+    """
+    periodo = TTL_DUENO_S / 3
+    while True:
         try:
-            act_writer.writerow([
-                inicio_actual.strftime("%H:%M:%S.%f")[:-3],
-                ahora.strftime("%H:%M:%S.%f")[:-3],
-                actividad_actual
-            ])
-            act_file.flush()
-        except: pass
-    
-    # Iniciar nueva
-    actividad_actual = descripcion
-    inicio_actual = ahora
-    print(f"Nueva actividad: {descripcion}")
-
-
-def procesar_datos_ws(data_str: str):
+            for dispositivo in sesiones_vivo.backend.renovar([s.dispositivo for s in sesiones_vivo.todas()]):
+                sesiones_vivo.ceder(dispositivo)
+            sesiones = sesiones_vivo.todas()
+            sesiones_vivo.backend.publicar_estados({s.dispositivo: s.estado() for s in sesiones})
+        except Exception as e:
+            print(f"Error en backend en vivo: {e}")
+        socketio.sleep(periodo)
+
+
+def cola_salida(sid):
+    """Paquetes esperando en la cola de salida de Engine.IO del cliente (0 si no se puede saber)"""
+    try:
+        eio_sid = socketio.server.manager.eio_sid_from_sid(sid, '/')
+        socket_eio = socketio.server.eio.sockets.get(eio_sid)
+        return socket_eio.queue.qsize() if socket_eio is not None else 0
+    except Exception:
+        return 0
+
+
+def suscribir(sid, dispositivo=None, con_ack=False):
+    """
+    Suscribe un dashboard al dispositivo (le llega la ventana completa); devuelve la
+    sala a la que tiene que entrar.
+    con_ack=True: el cliente confirma cada frame con 'ack_vivo' {"n": ..} y el servidor
+    no le manda más de MAX_PENDIENTES sin confirmar.
+    """
+    worker = sesiones_vivo.dueno_remoto(dispositivo)
+    if worker is not None:
+        sesiones_vivo.recordar_remoto(sid, dispositivo, worker)
+        sesiones_vivo.backend.enviar(worker, "suscribir", {"sid": sid, "dispositivo": dispositivo, "con_ack": con_ack})
+    else:
+        _suscribir(sid, dispositivo, con_ack)
+    return sala_de(dispositivo)
+
+
+def _suscribir(sid, dispositivo=None, con_ack=False):
+    sesiones_vivo.obtener(dispositivo).suscribir(sid, con_ack)
+
+
+def desuscribir(sid, dispositivo=None):
+    """Devuelve la sala de la que tiene que salir el dashboard"""
+    sesiones_vivo.olvidar_remoto(sid, dispositivo)
+    reenviado, _ = reenviar_al_dueno("desuscribir", dispositivo, sid=sid)
+    if not reenviado:
+        _desuscribir(sid, dispositivo)
+    return sala_de(dispositivo)
+
+
+def _desuscribir(sid, dispositivo=None):
+    sesion = sesiones_vivo.obtener(dispositivo, crear=False)
+    if sesion is not None:
+        sesion.quitar_suscriptor(sid)
+
+
+def confirmar_frame(sid, numero, dispositivo=None):
+    """El ack se fecha al llegar (también si se reenvía al dueño: la latencia no incluye el reenvío)"""
+    recibido_ns = time.time_ns()
+    reenviado, _ = reenviar_al_dueno("confirmar_frame", dispositivo, sid=sid, numero=numero, recibido_ns=recibido_ns)
+    if not reenviado:
+        _confirmar_frame(sid, numero, dispositivo, recibido_ns)
+
+
+def _confirmar_frame(sid, numero, dispositivo=None, recibido_ns=None):
+    sesion = sesiones_vivo.obtener(dispositivo, crear=False)
+    if sesion is not None:
+        sesion.confirmar_frame(sid, numero, recibido_ns or time.time_ns())
+
+
+def procesar_datos_ws(data_str: str, dispositivo=None):
     """
     Se llama cada vez que llega un mensaje WebSocket desde el ESP.
     data_str es el JSON que envía el ESP: {"y":.., "p":.., "r":.., "ax":.., "ay":.., "az":..}
+    Si el JSON trae "id", ese es el dispositivo; si no, el de la conexión (o el por defecto).
+    Si trae "m" es un lote con reloj y secuencia del sensor (ver procesar_lote_json).
     """
     import json
-    global csv_writer, csv_file
     try:
-        datos = json.loads(data_str)
+        datos = json.loads(data_str) if isinstance(data_str, str) else data_str
+        if "m" in datos:
+            procesar_lote_json(datos, dispositivo)
+            return
         yaw = float(datos.get("y", 0))
         pitch = float(datos.get("p", 0))
         roll = float(datos.get("r", 0))
         ax = float(datos.get("ax", 0))
         ay = float(datos.get("ay", 0))
         az = float(datos.get("az", 0))
-        
-        timestamp = now_local().strftime("%H:%M:%S.%f")[:-3]
-        
-        # Actualizar buffer para gráfico en vivo
-        live_data["timestamps"].append(timestamp)
-        live_data["yaw"].append(yaw)
-        live_data["pitch"].append(pitch)
-        live_data["roll"].append(roll)
-        
-        # Guardar en CSV si está grabando
-        if csv_writer and csv_file and not csv_file.closed:
-            csv_writer.writerow([timestamp, yaw, pitch, roll, ax, ay, az])
-            #csv_file.flush()
-        
-        # Emitir datos actualizados a TODOS los clientes conectados al frontend
-        if socketio:
-            socketio.emit('datos_vivo', obtener_datos_vivo())
-            
+
+        _agregar_muestra(datos.get("id") or dispositivo, time.time_ns(), (yaw, pitch, roll, ax, ay, az))
+
+        # La emisión a los clientes la hace bucle_difusion (agrupando muestras)
+
     except Exception as e:
         print(f"Error procesando datos WS: {e}")
 
 
-def detener_grabacion():
-    """Cierra archivos y registra la última actividad si está abierta"""
-    global actividad_actual, inicio_actual, csv_file, act_file, csv_writer, act_writer
-    
-    if actividad_actual is not None and act_file and not act_file.closed and act_writer:
-        ahora = datetime.now()
-        try:
-            act_writer.writerow([
-                inicio_actual.strftime("%H:%M:%S.%f")[:-3],
-                ahora.strftime("%H:%M:%S.%f")[:-3],
-                actividad_actual
-            ])
-            act_file.flush()
-        except ValueError:
-            pass # Archivo ya estaba cerrado
-    
-    if csv_file:
-        try:
-            csv_file.close()
-        except: pass
-    if act_file:
-        try:
-            act_file.close()
-        except: pass
-
-    # Ponemos todo en None para que procesar_datos_ws sepa que no debe escribir
-    csv_file = None
-    csv_writer = None
-    act_file = None
-    act_writer = None
-    actividad_actual = None
-    
-    print("Grabación detenida y archivos cerrados.")
-    
-    # Limpiar buffers
-    for key in live_data:
-        live_data[key].clear()
-    
-    # Opcional: notificar al frontend que se detuvo
-    if socketio:
-        socketio.emit('grabacion_detenida')
-
-
-def obtener_datos_vivo():
-    """Devuelve los datos actuales del buffer para el gráfico"""
-    return {
-        "labels": list(live_data["timestamps"]),
-        "yaw": list(live_data["yaw"]),
-        "pitch": list(live_data["pitch"]),
-        "roll": list(live_data["roll"])
-    }
\ No newline at end of file
+def procesar_frame_binario(datos, dispositivo=None):
+    """
+    Frame binario con una o más muestras (ver formato_binario.py), decodificado en bloque.
+    Los tiempos son los del reloj del sensor (t_us); ver SesionVivo.ingresar_sensor.
+    """
+    try:
+        llegada_ns = time.time_ns()
+        id_frame, secuencia, t_us, valores = decodificar_frame(datos)
+        if len(t_us) == 0:
+            return
+        ingresar_sensor(id_frame or dispositivo, secuencia, t_us.astype(np.int64) * 1000, valores, llegada_ns)
+    except Exception as e:
+        print(f"Error procesando frame binario: {e}")
+
+
+def procesar_lote_json(datos, dispositivo=None, llegada_ns=None):
+    """
+    Lote de muestras en JSON, con reloj y secuencia del sensor:
+        {"id": "<dispositivo>", "seq": 120, "t_ms": [..] (o "t_us"), "m": [[y, p, r, ax, ay, az], ...]}
+    "seq" es la secuencia de la primera fila de "m"; "id" es opcional. Sin "seq" no hay
+    reorden ni descarte de duplicadas (sólo se sincroniza el reloj).
+    """
+    llegada_ns = llegada_ns or time.time_ns()
+    valores = np.asarray(datos["m"], dtype=float).reshape(len(datos["m"]), -1)
+    if len(valores) == 0:
+        return
+    if valores.shape[1] < 6:
+        valores = np.hstack([valores, np.zeros((len(valores), 6 - valores.shape[1]))])
+    if "t_us" in datos:
+        t_sensor_ns = np.asarray(datos["t_us"], dtype=np.int64) * 1000
+    elif "t_ms" in datos:
+        t_sensor_ns = np.asarray(datos["t_ms"], dtype=np.int64) * 1_000_000
+    else:
+        raise ValueError("El lote necesita 't_ms' o 't_us'")
+    if len(t_sensor_ns) != len(valores):
+        raise ValueError("El lote tiene distinta cantidad de tiempos que de muestras")
+
+    secuencia = int(datos["seq"]) if datos.get("seq") is not None else None
+    ingresar_sensor(datos.get("id") or dispositivo, secuencia, t_sensor_ns, valores[:, :6], llegada_ns)
+
+
+# Si el sensor se conectó a un worker que no es el dueño, sus muestras se reenvían
+# (ya decodificadas, con la hora de llegada original)
+
+def _agregar_muestra(dispositivo, t_ns, valores):
+    reenviado, _ = reenviar_al_dueno("agregar_muestra", dispositivo, t_ns=t_ns, valores=list(valores))
+    if not reenviado:
+        sesiones_vivo.obtener(dispositivo).agregar_muestra(t_ns, tuple(valores))
+
+
+def ingresar_sensor(dispositivo, secuencia, t_sensor_ns, valores, llegada_ns):
+    """Muestras con reloj del sensor (ver SesionVivo.ingresar_sensor), en el worker dueño del dispositivo"""
+    reenviado, _ = reenviar_al_dueno("ingresar_sensor", dispositivo, secuencia=secuencia,
+                                     t_sensor_ns=t_sensor_ns.tolist(), valores=valores.tolist(),
+                                     llegada_ns=llegada_ns)
+    if not reenviado:
+        sesiones_vivo.obtener(dispositivo).ingresar_sensor(secuencia, t_sensor_ns, valores, llegada_ns)
+
+
+def agregar_lote(dispositivo, t_ns, valores):
+    """Muestras ya en el reloj del servidor (p. ej. una reproducción), en el worker dueño del dispositivo"""
+    t_ns = np.asarray(t_ns, dtype=np.int64)
+    reenviado, _ = reenviar_al_dueno("agregar_lote", dispositivo, t_ns=t_ns.tolist(), valores=valores.tolist())
+    if not reenviado:
+        sesiones_vivo.obtener(dispositivo).agregar_lote(t_ns, valores)
+
+
+registrar_comando("suscribir", _suscribir)
+registrar_comando("desuscribir", _desuscribir)
+registrar_comando("confirmar_frame", _confirmar_frame)
+registrar_comando("agregar_muestra",
+                  lambda dispositivo, t_ns, valores: sesiones_vivo.obtener(dispositivo).agregar_muestra(
+                      t_ns, tuple(valores)))
+registrar_comando("agregar_lote",
+                  lambda dispositivo, t_ns, valores: sesiones_vivo.obtener(dispositivo).agregar_lote(
+                      np.asarray(t_ns, dtype=np.int64), np.asarray(valores, dtype=float)))
+registrar_comando("ingresar_sensor",
+                  lambda dispositivo, secuencia, t_sensor_ns, valores, llegada_ns: sesiones_vivo.obtener(
+                      dispositivo).ingresar_sensor(secuencia, np.asarray(t_sensor_ns, dtype=np.int64),
+                                                   np.asarray(valores, dtype=float), llegada_ns))
@@ -1,111 +1,358 @@
 # === PRIMERO DE TODO: eventlet monkey_patch ===
-import eventlet
-eventlet.monkey_patch()
-# =============================================
+# (salvo que esta app la sirva app_asgi.py, en asyncio)
 import os
+SERVIDOR_ASGI = os.environ.get("MOTIO_SERVIDOR") == "asgi"
+if not SERVIDOR_ASGI:
+    import eventlet
+    eventlet.monkey_patch()
+# =============================================
 import io
 import csv
+import json
+import time
+import threading
 import pandas as pd
 import numpy as np
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, leave_room
 import scipy.signal as signal
 from scipy.signal import butter, filtfilt, hilbert
 from spectrum import pburg
 
 # --- IMPORTS DE MÓDULOS PROPIOS ---
-from analisis_core import cargar_datos, detectar_temblor, cuantificar_temblor, frecuencia_temblor
+from analisis_core import (
+    cargar_datos,
+    detectar_temblor,
+    cuantificar_temblor,
+    frecuencia_temblor,
+    filtrar_deriva,
+    detectar_ventanas,
+    eliminar_ventanas_aisladas,
+    unificar_ejes,
+    rms_banda_temblor,
+    detectar_episodios,
+    calcular_factor_diezmo,
+    serializar_episodios
+)
+from admision import control_analisis, AnalisisRechazado, contar_muestras, MAX_MUESTRAS_COMPLETO, ESPERA_MAX_COLA
+from sesiones_analisis import sesiones_analisis, TTL_SESION, PARAMETROS_DEFECTO
+from piramide import PUNTOS_DEFECTO
+from espectrograma import N_FRECUENCIAS_DEFECTO
+from ingesta_ws import IngestaWSMiddleware
 from analisis_vivo_core_websockets import (
     set_socketio_instance,
-    iniciar_grabacion,
-    registrar_actividad,
-    detener_grabacion,
-    obtener_datos_vivo,
-    procesar_datos_ws
+    sesiones_vivo,
+    suscribir,
+    desuscribir,
+    confirmar_frame,
+    procesar_datos_ws,
+    procesar_frame_binario,
+    registrar_comando,
+    reenviar_al_dueno,
+    ESPERA_POLL_MAX_S
 )
+from backend_vivo import TIMEOUT_COMANDO_S
+from reproduccion_vivo import reproducciones, dispositivo_defecto, DIRECTORIO_SD
 
 app = Flask(__name__)
 CORS(app)
 
 # --- SOCKETIO PARA WEBSOCKETS ---
-socketio = SocketIO(app, cors_allowed_origins="*", allow_eio3=True)
+# Con backend compartido (MOTIO_BACKEND_VIVO=redis) los emits pasan por la cola de
+# mensajes y llegan a los dashboards conectados a cualquier worker
+# Con ASGI, Socket.IO lo atiende el AsyncServer de app_asgi.py y este queda sin uso
+socketio = SocketIO(app, cors_allowed_origins="*", allow_eio3=True,
+                    async_mode="threading" if SERVIDOR_ASGI else None,
+                    message_queue=None if SERVIDOR_ASGI else sesiones_vivo.backend.url_cola_mensajes)
+
+if not SERVIDOR_ASGI:
+    # Inyectamos la instancia de SocketIO al módulo de análisis vivo
+    set_socketio_instance(socketio)
 
-# Inyectamos la instancia de SocketIO al módulo de análisis vivo
-set_socketio_instance(socketio)
+    # WebSocket crudo para sensores (/ws/ingresar_datos) por delante de Flask + Socket.IO
+    ingesta_ws = IngestaWSMiddleware(app.wsgi_app)
+    app.wsgi_app = ingesta_ws
+else:
+    ingesta_ws = None  # app_asgi.py pone la suya (IngestaWSASGI)
+
+# sid de Socket.IO -> dispositivo, para sensores que se identifican al conectar
+# (ws://.../socket.io/?EIO=4&transport=websocket&dispositivo=<id>)
+dispositivos_por_sid = {}
 
 # --- NAMESPACE PARA DATOS DEL SENSOR ---
 @socketio.on('connect')
 def handle_connect():
     print("[WS] Sensor conectado al backend")
+    dispositivo = request.args.get('dispositivo')
+    if dispositivo:
+        dispositivos_por_sid[request.sid] = dispositivo
 
 @socketio.on('disconnect')
 def handle_disconnect():
     print("[WS] Sensor desconectado")
+    dispositivos_por_sid.pop(request.sid, None)
+    sesiones_vivo.quitar_suscriptor(request.sid)
 
 # El ESP envía mensajes de texto (JSON string)
 @socketio.on('message')
 def handle_sensor_data(data):
     # data es el string JSON que envía el ESP
-    procesar_datos_ws(str(data))
+    procesar_datos_ws(str(data), dispositivos_por_sid.get(request.sid))
+
+# Lotes JSON con reloj y secuencia del sensor, sin doble codificación:
+# 42["muestras",{"seq":120,"t_ms":[...],"m":[[y,p,r,ax,ay,az],...]}]
+@socketio.on('muestras')
+def handle_sensor_lote(data):
+    procesar_datos_ws(data, dispositivos_por_sid.get(request.sid))
+
+# Frames binarios con varias muestras (formato_binario.py): 451-["muestras_bin",{"_placeholder":true,"num":0}]
+@socketio.on('muestras_bin')
+def handle_sensor_binario(data):
+    procesar_frame_binario(data, dispositivos_por_sid.get(request.sid))
+
+# Los dashboards eligen qué dispositivo ver: {"dispositivo": "<id>"} (vacío = el por defecto)
+# Con "ack": true el dashboard confirma cada frame ('ack_vivo') y recibe control de flujo por ack
+@socketio.on('suscribir')
+def handle_suscribir(data=None):
+    data = data or {}
+    # Los dashboards reciben deltas: al suscribirse les llega la ventana completa
+    join_room(suscribir(request.sid, data.get('dispositivo'), bool(data.get('ack'))))
+
+@socketio.on('ack_vivo')
+def handle_ack_vivo(data=None):
+    data = data or {}
+    confirmar_frame(request.sid, data.get('n'), data.get('dispositivo'))
+
+@socketio.on('desuscribir')
+def handle_desuscribir(data=None):
+    leave_room(desuscribir(request.sid, (data or {}).get('dispositivo')))
 
 
 # --- ENDPOINTS HTTP (para frontend y control) ---
 @app.route('/api/leer_datos', methods=['POST'])
 def leer_datos():
-    """Control de grabación y polling de datos en vivo"""
-    global csv_filename
-    
-    action = request.json.get('action')
+    """
+    Control de grabación y polling de datos en vivo.
+    Se elige la sesión con "sesion" (id) o "dispositivo"; sin ninguno, el dispositivo por defecto.
+    Si el dispositivo es de otro worker, la acción se le pasa a ese worker.
+    """
+    datos = request.json
+    sesion_id = datos.get('sesion')
+    if sesion_id:
+        dispositivo = sesiones_vivo.dispositivo_de_sesion(sesion_id)
+        if dispositivo is None:
+            return jsonify({"error": "Sesión en vivo inexistente"}), 404
+    else:
+        dispositivo = datos.get('dispositivo')
+
+    return atender_en_dueno('leer_datos', dispositivo, accion_leer_datos,
+                            timeout=TIMEOUT_COMANDO_S + ESPERA_POLL_MAX_S,
+                            datos=datos, if_none_match=request.headers.get('If-None-Match'))
+
+
+def atender_en_dueno(op, dispositivo, accion, timeout=TIMEOUT_COMANDO_S, **args):
+    """
+    Atiende accion(dispositivo, **args) -> (cuerpo, status, encabezados) en el worker dueño
+    del dispositivo: acá si es este, o pasándole `op` (registrado con registrar_comando)
+    """
+    reenviado, respuesta = reenviar_al_dueno(op, dispositivo, esperar=True, timeout=timeout, **args)
+    if not reenviado:
+        respuesta = accion(dispositivo, **args)
+    elif respuesta is None:
+        return jsonify({"error": "El worker del dispositivo no respondió"}), 504
+    return respuesta_de(*respuesta)
+
+
+def respuesta_de(cuerpo, status, encabezados):
+    """(cuerpo, status, encabezados) de una acción -> respuesta de Flask"""
+    resultado = jsonify(cuerpo) if cuerpo is not None else Response()
+    resultado.status_code = status
+    resultado.headers.update(encabezados)
+    return resultado
+
+
+def accion_leer_datos(dispositivo, datos, if_none_match=None):
+    """Atiende una acción de /api/leer_datos en este worker: (cuerpo, status, encabezados)"""
+    sesion = sesiones_vivo.obtener(dispositivo)
+    action = datos.get('action')
     
     if action == 'start':
-        nombre_sesion = request.json.get('nombre_sesion', 'sesion_vivo')
-        csv_filename = iniciar_grabacion(nombre_sesion)
-        return jsonify({"status": "started", "csv": csv_filename})
+        nombre_sesion = datos.get('nombre_sesion', 'sesion_vivo')
+        csv_filename = sesion.iniciar_grabacion(nombre_sesion)
+        return {"status": "started", "csv": csv_filename,
+                "sesion": sesion.id, "dispositivo": sesion.dispositivo}, 200, {}
     
     elif action == 'stop':
-        detener_grabacion()
-        return jsonify({"status": "stopped", "csv": csv_filename or "no_csv"})
+        segmentos = sesion.detener_grabacion()
+        # El análisis se hizo mientras se grababa: vuelve con la respuesta, sin subir el CSV
+        return {"status": "stopped", "csv": sesion.csv_filename or "no_csv", "segmentos": segmentos,
+                "analisis": analisis_grabacion(sesion)}, 200, {}
     
     elif action == 'anotacion':
-        descripcion = request.json.get('descripcion')
+        descripcion = datos.get('descripcion')
         if descripcion:
-            registrar_actividad(descripcion)
-            return jsonify({"status": "anotacion_ok"})
-        return jsonify({"error": "Falta descripción"}), 400
+            sesion.registrar_actividad(descripcion)
+            return {"status": "anotacion_ok"}, 200, {}
+        return {"error": "Falta descripción"}, 400, {}
     
     elif action == 'poll':
-        datos = obtener_datos_vivo()
-        return jsonify(datos)
+        # Incremental: "since" = última secuencia recibida (sólo vuelve lo posterior),
+        # "espera" = segundos de long-polling si todavía no hay nada nuevo.
+        # Sin novedades: 304 (también con If-None-Match igual al último ETag).
+        try:
+            since = datos.get('since')
+            since = int(since) if since is not None else None
+            espera = float(datos.get('espera', 0))
+        except (TypeError, ValueError):
+            return {"error": "since/espera deben ser numéricos"}, 400, {}
+        if since is None and if_none_match == sesion.etag():
+            since = sesion.buffer.total - 1
+
+        if since is not None and espera > 0:
+            sesion.esperar_muestras(since, espera)
+        etag = sesion.etag()
+        if since is not None and sesion.buffer.total == since + 1:
+            return None, 304, {"ETag": etag}
+        return sesion.datos_desde(since), 200, {"ETag": etag}
+    
+    elif action == 'historial':
+        # Últimos N segundos a resolución R (min/max si R es más gruesa que las muestras)
+        try:
+            segundos = float(datos.get('segundos', 30))
+            resolucion = datos.get('resolucion')
+            resolucion = float(resolucion) if resolucion is not None else None
+        except (TypeError, ValueError):
+            return {"error": "segundos/resolucion deben ser numéricos"}, 400, {}
+        if segundos <= 0 or (resolucion is not None and resolucion <= 0):
+            return {"error": "segundos/resolucion deben ser positivos"}, 400, {}
+        return sesion.buffer.consulta(segundos, resolucion), 200, {}
     
-    return jsonify({"error": "Acción no válida"}), 400
+    return {"error": "Acción no válida"}, 400, {}
+
+
+registrar_comando('leer_datos', accion_leer_datos)
+
+
+def analisis_grabacion(sesion):
+    """
+    Resultado del análisis hecho durante la grabación, como POST /api/sesiones_analisis
+    (sesión de re-análisis + mismas métricas y gráficos que /api/analizar_datos); None si no hay.
+    """
+    try:
+        resultados, analizador = sesion.resultado_analisis()
+        if resultados is None:
+            return None
+        sesion_analisis = analizador.crear_sesion(sesiones_analisis, nombre=sesion.csv_filename)
+        return {"sesion": sesion_analisis.id, "expira_en": TTL_SESION, **resultados}
+    except Exception as e:
+        print(f"Error en el análisis de la grabación ({sesion.dispositivo}): {e}")
+        return None
+
 
+@app.route('/api/sesiones_vivo', methods=['GET'])
+def listar_sesiones_vivo():
+    """Dispositivos conectados: sesión, si está grabando, muestras y dashboards suscriptos"""
+    return jsonify({"sesiones": sesiones_vivo.estado()})
 
-# --- ANÁLISIS DE ARCHIVO CSV (sin cambios) ---
-def procesar_csv_logic(stream):
+
+@app.route('/api/latencia_vivo', methods=['GET'])
+def latencia_vivo():
+    """
+    Latencia del camino en vivo por etapa (p50/p95/p99 de la última ventana), por
+    dispositivo y por dashboard (ver latencia_vivo.py). ?dispositivo= para uno solo.
+    """
+    dispositivo = request.args.get('dispositivo')
+    latencias = {e["dispositivo"]: e.get("latencia") for e in sesiones_vivo.estado()
+                 if dispositivo is None or e["dispositivo"] == dispositivo}
+    if dispositivo is not None and not latencias:
+        return jsonify({"error": "Dispositivo sin sesión en vivo"}), 404
+    return jsonify({"latencia": latencias})
+
+
+# --- REPRODUCCIÓN DE GRABACIONES EN UNA SESIÓN EN VIVO ---
+@app.route('/api/reproducciones', methods=['POST'])
+def iniciar_reproduccion():
+    """
+    Reproduce una grabación en el dispositivo indicado, por el mismo camino que un sensor.
+    JSON {"archivo", "dispositivo"?, "velocidad"? (1-50), "desde"? (s), "repetir"?}, o
+    multipart con "file" (p. ej. un mpu_dataNN.CSV de la SD, que se guarda en
+    grabaciones_vivo/sd) y los mismos campos en el form.
+    """
+    if 'file' in request.files:
+        datos = request.form
+        file = request.files['file']
+        archivo = os.path.basename(file.filename or "")
+        if not archivo.lower().endswith(".csv"):
+            return jsonify({"error": "Sólo se reproducen archivos CSV"}), 400
+        os.makedirs(DIRECTORIO_SD, exist_ok=True)
+        file.save(os.path.join(DIRECTORIO_SD, archivo))
+    else:
+        datos = request.get_json(silent=True) or {}
+        archivo = datos.get('archivo')
+
+    # Corre en el dueño del dispositivo (los workers de una instancia comparten grabaciones_vivo)
+    opciones = {"archivo": archivo, "velocidad": datos.get('velocidad', 1), "desde": datos.get('desde', 0),
+                "repetir": str(datos.get('repetir', '')).lower() in ('1', 'true')}
+    return atender_en_dueno('reproduccion', datos.get('dispositivo') or dispositivo_defecto(archivo),
+                            accion_reproduccion, accion='iniciar', opciones=opciones)
+
+
+@app.route('/api/reproducciones', methods=['GET'])
+def listar_reproducciones():
+    """Las reproducciones de todos los workers (se publican con el estado de la sesión en vivo)"""
+    return jsonify({"reproducciones": [e["reproduccion"] for e in sesiones_vivo.estado() if e.get("reproduccion")]})
+
+
+@app.route('/api/reproducciones/<dispositivo>', methods=['DELETE'])
+def detener_reproduccion(dispositivo):
+    return atender_en_dueno('reproduccion', dispositivo, accion_reproduccion, accion='detener')
+
+
+def accion_reproduccion(dispositivo, accion, opciones=None):
+    """Inicia o detiene la reproducción de un dispositivo de este worker: (cuerpo, status, encabezados)"""
+    if accion == 'detener':
+        reproduccion = reproducciones.detener(dispositivo)
+        if reproduccion is None:
+            return {"error": "No hay reproducción para ese dispositivo"}, 404, {}
+        return reproduccion.estado(), 200, {}
+
+    try:
+        reproduccion = reproducciones.iniciar(opciones["archivo"], dispositivo, velocidad=opciones["velocidad"],
+                                              desde_s=opciones["desde"], repetir=opciones["repetir"])
+        return reproduccion.estado(), 200, {}
+    except FileNotFoundError as e:
+        return {"error": str(e)}, 404, {}
+    except ValueError as e:
+        return {"error": str(e)}, 400, {}
+    except RuntimeError as e:
+        return {"error": str(e)}, 429, {}
+
+
+registrar_comando('reproduccion', accion_reproduccion)
+
+
+# --- ANÁLISIS DE ARCHIVO CSV ---
+VENTANAS_POR_LOTE = 20  # ventanas de 3 s que se agrupan en cada línea del streaming
+
+def procesar_csv_logic(stream, rapido=False):
     df, SR = cargar_datos(stream)
-    temblores, tiene_temblor, df_filt, yaw, pitch, roll = detectar_temblor(df, SR)
+    temblores, tiene_temblor, df_filt, yaw, pitch, roll = detectar_temblor(df, SR, rapido=rapido)
     rms_ypr, episodios = cuantificar_temblor(df, SR, temblores)
-    frecuencias, f_dom_mean, freqs_std, psd_mean = frecuencia_temblor(df, episodios, SR)
+    frecuencias, f_dom_mean, freqs_std, psd_mean = frecuencia_temblor(df, episodios, SR, rapido=rapido)
 
     psd_pico = np.max(psd_mean) if len(psd_mean) > 0 else 0
 
-    factor_diezmo = 1 if len(df) < 1000 else int(len(df)/1000)
-
-    episodios_list = []
-    for inicio_ts, fin_ts, amp in episodios:
-        episodios_list.append({
-            "inicio": inicio_ts.strftime("%Y-%m-%d %H:%M:%S"),
-            "fin":    fin_ts.strftime("%Y-%m-%d %H:%M:%S"),
-            "amplitud": round(float(amp), 2)
-        })
+    factor_diezmo = calcular_factor_diezmo(len(df))
+    episodios_list = serializar_episodios(episodios)
 
     return {
         "metricas": {
             "frecuencia_dominante": round(float(f_dom_mean), 2),
             "psd_pico": round(float(psd_pico), 2),
             "sr": SR,
-            "tiene_temblor": tiene_temblor
+            "tiene_temblor": tiene_temblor,
+            "modo_rapido": rapido
         },
         "graficos": {
             "tiempo": df['Timestamp'].astype(str).iloc[::factor_diezmo].tolist(),
@@ -116,24 +363,328 @@ def procesar_csv_logic(stream):
         }
     }
 
-@app.route('/api/analizar_datos', methods=['POST'])
-def analizar_datos_endpoint():
+def procesar_csv_stream(stream, rapido=False, nombre=None):
+    """
+    Variante incremental de procesar_csv_logic: genera líneas NDJSON a medida que
+    avanza el pipeline, para que el frontend grafique sin esperar al final.
+
+    Orden de los mensajes ("tipo"):
+        meta      -> SR, cantidad de muestras/ventanas y factor de diezmo
+        ventanas  -> lote de detecciones crudas por ventana + tramo de tiempo/RMS diezmado
+        episodios -> detección final (ventanas aisladas eliminadas) y episodios
+        espectro  -> frecuencia dominante y PSD promedio (mismas métricas que procesar_csv_logic)
+        fin
+    Concatenando los "tiempo"/"rms" de todos los lotes se obtiene la misma serie
+    que devuelve /api/analizar_datos.
+
+    Los datos quedan en una sesión de análisis (id en "meta") para pedir zoom o
+    re-analizar sin volver a subir el archivo.
+    """
+    df, SR = cargar_datos(stream)
+    sesion = sesiones_analisis.crear(df, SR, nombre=nombre)
+    n = len(df)
+    window_size = 3 * SR
+    factor_diezmo = calcular_factor_diezmo(n)
+    n_ventanas = max(0, (n - window_size) // window_size + 1) if window_size > 0 else 0
+
+    yield {
+        "tipo": "meta",
+        "sesion": sesion.id,
+        "sr": SR,
+        "n_muestras": n,
+        "n_ventanas": n_ventanas,
+        "duracion_ventana": 3,
+        "factor_diezmo": factor_diezmo,
+        "modo_rapido": rapido
+    }
+
+    # El RMS es un único filtrado de toda la señal: se calcula una vez y se reparte en los lotes
+    rms_ypr = rms_banda_temblor(df, SR)
+    df_filtrado = filtrar_deriva(df, SR)
+    sesion.cachear(df_filtrado=df_filtrado, rms=rms_ypr)
+    tiempo = df['Timestamp']
+
+    def tramo_diezmado(inicio, fin):
+        # Primer índice múltiplo del factor dentro de [inicio, fin) para que los lotes empalmen
+        inicio = -(-inicio // factor_diezmo) * factor_diezmo
+        return {
+            "tiempo": tiempo.iloc[inicio:fin:factor_diezmo].astype(str).tolist(),
+            "rms": rms_ypr[inicio:fin:factor_diezmo].tolist() if len(rms_ypr) > 0 else []
+        }
+
+    temblores_yaw, temblores_pitch, temblores_roll = [], [], []
+    lote = []
+    inicio_lote = 0
+    for i, t_yaw, t_pitch, t_roll in detectar_ventanas(df_filtrado, SR, rapido):
+        temblores_yaw.append(t_yaw)
+        temblores_pitch.append(t_pitch)
+        temblores_roll.append(t_roll)
+        lote.append({
+            "temblor": bool(t_yaw[0] or t_pitch[0] or t_roll[0]),
+            "f_dom": [round(float(t[1]), 2) for t in (t_yaw, t_pitch, t_roll)],
+            "amp_dom": [round(float(t[2]), 3) for t in (t_yaw, t_pitch, t_roll)]
+        })
+        if len(lote) == VENTANAS_POR_LOTE:
+            fin_lote = (i + 1) * window_size
+            yield {"tipo": "ventanas", "desde": i + 1 - len(lote), "ventanas": lote,
+                   **tramo_diezmado(inicio_lote, fin_lote)}
+            lote = []
+            inicio_lote = fin_lote
+
+    # Último lote: incluye las muestras que no completan una ventana
+    yield {"tipo": "ventanas", "desde": len(temblores_yaw) - len(lote), "ventanas": lote,
+           **tramo_diezmado(inicio_lote, n)}
+
+    temblores = unificar_ejes(
+        eliminar_ventanas_aisladas(temblores_yaw),
+        eliminar_ventanas_aisladas(temblores_pitch),
+        eliminar_ventanas_aisladas(temblores_roll)
+    )
+    episodios = detectar_episodios(df, SR, temblores, rms_ypr)
+    yield {
+        "tipo": "episodios",
+        "tiene_temblor": bool(np.any(temblores)),
+        "temblores": temblores,
+        "episodios": serializar_episodios(episodios)
+    }
+
+    frecuencias, f_dom_mean, freqs_std, psd_mean = frecuencia_temblor(df, episodios, SR, rapido=rapido)
+    psd_pico = np.max(psd_mean) if len(psd_mean) > 0 else 0
+    yield {
+        "tipo": "espectro",
+        "frecuencia_dominante": round(float(f_dom_mean), 2),
+        "psd_pico": round(float(psd_pico), 2),
+        "freq_x": freqs_std.tolist(),
+        "freq_y": psd_mean.tolist()
+    }
+    yield {"tipo": "fin"}
+
+def respuesta_rechazo(rechazo):
+    """503 rápido con Retry-After cuando el control de admisión no tiene lugar"""
+    return respuesta_de(*rechazo_analisis(rechazo))
+
+def rechazo_analisis(rechazo):
+    """El 503 de respuesta_rechazo como (cuerpo, status, encabezados)"""
+    return ({"error": rechazo.motivo, "retry_after": rechazo.retry_after, "cola": control_analisis.estado()},
+            503, {'Retry-After': str(rechazo.retry_after)})
+
+def leer_archivo_subido():
+    """Devuelve (stream, rapido) o una respuesta de error si no vino archivo"""
     if 'file' not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
-    
+        return None, (jsonify({"error": "No file uploaded"}), 400)
+
     file = request.files['file']
     if file.filename == '':
-        return jsonify({"error": "No file selected"}), 400
+        return None, (jsonify({"error": "No file selected"}), 400)
+
+    raw = file.stream.read()
+    # Archivos enormes van por el camino vectorizado para no monopolizar el worker
+    rapido = contar_muestras(raw) > MAX_MUESTRAS_COMPLETO
+    stream = io.StringIO(raw.decode("UTF-8"), newline=None)
+    return (stream, rapido), None
+
+@app.route('/api/analizar_datos', methods=['POST'])
+def analizar_datos_endpoint():
+    archivo, error = leer_archivo_subido()
+    if error:
+        return error
+    stream, rapido = archivo
 
     try:
-        stream = io.StringIO(file.stream.read().decode("UTF-8"), newline=None)
-        resultados = procesar_csv_logic(stream)
+        with control_analisis.turno():
+            resultados = procesar_csv_logic(stream, rapido=rapido)
         return jsonify(resultados)
+    except AnalisisRechazado as rechazo:
+        return respuesta_rechazo(rechazo)
     except Exception as e:
         print(f"Error procesando CSV: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/analizar_datos_stream', methods=['POST'])
+def analizar_datos_stream_endpoint():
+    """Igual que /api/analizar_datos pero responde NDJSON progresivo (ver procesar_csv_stream)"""
+    archivo, error = leer_archivo_subido()
+    if error:
+        return error
+    stream, rapido = archivo
+    nombre = request.files['file'].filename
+
+    # El turno se pide antes de responder (para poder devolver 503) y se libera al terminar
+    # el stream o al cerrarse la respuesta (si el cliente se fue antes del primer chunk,
+    # el generador nunca arranca y su finally no corre)
+    try:
+        control_analisis.adquirir()
+    except AnalisisRechazado as rechazo:
+        return respuesta_rechazo(rechazo)
+    inicio = time.monotonic()
+    una_vez = threading.Lock()  # se toma una sola vez: el turno no se libera dos veces
+
+    def liberar():
+        if una_vez.acquire(blocking=False):
+            control_analisis.liberar(time.monotonic() - inicio)
+
+    def generar():
+        try:
+            for mensaje in procesar_csv_stream(stream, rapido=rapido, nombre=nombre):
+                yield json.dumps(mensaje) + "\n"
+        except Exception as e:
+            # Los headers ya salieron con 200: el error viaja como un mensaje más
+            print(f"Error procesando CSV (stream): {e}")
+            yield json.dumps({"tipo": "error", "error": str(e)}) + "\n"
+        finally:
+            liberar()
+
+    try:
+        response = Response(stream_with_context(generar()), mimetype='application/x-ndjson',
+                            headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+    except Exception:
+        liberar()
+        raise
+    response.call_on_close(liberar)
+    return response
+
+
+# --- SESIONES DE RE-ANÁLISIS (subir una vez, ajustar parámetros muchas) ---
+@app.route('/api/sesiones_analisis', methods=['POST'])
+def crear_sesion_analisis():
+    """Sube el CSV, lo deja cargado en memoria y devuelve el análisis con los parámetros por defecto"""
+    archivo, error = leer_archivo_subido()
+    if error:
+        return error
+    stream, rapido = archivo
+
+    try:
+        with control_analisis.turno():
+            df, SR = cargar_datos(stream)
+            sesion = sesiones_analisis.crear(df, SR, nombre=request.files['file'].filename)
+            resultados = sesion.analizar()
+        return jsonify({"sesion": sesion.id, "expira_en": TTL_SESION, **resultados})
+    except AnalisisRechazado as rechazo:
+        return respuesta_rechazo(rechazo)
+    except Exception as e:
+        print(f"Error creando sesión de análisis: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# Con varios workers, la sesión está en memoria del que la creó: los pedidos se le pasan
+# (el backend en vivo anota en qué worker quedó cada una, ver sesiones_analisis.al_usar)
+TIMEOUT_SESION_ANALISIS_S = TIMEOUT_COMANDO_S + ESPERA_MAX_COLA + 60  # cola de admisión + el cálculo
+
+def anotar_sesion_analisis(sesion_id):
+    sesiones_vivo.backend.registrar('analisis', sesion_id, TTL_SESION)
+
+sesiones_analisis.al_usar = anotar_sesion_analisis
+
+@app.route('/api/sesiones_analisis/<sesion_id>', methods=['POST'])
+def reanalizar_sesion(sesion_id):
+    """Re-ejecuta la detección con otros parámetros: {flow, fhigh, umbral, duracion_ventana}"""
+    return atender_sesion_analisis(sesion_id, 'reanalizar', request.get_json(silent=True))
+
+@app.route('/api/sesiones_analisis/<sesion_id>/zoom', methods=['GET'])
+def zoom_sesion(sesion_id):
+    """
+    Envolvente min/max de las series en [t0, t1] (segundos desde el inicio) con ~`puntos` puntos.
+    Parámetros: t0, t1, puntos, series=yaw,pitch,roll,rms, flow, fhigh (banda del RMS)
+    """
+    return atender_sesion_analisis(sesion_id, 'zoom', request.args.to_dict())
+
+@app.route('/api/sesiones_analisis/<sesion_id>/espectrograma', methods=['GET'])
+def espectrograma_sesion(sesion_id):
+    """
+    Matriz ventana x frecuencia (uint8 en dB, base64) y traza de frecuencia dominante por ventana.
+    Parámetros: duracion_ventana (s, por defecto 3), n_frecuencias (por defecto 128)
+    """
+    return atender_sesion_analisis(sesion_id, 'espectrograma', request.args.to_dict())
+
+@app.route('/api/sesiones_analisis/<sesion_id>', methods=['DELETE'])
+def eliminar_sesion_analisis(sesion_id):
+    return atender_sesion_analisis(sesion_id, 'eliminar')
+
+def atender_sesion_analisis(sesion_id, accion, args=None):
+    """Atiende `accion` en el worker que tiene la sesión (este, u otro al que se le pasa el pedido)"""
+    backend = sesiones_vivo.backend
+    if sesiones_analisis.obtener(sesion_id) is None:
+        worker = backend.ubicar('analisis', sesion_id)
+        if worker is not None and worker != backend.worker:
+            respuesta = backend.enviar(worker, 'sesion_analisis',
+                                       {"sesion_id": sesion_id, "accion": accion, "args": args},
+                                       esperar=True, timeout=TIMEOUT_SESION_ANALISIS_S)
+            if respuesta is None:
+                return jsonify({"error": "El worker de la sesión no respondió"}), 504
+            return respuesta_de(*respuesta)
+    return respuesta_de(*accion_sesion_analisis(sesion_id, accion, args))
+
+def accion_sesion_analisis(sesion_id, accion, args=None):
+    """Acción sobre una sesión de re-análisis de este worker: (cuerpo, status, encabezados)"""
+    if accion == 'eliminar':
+        if sesiones_analisis.eliminar(sesion_id):
+            return {"status": "eliminada"}, 200, {}
+        return {"error": "Sesión inexistente"}, 404, {}
+
+    sesion = sesiones_analisis.obtener(sesion_id)
+    if sesion is None:
+        return {"error": "Sesión inexistente o vencida, volvé a subir el archivo"}, 404, {}
+    args = args or {}
+
+    if accion == 'reanalizar':
+        try:
+            with control_analisis.turno():
+                resultados = sesion.analizar(args)
+            return {"sesion": sesion.id, "expira_en": TTL_SESION, **resultados}, 200, {}
+        except AnalisisRechazado as rechazo:
+            return rechazo_analisis(rechazo)
+        except ValueError as e:
+            return {"error": str(e)}, 400, {}
+        except Exception as e:
+            print(f"Error re-analizando sesión {sesion_id}: {e}")
+            return {"error": str(e)}, 500, {}
+
+    if accion == 'zoom':
+        try:
+            t0 = float(args['t0']) if args.get('t0') else None
+            t1 = float(args['t1']) if args.get('t1') else None
+            puntos = int(args.get('puntos', PUNTOS_DEFECTO))
+            series = args.get('series')
+            flow = float(args.get('flow', PARAMETROS_DEFECTO["flow"]))
+            fhigh = float(args.get('fhigh', PARAMETROS_DEFECTO["fhigh"]))
+        except (TypeError, ValueError):
+            return {"error": "t0, t1, puntos, flow y fhigh deben ser numéricos"}, 400, {}
+        if not 0 < flow < fhigh:
+            return {"error": "La banda debe cumplir 0 < flow < fhigh"}, 400, {}
+
+        try:
+            respuesta = sesion.piramide(flow, fhigh).consulta(t0, t1, puntos, series.split(',') if series else None)
+            respuesta["inicio"] = str(sesion.df['Timestamp'].iloc[0])
+            return respuesta, 200, {}
+        except Exception as e:
+            print(f"Error en zoom de sesión {sesion_id}: {e}")
+            return {"error": str(e)}, 500, {}
+
+    if accion == 'espectrograma':
+        try:
+            duracion_ventana = int(args.get('duracion_ventana', PARAMETROS_DEFECTO["duracion_ventana"]))
+            n_frecuencias = int(args.get('n_frecuencias', N_FRECUENCIAS_DEFECTO))
+        except (TypeError, ValueError):
+            return {"error": "Parámetros fuera de rango"}, 400, {}
+        if not 1 <= duracion_ventana <= 30 or not 8 <= n_frecuencias <= 1024:
+            return {"error": "Parámetros fuera de rango"}, 400, {}
+
+        try:
+            with control_analisis.turno():
+                return sesion.espectrograma(duracion_ventana, n_frecuencias), 200, {}
+        except AnalisisRechazado as rechazo:
+            return rechazo_analisis(rechazo)
+        except ValueError as e:
+            return {"error": str(e)}, 400, {}
+        except Exception as e:
+            print(f"Error en espectrograma de sesión {sesion_id}: {e}")
+            return {"error": str(e)}, 500, {}
+
+    return {"error": "Acción no válida"}, 400, {}
+
+registrar_comando('sesion_analisis', accion_sesion_analisis)
+
+
 # --- HEALTH CHECK Y DESCARGA ---
 @app.route('/', methods=['GET'])
 def index():
@@ -141,10 +692,20 @@ def index():
         "status": "online",
         "message": "MotioMetrics Backend (WebSocket mode) is running!",
         "endpoints": [
-            "POST /api/leer_datos (start/stop/anotacion/poll)",
+            "POST /api/leer_datos (start/stop/anotacion/poll/historial; dispositivo o sesion; poll: since, espera; stop devuelve el análisis)",
             "POST /api/analizar_datos",
-            "WebSocket: /ws/ingresar_datos"
-        ]
+            "POST /api/analizar_datos_stream (NDJSON)",
+            "POST /api/sesiones_analisis (crear) | POST/DELETE /api/sesiones_analisis/<id>",
+            "GET /api/sesiones_analisis/<id>/zoom?t0=&t1=&puntos=",
+            "GET /api/sesiones_analisis/<id>/espectrograma",
+            "GET /api/sesiones_vivo",
+            "GET /api/latencia_vivo?dispositivo= (p50/p95/p99 por etapa y por dashboard)",
+            "POST /api/reproducciones (archivo o file, dispositivo, velocidad 1-50, desde, repetir) | GET | DELETE /api/reproducciones/<dispositivo>",
+            "WebSocket (sensores, sin Socket.IO): /ws/ingresar_datos?dispositivo=&token="
+        ],
+        "analisis": control_analisis.estado(),
+        "ingesta_ws": ingesta_ws.estado() if ingesta_ws is not None else None,
+        "backend_vivo": sesiones_vivo.backend.estado()
     })
 
 @app.route('/grabaciones_vivo/<filename>')
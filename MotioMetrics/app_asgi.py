@@ -0,0 +1,234 @@
+# app_asgi.py
+# Punto de entrada ASGI (asyncio), alternativo a app.py + eventlet:
+#   uvicorn app_asgi:aplicacion --host 0.0.0.0 --port $PORT
+#
+# - Socket.IO: socketio.AsyncServer con los mismos eventos que app.py
+# - HTTP: la misma app Flask de app.py (todas sus rutas), cada request en un
+#   hilo del EJECUTOR_HTTP: los análisis con numpy/scipy y el long-polling no
+#   frenan el loop que atiende las conexiones
+# - /ws/ingresar_datos: el WebSocket crudo de los sensores (IngestaWSASGI)
+# - con MOTIO_UDP_PUERTO: el gateway UDP del firmware motiosensor_udp (gateway_udp.py)
+#
+# El núcleo en vivo (analisis_vivo_core_websockets) no cambia: lo que llega por
+# los eventos se procesa en el loop (sólo encola en el buffer) y la difusión,
+# el espectro y el backend corren en hilos propios (AdaptadorAsyncio), cuyos
+# emits vuelven al loop. Cada SesionVivo tiene su lock.
+#
+# Comparación con el despliegue eventlet: tools/benchmark_servidores.py
+
+import os
+os.environ.setdefault("MOTIO_SERVIDOR", "asgi")  # antes de importar app: sin eventlet.monkey_patch
+
+import io
+import sys
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import socketio
+
+import app as app_flask
+from ingesta_ws import IngestaWSASGI
+from gateway_udp import iniciar_gateway
+from analisis_vivo_core_websockets import (
+    set_socketio_instance,
+    sesiones_vivo,
+    suscribir,
+    desuscribir,
+    confirmar_frame,
+    procesar_datos_ws,
+    procesar_frame_binario,
+    ingresar_sensor
+)
+
+HILOS_HTTP = int(os.environ.get("MOTIO_HILOS_HTTP", 16))
+PUERTO_UDP = os.environ.get("MOTIO_UDP_PUERTO")  # sin definir: sin gateway UDP
+
+EJECUTOR_HTTP = ThreadPoolExecutor(max_workers=HILOS_HTTP, thread_name_prefix="http")
+
+
+class AdaptadorAsyncio:
+    """
+    Lo que el núcleo en vivo usa de flask_socketio.SocketIO (emit, sleep,
+    start_background_task y server), sobre un AsyncServer.
+    Las tareas de fondo son hilos (código sincrónico) y emit se puede llamar
+    desde cualquier hilo: se agenda en el loop sin esperar.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.loop = None  # se fija al arrancar (lifespan) o con la primera conexión
+
+    def emit(self, event, data=None, to=None, **kwargs):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.server.emit(event, data, to=to, **kwargs), self.loop)
+
+    def sleep(self, segundos):
+        time.sleep(segundos)
+
+    def start_background_task(self, target, *args, **kwargs):
+        hilo = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
+        hilo.start()
+        return hilo
+
+
+class WSGIEnEjecutor:
+    """
+    Sirve una app WSGI desde ASGI corriendo cada request en un hilo de `ejecutor`
+    (asgiref.WsgiToAsgi los corre todos en un único hilo). Las respuestas por
+    partes (p. ej. el NDJSON de /api/analizar_datos_stream) se mandan a medida que salen.
+    """
+
+    def __init__(self, wsgi_app, ejecutor):
+        self.wsgi_app = wsgi_app
+        self.ejecutor = ejecutor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        cuerpo = bytearray()
+        while True:
+            mensaje = await receive()
+            cuerpo += mensaje.get("body", b"")
+            if not mensaje.get("more_body"):
+                break
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.ejecutor, self._atender, scope, bytes(cuerpo), send, loop)
+
+    def _entorno(self, scope, cuerpo):
+        servidor = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": servidor[0],
+            "SERVER_PORT": str(servidor[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(cuerpo),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for nombre, valor in scope.get("headers", []):
+            nombre = nombre.decode("latin-1").upper().replace("-", "_")
+            valor = valor.decode("latin-1")
+            if nombre in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                clave = nombre
+            else:
+                clave = f"HTTP_{nombre}"
+            environ[clave] = f"{environ[clave]},{valor}" if clave in environ else valor
+        return environ
+
+    def _atender(self, scope, cuerpo, send, loop):
+        def enviar(mensaje):
+            asyncio.run_coroutine_threadsafe(send(mensaje), loop).result()
+
+        inicio = {}
+
+        def start_response(status, headers, exc_info=None):
+            inicio["mensaje"] = {
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+            }
+
+        resultado = self.wsgi_app(self._entorno(scope, cuerpo), start_response)
+        try:
+            for parte in resultado:
+                if "mensaje" in inicio:
+                    enviar(inicio.pop("mensaje"))
+                if parte:
+                    enviar({"type": "http.response.body", "body": parte, "more_body": True})
+            if "mensaje" in inicio:
+                enviar(inicio.pop("mensaje"))
+            enviar({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(resultado, "close"):
+                resultado.close()
+
+
+# --- SOCKET.IO (los mismos eventos que app.py) ---
+url_cola = sesiones_vivo.backend.url_cola_mensajes
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*",
+                           client_manager=socketio.AsyncRedisManager(url_cola) if url_cola else None)
+adaptador = AdaptadorAsyncio(sio)
+set_socketio_instance(adaptador)
+
+dispositivos_por_sid = {}
+
+
+@sio.on('connect')
+async def handle_connect(sid, environ):
+    adaptador.loop = adaptador.loop or asyncio.get_running_loop()
+    print("[WS] Sensor conectado al backend")
+    dispositivo = parse_qs(environ.get("QUERY_STRING", "")).get("dispositivo", [None])[0]
+    if dispositivo:
+        dispositivos_por_sid[sid] = dispositivo
+
+
+@sio.on('disconnect')
+async def handle_disconnect(sid):
+    print("[WS] Sensor desconectado")
+    dispositivos_por_sid.pop(sid, None)
+    sesiones_vivo.quitar_suscriptor(sid)
+
+
+@sio.on('message')
+async def handle_sensor_data(sid, data):
+    procesar_datos_ws(str(data), dispositivos_por_sid.get(sid))
+
+
+@sio.on('muestras')
+async def handle_sensor_lote(sid, data):
+    procesar_datos_ws(data, dispositivos_por_sid.get(sid))
+
+
+@sio.on('muestras_bin')
+async def handle_sensor_binario(sid, data):
+    procesar_frame_binario(data, dispositivos_por_sid.get(sid))
+
+
+@sio.on('suscribir')
+async def handle_suscribir(sid, data=None):
+    data = data or {}
+    await sio.enter_room(sid, suscribir(sid, data.get('dispositivo'), bool(data.get('ack'))))
+
+
+@sio.on('ack_vivo')
+async def handle_ack_vivo(sid, data=None):
+    data = data or {}
+    confirmar_frame(sid, data.get('n'), data.get('dispositivo'))
+
+
+@sio.on('desuscribir')
+async def handle_desuscribir(sid, data=None):
+    await sio.leave_room(sid, desuscribir(sid, (data or {}).get('dispositivo')))
+
+
+gateway_udp = None
+
+
+async def al_arrancar():
+    global gateway_udp
+    adaptador.loop = asyncio.get_running_loop()
+    if PUERTO_UDP:
+        gateway_udp = await iniciar_gateway(ingresar_sensor, int(PUERTO_UDP))
+
+
+# --- APP ASGI: Socket.IO -> WebSocket de sensores -> Flask ---
+ingesta_ws = IngestaWSASGI(WSGIEnEjecutor(app_flask.app, EJECUTOR_HTTP))
+app_flask.ingesta_ws = ingesta_ws  # para el estado en GET /
+aplicacion = socketio.ASGIApp(sio, other_asgi_app=ingesta_ws, on_startup=al_arrancar)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(aplicacion, host='0.0.0.0', port=int(os.environ.get("PORT", 5000)))
@@ -0,0 +1,224 @@
+# backend_vivo.py
+# Estado compartido del modo en vivo entre varios procesos (workers).
+#
+# Cada dispositivo tiene un único "dueño": el worker que tiene su SesionVivo
+# (buffer, grabación, notas, detector) y hace su difusión. El primero que lo
+# necesita lo reclama y lo mantiene mientras viva. Los demás workers sólo saben
+# quién es el dueño y le reenvían lo que les llega para ese dispositivo:
+# muestras de un sensor que conectó a otro worker, suscripciones y acks de
+# dashboards, y las acciones de /api/leer_datos.
+# Lo que queda en memoria de un worker sin ser de un dispositivo (sesiones de
+# re-análisis, incluida la que devuelve 'stop') se registra con registrar(): los
+# demás averiguan con ubicar() en qué worker está y le pasan el pedido. Las
+# reproducciones corren en el dueño del dispositivo que alimentan.
+# Los frames a los dashboards viajan por la cola de mensajes de Flask-SocketIO
+# (url_cola_mensajes), así que un dashboard puede estar en cualquier worker.
+#
+# - BackendLocal: un solo proceso, todo local (lo de siempre, sin servidor aparte).
+# - BackendRedis: dueños, estados y comandos en un Redis (MOTIO_REDIS_URL), que
+#   también hace de cola de mensajes de Socket.IO.
+#
+# Ruteo: los sensores conviene que lleguen siempre al mismo worker/instancia
+# (p. ej. hash por ?dispositivo= en el proxy); si no, igual funciona, reenviando
+# cada mensaje al dueño. Los dashboards pueden ir a cualquiera (escalan
+# horizontalmente), pero con varios workers tienen que usar transporte
+# websocket (el long-polling de Engine.IO necesita sesiones pegajosas).
+#
+#   MOTIO_BACKEND_VIVO=redis MOTIO_WORKERS=4 gunicorn -k eventlet -w $MOTIO_WORKERS app:app
+
+import os
+import json
+import time
+import uuid
+import socket
+
+import redis
+
+TIPO_BACKEND = os.environ.get("MOTIO_BACKEND_VIVO", "local")
+REDIS_URL = os.environ.get("MOTIO_REDIS_URL", "redis://localhost:6379/0")
+TTL_DUENO_S = float(os.environ.get("MOTIO_TTL_DUENO_S", 10))        # si el dueño se cae, otro reclama pasado esto
+TIMEOUT_COMANDO_S = float(os.environ.get("MOTIO_TIMEOUT_COMANDO_S", 5))
+PREFIJO = "motio:vivo"
+
+# Renueva el dueño sólo si sigue siendo este worker (o si nadie lo reclamó mientras
+# tanto): un worker que se colgó más que el TTL no le saca el dispositivo al nuevo dueño
+RENOVAR_DUENO_LUA = """
+local dueno = redis.call('GET', KEYS[1])
+if dueno == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+elseif not dueno then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class BackendLocal:
+    """Un solo proceso: este worker es dueño de todos los dispositivos"""
+    url_cola_mensajes = None
+
+    def __init__(self):
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+
+    def iniciar(self, atender, start_background_task):
+        pass
+
+    def dueno(self, dispositivo):
+        return self.worker
+
+    def renovar(self, dispositivos):
+        return []
+
+    def registrar(self, tipo, clave, ttl_s):
+        pass
+
+    def ubicar(self, tipo, clave):
+        return self.worker
+
+    def publicar_estados(self, estados):
+        pass
+
+    def estados(self):
+        return {}
+
+    def enviar(self, worker, op, args, esperar=False, timeout=TIMEOUT_COMANDO_S):
+        raise RuntimeError("BackendLocal no tiene otros workers")
+
+    def estado(self):
+        return {"tipo": "local", "worker": self.worker}
+
+
+class BackendRedis:
+    """
+    Varios workers (o instancias) con un Redis en común:
+      {PREFIJO}:dueno:<dispositivo>  worker dueño (con vencimiento TTL_DUENO_S, lo renueva el dueño)
+      {PREFIJO}:estados              hash dispositivo -> estado (json) para /api/sesiones_vivo
+      {PREFIJO}:worker:<worker>      canal pub/sub con los comandos para ese worker
+      {PREFIJO}:respuesta:<id>       lista donde el worker deja la respuesta (BLPOP del que preguntó)
+      {PREFIJO}:<tipo>:<clave>       worker que tiene en memoria un recurso (p. ej. una sesión de análisis)
+    """
+
+    def __init__(self, url=REDIS_URL, ttl_dueno_s=TTL_DUENO_S):
+        self.url_cola_mensajes = url
+        self.redis = redis.Redis.from_url(url)
+        self.ttl_dueno_s = ttl_dueno_s
+        self._renovar_dueno = self.redis.register_script(RENOVAR_DUENO_LUA)
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._duenos = {}  # dispositivo -> (worker, válido hasta): no consultar Redis en cada muestra
+        self.comandos_enviados = 0
+        self.comandos_recibidos = 0
+
+    def iniciar(self, atender, start_background_task):
+        """Escucha los comandos de otros workers; atender(op, args) devuelve la respuesta"""
+        self._atender = atender
+        self._start_background_task = start_background_task
+        start_background_task(self._escuchar)
+
+    def _escuchar(self):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f"{PREFIJO}:worker:{self.worker}")
+        for mensaje in pubsub.listen():
+            try:
+                comando = json.loads(mensaje["data"])
+            except Exception as e:
+                print(f"Error leyendo comando del backend en vivo: {e}")
+                continue
+            self.comandos_recibidos += 1
+            # Cada comando en su propia tarea: un long-polling no frena a los demás
+            self._start_background_task(self._ejecutar, comando)
+
+    def _ejecutar(self, comando):
+        try:
+            respuesta = self._atender(comando["op"], comando["args"])
+        except Exception as e:
+            print(f"Error ejecutando comando '{comando.get('op')}' del backend en vivo: {e}")
+            respuesta = None
+        if comando.get("respuesta"):
+            clave = comando["respuesta"]
+            self.redis.rpush(clave, json.dumps(respuesta))
+            self.redis.expire(clave, int(TIMEOUT_COMANDO_S) + 60)
+
+    def dueno(self, dispositivo):
+        """Worker dueño del dispositivo; si no tiene, lo reclama este worker"""
+        ahora = time.monotonic()
+        worker, vence = self._duenos.get(dispositivo, (None, 0))
+        if ahora < vence:
+            return worker
+
+        clave = f"{PREFIJO}:dueno:{dispositivo}"
+        if self.redis.set(clave, self.worker, nx=True, ex=max(1, int(self.ttl_dueno_s))):
+            worker = self.worker
+        else:
+            worker = self.redis.get(clave)
+            worker = worker.decode() if worker is not None else self.worker
+        # Se vuelve a preguntar cada tanto por si el dueño se cayó
+        self._duenos[dispositivo] = (worker, ahora + self.ttl_dueno_s / 3)
+        return worker
+
+    def renovar(self, dispositivos):
+        """
+        El dueño mantiene sus dispositivos (se llama periódicamente, más seguido que TTL_DUENO_S).
+        Devuelve los que ya reclamó otro worker (este se atrasó más que el TTL y los perdió).
+        """
+        ttl = max(1, int(self.ttl_dueno_s))
+        with self.redis.pipeline(transaction=False) as pipe:
+            for dispositivo in dispositivos:
+                self._renovar_dueno(keys=[f"{PREFIJO}:dueno:{dispositivo}"], args=[self.worker, ttl], client=pipe)
+            renovados = pipe.execute()
+        perdidos = [d for d, ok in zip(dispositivos, renovados) if not ok]
+        for dispositivo in perdidos:
+            self._duenos.pop(dispositivo, None)
+        return perdidos
+
+    def registrar(self, tipo, clave, ttl_s):
+        """Este worker tiene el recurso `clave` (se vuelve a llamar en cada uso para extender el TTL)"""
+        self.redis.set(f"{PREFIJO}:{tipo}:{clave}", self.worker, ex=max(1, int(ttl_s)))
+
+    def ubicar(self, tipo, clave):
+        """Worker que tiene el recurso, o None si no existe o venció"""
+        worker = self.redis.get(f"{PREFIJO}:{tipo}:{clave}")
+        return worker.decode() if worker is not None else None
+
+    def publicar_estados(self, estados):
+        if estados:
+            self.redis.hset(f"{PREFIJO}:estados",
+                            mapping={d: json.dumps({**e, "worker": self.worker, "t": time.time()})
+                                     for d, e in estados.items()})
+
+    def estados(self):
+        """Estados publicados por los dueños vigentes (se descartan los de workers caídos)"""
+        vigentes = {}
+        for dispositivo, valor in self.redis.hgetall(f"{PREFIJO}:estados").items():
+            estado = json.loads(valor)
+            if time.time() - estado.pop("t", 0) < self.ttl_dueno_s:
+                vigentes[dispositivo.decode()] = estado
+        return vigentes
+
+    def enviar(self, worker, op, args, esperar=False, timeout=TIMEOUT_COMANDO_S):
+        """Manda un comando a otro worker; con esperar=True devuelve su respuesta (o None si no contestó)"""
+        respuesta = f"{PREFIJO}:respuesta:{uuid.uuid4().hex}" if esperar else None
+        self.redis.publish(f"{PREFIJO}:worker:{worker}",
+                           json.dumps({"op": op, "args": args, "respuesta": respuesta}))
+        self.comandos_enviados += 1
+        if not esperar:
+            return None
+        resultado = self.redis.blpop([respuesta], timeout=max(1, int(timeout + 0.999)))
+        return json.loads(resultado[1]) if resultado is not None else None
+
+    def estado(self):
+        return {
+            "tipo": "redis",
+            "worker": self.worker,
+            "comandos_enviados": self.comandos_enviados,
+            "comandos_recibidos": self.comandos_recibidos
+        }
+
+
+def crear_backend(tipo=TIPO_BACKEND):
+    if tipo == "redis":
+        return BackendRedis()
+    if tipo != "local":
+        print(f"Error: MOTIO_BACKEND_VIVO='{tipo}' desconocido, se usa el backend local")
+    return BackendLocal()
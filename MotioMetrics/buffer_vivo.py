@@ -0,0 +1,189 @@
+# buffer_vivo.py
+# Buffer circular preasignado (NumPy) para el modo en vivo.
+# Reemplaza a los deque(maxlen=50) de floats: memoria constante, sin crear
+# objetos por muestra, y con dos niveles de historia:
+#   - nivel completo: todas las muestras (CAPACIDAD_COMPLETA, ~2 min a 25 Hz)
+#   - nivel resumen:  min/max por bloque de RESOLUCION_RESUMEN_S (10 min por defecto)
+# Los timestamps son enteros (epoch en nanosegundos).
+
+import os
+
+import numpy as np
+
+CANALES = ("yaw", "pitch", "roll", "ax", "ay", "az")
+
+CAPACIDAD_COMPLETA = int(os.environ.get("MOTIO_BUFFER_MUESTRAS", 3000))
+RESOLUCION_RESUMEN_S = float(os.environ.get("MOTIO_BUFFER_RESOLUCION_S", 0.5))
+SEGUNDOS_RESUMEN = float(os.environ.get("MOTIO_BUFFER_RESUMEN_S", 600))
+
+NS = 1_000_000_000
+
+
+class BufferVivo:
+    def __init__(self, capacidad=CAPACIDAD_COMPLETA, resolucion_resumen_s=RESOLUCION_RESUMEN_S,
+                 segundos_resumen=SEGUNDOS_RESUMEN):
+        n_canales = len(CANALES)
+
+        # Nivel completo
+        self.capacidad = capacidad
+        self.t = np.zeros(capacidad, dtype=np.int64)
+        self.datos = np.zeros((capacidad, n_canales), dtype=np.float64)
+        self.total = 0  # muestras agregadas desde el inicio (índice absoluto de la próxima)
+        self._inicio_valido = 0  # índice absoluto desde el que hay datos (después de limpiar)
+
+        # Nivel resumen (min/max por bloque)
+        self.resolucion_ns = int(resolucion_resumen_s * NS)
+        self.capacidad_resumen = max(1, int(segundos_resumen / resolucion_resumen_s))
+        self.t_resumen = np.zeros(self.capacidad_resumen, dtype=np.int64)
+        self.min_resumen = np.zeros((self.capacidad_resumen, n_canales))
+        self.max_resumen = np.zeros((self.capacidad_resumen, n_canales))
+        self.total_resumen = 0
+
+        # Bloque en construcción
+        self._bloque = None
+        self._acc_min = np.zeros(n_canales)
+        self._acc_max = np.zeros(n_canales)
+
+    # --- Escritura ---
+
+    def agregar(self, t_ns, valores):
+        """Agrega una muestra: t_ns (int) y valores en el orden de CANALES"""
+        i = self.total % self.capacidad
+        self.t[i] = t_ns
+        fila = self.datos[i]
+        fila[:] = valores
+        self.total += 1
+
+        bloque = t_ns // self.resolucion_ns
+        if bloque != self._bloque:
+            self._cerrar_bloque()
+            self._bloque = bloque
+            self._acc_min[:] = fila
+            self._acc_max[:] = fila
+        else:
+            np.minimum(self._acc_min, fila, out=self._acc_min)
+            np.maximum(self._acc_max, fila, out=self._acc_max)
+
+    def agregar_lote(self, t_ns, valores):
+        """Agrega muchas muestras de una vez: t_ns (n,) y valores (n, len(CANALES)), en orden temporal"""
+        t_ns = np.asarray(t_ns, dtype=np.int64)
+        valores = np.asarray(valores, dtype=np.float64)
+        n = len(t_ns)
+        if n == 0:
+            return
+
+        # Nivel completo: sólo las últimas `capacidad` muestras sobreviven
+        desde = max(0, n - self.capacidad)
+        indices = (self.total + np.arange(desde, n)) % self.capacidad
+        self.t[indices] = t_ns[desde:]
+        self.datos[indices] = valores[desde:]
+        self.total += n
+
+        # Nivel resumen: agrupar por bloque
+        bloques = t_ns // self.resolucion_ns
+        cortes = np.flatnonzero(np.diff(bloques)) + 1
+        inicios = np.concatenate(([0], cortes))
+        mins = np.minimum.reduceat(valores, inicios, axis=0)
+        maxs = np.maximum.reduceat(valores, inicios, axis=0)
+        for k, inicio in enumerate(inicios):
+            bloque = bloques[inicio]
+            if bloque == self._bloque:
+                np.minimum(self._acc_min, mins[k], out=self._acc_min)
+                np.maximum(self._acc_max, maxs[k], out=self._acc_max)
+            else:
+                self._cerrar_bloque()
+                self._bloque = bloque
+                self._acc_min[:] = mins[k]
+                self._acc_max[:] = maxs[k]
+
+    def _cerrar_bloque(self):
+        if self._bloque is None:
+            return
+        j = self.total_resumen % self.capacidad_resumen
+        self.t_resumen[j] = self._bloque * self.resolucion_ns
+        self.min_resumen[j] = self._acc_min
+        self.max_resumen[j] = self._acc_max
+        self.total_resumen += 1
+
+    def limpiar(self):
+        """Vacía el buffer (conserva `total` para que los índices absolutos sigan creciendo)"""
+        self._inicio_valido = self.total
+        self.total_resumen = 0
+        self._bloque = None
+
+    # --- Lectura ---
+
+    @property
+    def disponibles(self):
+        """Cantidad de muestras del nivel completo que se pueden leer"""
+        return min(self.total - self._inicio_valido, self.capacidad)
+
+    def desde(self, indice):
+        """
+        Muestras con índice absoluto >= `indice` (lo que haya sobrevivido en el buffer).
+        Devuelve (t_ns, valores, indice_primera) en orden temporal; son copias.
+        """
+        primero = max(indice, self.total - self.disponibles)
+        indices = np.arange(primero, self.total) % self.capacidad
+        return self.t[indices], self.datos[indices], primero
+
+    def ultimas(self, n):
+        """Últimas n muestras del nivel completo: (t_ns, valores)"""
+        t, valores, _ = self.desde(self.total - n)
+        return t, valores
+
+    def resumen(self):
+        """Bloques del nivel resumen en orden temporal, incluyendo el bloque en construcción"""
+        n = min(self.total_resumen, self.capacidad_resumen)
+        indices = np.arange(self.total_resumen - n, self.total_resumen) % self.capacidad_resumen
+        t, mn, mx = self.t_resumen[indices], self.min_resumen[indices], self.max_resumen[indices]
+        if self._bloque is not None:
+            t = np.append(t, self._bloque * self.resolucion_ns)
+            mn = np.vstack([mn, self._acc_min])
+            mx = np.vstack([mx, self._acc_max])
+        return t, mn, mx
+
+    def consulta(self, segundos, resolucion_s=None):
+        """
+        Últimos `segundos` a resolución `resolucion_s`.
+        - Sin resolución (o más fina que el resumen) y si el nivel completo cubre el
+          período: muestras originales {"t_ns", canal: [...]}
+        - Si no: envolvente min/max {"t_ns", canal: {"min", "max"}} agregando el nivel
+          que corresponda hasta la resolución pedida.
+        """
+        if self.disponibles == 0:
+            return {"resolucion_s": resolucion_s, "t_ns": [], **{c: [] for c in CANALES}}
+
+        t_fin = int(self.t[(self.total - 1) % self.capacidad])
+        t_inicio = t_fin - int(segundos * NS)
+        t_completo, valores = self.ultimas(self.disponibles)
+        cubre = len(t_completo) and t_completo[0] <= t_inicio
+
+        if (resolucion_s is None or resolucion_s * NS < self.resolucion_ns) and (cubre or self.total_resumen == 0):
+            sel = t_completo >= t_inicio
+            t, valores = t_completo[sel], valores[sel]
+            if resolucion_s is None or len(t) == 0:
+                return {
+                    "resolucion_s": None,
+                    "t_ns": t.tolist(),
+                    **{c: valores[:, k].tolist() for k, c in enumerate(CANALES)}
+                }
+            mn = mx = valores
+        else:
+            t, mn, mx = self.resumen()
+            sel = t >= t_inicio - self.resolucion_ns
+            t, mn, mx = t[sel], mn[sel], mx[sel]
+            resolucion_s = max(resolucion_s or 0, self.resolucion_ns / NS)
+
+        # Reagrupar a la resolución pedida
+        paso = int(resolucion_s * NS)
+        bloques = t // paso
+        inicios = np.concatenate(([0], np.flatnonzero(np.diff(bloques)) + 1)) if len(t) else np.array([], dtype=int)
+        if len(inicios):
+            mn = np.minimum.reduceat(mn, inicios, axis=0)
+            mx = np.maximum.reduceat(mx, inicios, axis=0)
+        return {
+            "resolucion_s": resolucion_s,
+            "t_ns": (bloques[inicios] * paso).tolist() if len(inicios) else [],
+            **{c: {"min": mn[:, k].tolist(), "max": mx[:, k].tolist()} for k, c in enumerate(CANALES)}
+        }
@@ -0,0 +1,174 @@
+# detector_vivo.py
+# Detección de temblor causal para el modo en vivo.
+# detectar_temblor usa filtfilt (fase cero) sobre la señal completa, así que sólo
+# sirve con la grabación terminada. Acá los mismos filtros se aplican de forma
+# causal con estado (sosfilt + zi), bloque a bloque, y se mantiene la energía de
+# los últimos VENTANA_S segundos con sumas móviles: O(1) por muestra.
+# Cada SALTO_S se toma una decisión por eje:
+#   - fracción de la potencia (sin deriva) que cae en la banda de temblor
+#   - RMS en la banda de temblor
+# y, como eliminar_ventanas_aisladas, el estado cambia recién después de
+# CONSECUTIVOS decisiones iguales.
+# La frecuencia de muestreo se estima de los tiempos que llegan (no todas las
+# fuentes van a 25 Hz: el firmware UDP manda ~20 Hz, las grabaciones de la SD lo
+# que haya grabado el sensor); si cambia, se rearman filtros y ventanas.
+
+import os
+
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+EJES = ("yaw", "pitch", "roll")
+
+SR_VIVO = float(os.environ.get("MOTIO_SR_VIVO", 25))  # valor inicial, hasta tener la estimación
+VENTANA_S = 3.0   # como las ventanas de detectar_temblor
+SALTO_S = 0.5
+UMBRAL_FRACCION = float(os.environ.get("MOTIO_VIVO_FRACCION_TEMBLOR", 0.5))
+RMS_MINIMO = float(os.environ.get("MOTIO_VIVO_RMS_MINIMO", 0.1))  # grados
+CONSECUTIVOS = 2
+MIN_PASOS_SR = 50        # pasos entre muestras antes de confiar en la estimación del SR
+MAX_PASOS_SR = 1000      # memoria de la estimación (sigue cambios de fuente en el mismo dispositivo)
+HUECO_MAX_NS = 1_000_000_000  # pasos más largos (reconexiones) no cuentan para el SR
+
+
+class DetectorTemblorVivo:
+    def __init__(self, SR=SR_VIVO, flow=3.5, fhigh=7.5, ventana_s=VENTANA_S, salto_s=SALTO_S,
+                 umbral_fraccion=UMBRAL_FRACCION, rms_minimo=RMS_MINIMO, consecutivos=CONSECUTIVOS):
+        self.flow_pedido, self.fhigh_pedido = flow, fhigh
+        self.ventana_s, self.salto_s = ventana_s, salto_s
+        self.umbral_fraccion = umbral_fraccion
+        self.rms_minimo = rms_minimo
+        self.consecutivos = consecutivos
+
+        # Estimación del SR: pasos entre muestras (suma en ns y cantidad) y el último tiempo visto
+        self._suma_pasos_ns = 0
+        self._n_pasos = 0
+        self._ultimo_t = None
+        self._configurar(SR)
+
+    def _configurar(self, SR):
+        """Filtros y ventanas para la frecuencia de muestreo SR (vuelve a empezar la detección)"""
+        self.SR = SR
+        self.flow, self.fhigh = self.flow_pedido, min(self.fhigh_pedido, 0.45 * SR)
+
+        # Mismos filtros que el análisis offline, en forma SOS (estable para aplicar por bloques)
+        self.sos_hp = butter(1, 0.25, btype='high', fs=SR, output='sos')
+        self.sos_banda = butter(4, [self.flow, self.fhigh], btype='band', fs=SR, output='sos')
+
+        self.n_ventana = max(1, int(round(self.ventana_s * SR)))
+        self.n_salto = min(max(1, int(round(self.salto_s * SR))), self.n_ventana)
+        self.reiniciar()
+
+    def reiniciar(self):
+        n_ejes = len(EJES)
+        self.zi_hp = None  # se inicializa con la primera muestra (sin transitorio por el offset)
+        self.zi_banda = np.zeros((self.sos_banda.shape[0], 2, n_ejes))
+
+        # Energía por muestra de los últimos n_ventana (anillo) y sus sumas móviles
+        self._e_hp = np.zeros((self.n_ventana, n_ejes))
+        self._e_banda = np.zeros((self.n_ventana, n_ejes))
+        self._suma_hp = np.zeros(n_ejes)
+        self._suma_banda = np.zeros(n_ejes)
+        self._pos = 0
+        self._llenas = 0
+        self._hasta_salto = self.n_salto
+
+        self.temblor = False
+        self._racha = 0  # decisiones seguidas que contradicen el estado actual
+        self.ultimo = None
+
+    def procesar(self, t_ns, valores):
+        """
+        t_ns: (n,) epoch en ns; valores: (n, 3) con yaw, pitch, roll.
+        Devuelve la lista de estados de los saltos que se completaron con estas muestras.
+        """
+        valores = np.asarray(valores, dtype=float)[:, :len(EJES)]
+        self._estimar_sr(t_ns)
+        estados = []
+        i = 0
+        while i < len(valores):
+            n = min(self._hasta_salto, len(valores) - i)
+            self._acumular(valores[i:i + n])
+            i += n
+            self._hasta_salto -= n
+            if self._hasta_salto == 0:
+                self._hasta_salto = self.n_salto
+                estados.append(self._decidir(int(t_ns[i - 1])))
+        return estados
+
+    def _estimar_sr(self, t_ns):
+        """Actualiza el SR con los pasos de t_ns; si se alejó 1 Hz o más del actual, rearma todo"""
+        if len(t_ns) == 0:
+            return
+        t_ns = np.asarray(t_ns, dtype=np.int64)
+        previos = t_ns[:-1] if self._ultimo_t is None else np.concatenate([[self._ultimo_t], t_ns[:-1]])
+        self._ultimo_t = int(t_ns[-1])
+        pasos = t_ns[len(t_ns) - len(previos):] - previos
+        pasos = pasos[(pasos >= 0) & (pasos <= HUECO_MAX_NS)]
+        self._suma_pasos_ns += int(pasos.sum())
+        self._n_pasos += len(pasos)
+        if self._n_pasos > MAX_PASOS_SR:
+            # Olvido gradual: los pasos viejos pesan la mitad
+            self._suma_pasos_ns //= 2
+            self._n_pasos //= 2
+
+        if self._n_pasos < MIN_PASOS_SR or self._suma_pasos_ns <= 0:
+            return
+        SR = self._n_pasos / (self._suma_pasos_ns / 1e9)
+        if abs(SR - self.SR) >= 1 and 0.45 * SR > self.flow_pedido:  # con menos no entra la banda
+            self._configurar(float(round(SR)))
+
+    def _acumular(self, bloque):
+        if self.zi_hp is None:
+            self.zi_hp = sosfilt_zi(self.sos_hp)[:, :, None] * bloque[0]
+        hp, self.zi_hp = sosfilt(self.sos_hp, bloque, axis=0, zi=self.zi_hp)
+        banda, self.zi_banda = sosfilt(self.sos_banda, hp, axis=0, zi=self.zi_banda)
+
+        # Sumas móviles: entra la energía del bloque, sale la de las muestras que reemplaza
+        # (el bloque nunca es más largo que la ventana: n_salto <= n_ventana)
+        e_hp, e_banda = hp**2, banda**2
+        indices = (self._pos + np.arange(len(bloque))) % self.n_ventana
+        self._suma_hp += e_hp.sum(axis=0) - self._e_hp[indices].sum(axis=0)
+        self._suma_banda += e_banda.sum(axis=0) - self._e_banda[indices].sum(axis=0)
+        self._e_hp[indices] = e_hp
+        self._e_banda[indices] = e_banda
+
+        nueva_pos = (self._pos + len(bloque)) % self.n_ventana
+        if nueva_pos <= self._pos:
+            # Recalcular de cero una vez por vuelta: evita que el error de redondeo se acumule
+            self._suma_hp = self._e_hp.sum(axis=0)
+            self._suma_banda = self._e_banda.sum(axis=0)
+        self._pos = nueva_pos
+        self._llenas = min(self._llenas + len(bloque), self.n_ventana)
+
+    def _decidir(self, t_ns):
+        n = max(self._llenas, 1)
+        suma_hp = np.maximum(self._suma_hp, 0)
+        suma_banda = np.maximum(self._suma_banda, 0)
+        rms = np.sqrt(suma_banda / n)
+        fraccion = np.divide(suma_banda, suma_hp, out=np.zeros_like(suma_hp), where=suma_hp > 0)
+
+        ventana_completa = self._llenas >= self.n_ventana
+        por_eje = ventana_completa & (fraccion >= self.umbral_fraccion) & (rms >= self.rms_minimo)
+        decision = bool(np.any(por_eje))
+
+        if decision != self.temblor:
+            self._racha += 1
+            if self._racha >= self.consecutivos:
+                self.temblor = decision
+                self._racha = 0
+        else:
+            self._racha = 0
+
+        self.ultimo = {
+            "t_ms": t_ns // 1_000_000,
+            "temblor": self.temblor,
+            "ejes": {eje: bool(v) for eje, v in zip(EJES, por_eje)},
+            "rms": {
+                **{eje: round(float(v), 4) for eje, v in zip(EJES, rms)},
+                "combinado": round(float(np.sqrt(suma_banda.sum() / n)), 4)
+            },
+            "fraccion_banda": {eje: round(float(v), 3) for eje, v in zip(EJES, fraccion)},
+            "ventana_completa": bool(ventana_completa)
+        }
+        return self.ultimo
@@ -0,0 +1,59 @@
+# espectro_vivo.py
+# Espectro de los últimos segundos de un dispositivo en vivo.
+# Mismo estimador que metodo_burg_umbralizado (Burg orden 6, mismos umbrales),
+# con los tres ejes en un solo lote (psd_burg_lote). Lo calcula una tarea de
+# fondo a ritmo bajo (HZ_ESPECTRO), una vez por dispositivo, y el resultado se
+# comparte con todos los dashboards suscriptos: nunca corre en la ingesta.
+
+import os
+
+import numpy as np
+from scipy.signal import detrend
+
+from analisis_core import psd_burg_lote, umbralizar_psd_lote
+
+HZ_ESPECTRO = float(os.environ.get("MOTIO_HZ_ESPECTRO_VIVO", 2))
+VENTANA_ESPECTRO_S = float(os.environ.get("MOTIO_VENTANA_ESPECTRO_VIVO_S", 3))  # como detectar_temblor
+MIN_MUESTRAS = 16
+
+EJES = ("yaw", "pitch", "roll")
+
+
+def calcular_espectro_vivo(t_ns, ypr, flow=3.5, fhigh=7.5):
+    """
+    t_ns : (n,) epoch en ns de las muestras de la ventana
+    ypr  : (n, 3) yaw, pitch, roll
+    La deriva se quita con un detrend lineal de la ventana (el pasa altos de
+    filtrar_deriva necesita la señal completa). La frecuencia de muestreo se
+    estima de los timestamps de la propia ventana.
+    Devuelve None si todavía no hay suficientes muestras.
+    """
+    n = len(t_ns)
+    if n < MIN_MUESTRAS:
+        return None
+    duracion_s = (int(t_ns[-1]) - int(t_ns[0])) / 1e9
+    if duracion_s <= 0:
+        return None
+    SR = (n - 1) / duracion_s
+
+    ventanas = detrend(np.asarray(ypr, dtype=float)[:, :len(EJES)], axis=0).T  # una fila por eje
+    with np.errstate(divide='ignore', invalid='ignore'):
+        psd = psd_burg_lote(ventanas, order=6)
+        # Un eje quieto (señal constante) no tiene espectro: queda en cero y sin temblor
+        psd = np.nan_to_num(psd, nan=0.0, posinf=0.0, neginf=0.0)
+        por_eje = [
+            (t, f, A) if np.isfinite(A) else (False, 0.0, 0.0)
+            for t, f, A in umbralizar_psd_lote(psd, SR, flow, fhigh)
+        ]
+    frecuencias = np.linspace(0, SR/2, psd.shape[1])
+
+    return {
+        "t_ms": int(t_ns[-1]) // 1_000_000,
+        "sr": round(SR, 2),
+        "duracion_s": round(duracion_s, 2),
+        "frecuencias": np.round(frecuencias, 3).tolist(),
+        "psd": {eje: np.round(fila, 6).tolist() for eje, fila in zip(EJES, psd)},
+        "f_dom": {eje: round(float(f), 2) for eje, (_, f, _) in zip(EJES, por_eje)},
+        "amp_dom": {eje: round(float(A), 3) for eje, (_, _, A) in zip(EJES, por_eje)},
+        "temblor": {eje: t for eje, (t, _, _) in zip(EJES, por_eje)}
+    }
@@ -0,0 +1,81 @@
+# espectrograma.py
+# Espectrograma tiempo–frecuencia de una grabación: una fila por ventana de
+# detección (mismas ventanas que detectar_temblor) con la PSD de Burg de
+# Yaw+Pitch+Roll, más la traza de frecuencia dominante por ventana.
+# Todas las ventanas se estiman juntas con psd_burg_lote y la matriz se
+# cuantiza a uint8 en dB para que viaje compacta (base64).
+
+import base64
+
+import numpy as np
+
+from analisis_core import ventaneo, psd_burg_lote, umbralizar_psd_lote
+
+N_FRECUENCIAS_DEFECTO = 128  # columnas de la matriz (0 .. SR/2)
+RANGO_DB_DEFECTO = 60        # rango dinámico que se conserva por debajo del máximo
+
+
+def cuantizar_db(potencia, rango_db=RANGO_DB_DEFECTO):
+    """
+    Pasa una matriz de potencia a dB y la cuantiza a uint8 (0 = db_min, 255 = db_max).
+    Devuelve (bytes_uint8, db_min, db_max). Para reconstruir:
+        db = db_min + valor / 255 * (db_max - db_min)
+    """
+    db = 10 * np.log10(np.maximum(potencia, np.finfo(float).tiny))
+    db_max = float(np.max(db)) if db.size else 0.0
+    db_min = db_max - rango_db
+    q = np.round((np.clip(db, db_min, db_max) - db_min) / rango_db * 255).astype(np.uint8)
+    return q.tobytes(), db_min, db_max
+
+
+def calcular_espectrograma(df_filtrado, SR, duracion_ventana=3, n_frecuencias=N_FRECUENCIAS_DEFECTO,
+                           rango_db=RANGO_DB_DEFECTO, psd_ventanas=None):
+    """
+    df_filtrado  : Yaw/Pitch/Roll sin deriva (filtrar_deriva)
+    psd_ventanas : opcional, (psd_yaw, psd_pitch, psd_roll) con NFFT = largo de la ventana
+                   ya calculadas (sesión de análisis); de ahí sale la traza f_dom por eje,
+                   idéntica a la de detectar_temblor.
+    """
+    window_size = int(duracion_ventana * SR)
+    NFFT = max(2 * (n_frecuencias - 1), 2)
+
+    ventanas = {col: ventaneo(df_filtrado[col].to_numpy(), window_size, 0) for col in ['Yaw', 'Pitch', 'Roll']}
+    n_ventanas = len(ventanas['Yaw'])
+    if n_ventanas == 0:
+        raise ValueError("La grabación es más corta que una ventana de análisis")
+
+    # Potencia total de los tres ejes en una grilla fina (el modelo AR se evalúa en NFFT puntos)
+    potencia = sum(psd_burg_lote(v, NFFT=NFFT) for v in ventanas.values())
+    frecuencias = np.linspace(0, SR/2, potencia.shape[1])
+    f_dom_combinada = frecuencias[np.argmax(potencia[:, 1:], axis=1) + 1]  # sin DC, como metodo_burg_umbralizado
+
+    if psd_ventanas is None:
+        psd_ventanas = tuple(psd_burg_lote(ventanas[col]) for col in ['Yaw', 'Pitch', 'Roll'])
+    por_eje = {
+        eje: umbralizar_psd_lote(psd, SR)
+        for eje, psd in zip(['yaw', 'pitch', 'roll'], psd_ventanas)
+    }
+
+    datos, db_min, db_max = cuantizar_db(potencia, rango_db)
+    return {
+        "sr": SR,
+        "duracion_ventana": duracion_ventana,
+        "n_ventanas": n_ventanas,
+        "tiempo_s": (np.arange(n_ventanas) * duracion_ventana).tolist(),
+        "frecuencias": np.round(frecuencias, 3).tolist(),
+        "potencia": {
+            "codificacion": "uint8-db-base64",
+            "filas": n_ventanas,
+            "columnas": potencia.shape[1],
+            "db_min": round(db_min, 2),
+            "db_max": round(db_max, 2),
+            "datos": base64.b64encode(datos).decode("ascii")
+        },
+        "f_dom": {
+            "combinada": np.round(f_dom_combinada, 2).tolist(),
+            **{eje: [round(float(f), 2) for _, f, _ in v] for eje, v in por_eje.items()}
+        },
+        "amp_dom": {eje: [round(float(A), 3) for _, _, A in v] for eje, v in por_eje.items()},
+        "temblor": [bool(ty or tp or tr) for (ty, _, _), (tp, _, _), (tr, _, _)
+                    in zip(por_eje['yaw'], por_eje['pitch'], por_eje['roll'])]
+    }
@@ -0,0 +1,129 @@
+# flujo_vivo.py
+# Control de flujo por dashboard para 'datos_vivo'.
+# Un cliente con mala conectividad no debe hacer crecer sin límite lo que el
+# servidor tiene para mandarle, ni frenar a los demás. Para cada suscriptor se
+# mide cuántos frames tiene "pendientes":
+#   - los que mandó y todavía no confirmó con 'ack_vivo' (si el cliente confirma)
+#   - los paquetes que esperan en su cola de salida de Engine.IO
+# Si supera MAX_PENDIENTES no se le manda nada más (el frame se descarta y se
+# cuenta). Como los deltas no sirven sueltos, cuando se pone al día recibe un
+# único frame completo con el estado actual (se "coalescen" todos los que se perdió).
+# Los otros mensajes a los dashboards ('espectro_vivo', 'tremor_estado',
+# 'analisis_vivo') pasan por al_dia(): a un atrasado se le omiten y se cuentan.
+
+import os
+
+MAX_PENDIENTES = int(os.environ.get("MOTIO_MAX_FRAMES_PENDIENTES", 4))
+
+
+class EstadoCliente:
+    def __init__(self, sid, con_ack=False):
+        self.sid = sid
+        self.con_ack = con_ack
+        self.ultimo_enviado = 0    # número del último frame que se le mandó
+        self.ultimo_confirmado = 0
+        self.necesita_completo = True  # el primero siempre es completo (app.py lo manda al suscribir)
+        self.enviados = 0
+        self.descartados = 0
+        self.completos_forzados = 0
+        self.omitidos = 0  # mensajes aparte de los frames que no se le mandaron por atrasado
+
+    @property
+    def sin_confirmar(self):
+        return self.ultimo_enviado - self.ultimo_confirmado if self.con_ack else 0
+
+    def estado(self):
+        return {
+            "con_ack": self.con_ack,
+            "sin_confirmar": self.sin_confirmar,
+            "enviados": self.enviados,
+            "descartados": self.descartados,
+            "completos_forzados": self.completos_forzados,
+            "omitidos": self.omitidos
+        }
+
+
+class ControlFlujo:
+    """Suscriptores de una sesión en vivo y a quién mandarle qué en cada frame"""
+
+    def __init__(self, cola_salida=None, max_pendientes=MAX_PENDIENTES):
+        self.clientes = {}  # sid -> EstadoCliente
+        self.cola_salida = cola_salida or (lambda sid: 0)  # paquetes en la cola de Engine.IO del cliente
+        self.max_pendientes = max_pendientes
+        self.numero_frame = 0
+        self.descartados = 0
+        self.omitidos = 0
+
+    def agregar(self, sid, con_ack=False):
+        cliente = self.clientes.get(sid)
+        if cliente is None:
+            cliente = self.clientes[sid] = EstadoCliente(sid, con_ack)
+        cliente.con_ack = cliente.con_ack or con_ack
+        return cliente
+
+    def quitar(self, sid):
+        return self.clientes.pop(sid, None) is not None
+
+    def confirmar(self, sid, numero):
+        cliente = self.clientes.get(sid)
+        if cliente is not None and numero is not None:
+            cliente.ultimo_confirmado = min(max(cliente.ultimo_confirmado, int(numero)), cliente.ultimo_enviado)
+
+    def repartir(self, completo_para_todos=False):
+        """
+        Numera el próximo frame y separa a los suscriptores en:
+          (numero, sids_delta, sids_completo)
+        Los que están atrasados no figuran en ninguna lista (se les descarta el frame).
+        """
+        self.numero_frame += 1
+        delta, completo = [], []
+        for sid, cliente in list(self.clientes.items()):  # con ASGI se suscriben desde otro hilo
+            if self._atrasado(cliente):
+                cliente.descartados += 1
+                self.descartados += 1
+                if not cliente.necesita_completo:
+                    cliente.necesita_completo = True
+                    cliente.completos_forzados += 1
+                continue
+
+            if cliente.necesita_completo or completo_para_todos:
+                completo.append(sid)
+                cliente.necesita_completo = False
+            else:
+                delta.append(sid)
+            cliente.ultimo_enviado = self.numero_frame
+            cliente.enviados += 1
+        return self.numero_frame, delta, completo
+
+    def al_dia(self):
+        """
+        Suscriptores a los que se les puede mandar un mensaje que no es un frame
+        (espectro, detector, análisis). A los atrasados se les omite y se cuenta.
+        """
+        sids = []
+        for sid, cliente in list(self.clientes.items()):
+            if self._atrasado(cliente):
+                cliente.omitidos += 1
+                self.omitidos += 1
+            else:
+                sids.append(sid)
+        return sids
+
+    def _atrasado(self, cliente):
+        return max(cliente.sin_confirmar, self.cola_salida(cliente.sid)) >= self.max_pendientes
+
+    def marcar_enviado(self, sid, numero):
+        """Para frames que se mandan por fuera de repartir (p. ej. el completo al suscribirse)"""
+        cliente = self.clientes.get(sid)
+        if cliente is not None:
+            cliente.ultimo_enviado = max(cliente.ultimo_enviado, numero)
+            cliente.ultimo_confirmado = max(cliente.ultimo_confirmado, numero - 1)
+            cliente.necesita_completo = False
+
+    def estado(self):
+        return {
+            "frames": self.numero_frame,
+            "descartados": self.descartados,
+            "omitidos": self.omitidos,
+            "clientes": {sid: c.estado() for sid, c in self.clientes.items()}
+        }
@@ -0,0 +1,63 @@
+# formato_binario.py
+# Frames binarios de muestras para la ingesta en vivo (evento Socket.IO 'muestras_bin').
+# Reemplazan al JSON dentro de un string (42["message","{\"y\":...}"]): sin
+# sprintf en el sensor, sin json.loads por muestra en el servidor, y con
+# muchas muestras por mensaje. Todo little-endian:
+#
+#   encabezado  "<2sBBHI"  magic b"MT" | versión (1) | largo del id | n muestras | secuencia de la 1ª muestra
+#   id          largo_id bytes UTF-8 (0 = el dispositivo de la conexión / por defecto)
+#   muestras    n x DTYPE_MUESTRA (32 bytes): t_us (uint64, reloj del sensor) + 6 float32
+#
+# La muestra k del frame tiene secuencia `secuencia + k`.
+
+import struct
+
+import numpy as np
+
+MAGIC = b"MT"
+VERSION = 1
+ENCABEZADO = struct.Struct("<2sBBHI")
+
+DTYPE_MUESTRA = np.dtype([
+    ("t_us", "<u8"),
+    ("y", "<f4"), ("p", "<f4"), ("r", "<f4"),
+    ("ax", "<f4"), ("ay", "<f4"), ("az", "<f4")
+])
+CANALES = ("y", "p", "r", "ax", "ay", "az")  # mismo orden que BufferVivo (yaw, pitch, roll, ax, ay, az)
+
+
+def decodificar_frame(datos):
+    """
+    bytes -> (dispositivo o None, secuencia, t_us (n,) uint64, valores (n, 6) float64).
+    Lanza ValueError si el frame está mal formado.
+    """
+    datos = bytes(datos)
+    if len(datos) < ENCABEZADO.size:
+        raise ValueError("Frame binario demasiado corto")
+    magic, version, largo_id, n, secuencia = ENCABEZADO.unpack_from(datos)
+    if magic != MAGIC:
+        raise ValueError("Frame binario sin magic 'MT'")
+    if version != VERSION:
+        raise ValueError(f"Versión de frame binario no soportada: {version}")
+
+    inicio = ENCABEZADO.size + largo_id
+    if len(datos) != inicio + n * DTYPE_MUESTRA.itemsize:
+        raise ValueError("Largo del frame binario inconsistente con la cantidad de muestras")
+    dispositivo = datos[ENCABEZADO.size:inicio].decode("utf-8") if largo_id else None
+
+    muestras = np.frombuffer(datos, dtype=DTYPE_MUESTRA, count=n, offset=inicio)
+    # float32 tiene ~7 cifras: se redondea a 4 decimales para que el CSV no muestre
+    # artefactos de la conversión (1.2000000476837158)
+    valores = np.round(np.column_stack([muestras[c] for c in CANALES]).astype(np.float64), 4)
+    return dispositivo, secuencia, muestras["t_us"].copy(), valores
+
+
+def codificar_frame(secuencia, t_us, valores, dispositivo=None):
+    """Inverso de decodificar_frame (lo usa el sensor simulado de tools/)"""
+    valores = np.asarray(valores, dtype=np.float32).reshape(-1, len(CANALES))
+    id_bytes = dispositivo.encode("utf-8") if dispositivo else b""
+    muestras = np.empty(len(valores), dtype=DTYPE_MUESTRA)
+    muestras["t_us"] = t_us
+    for k, c in enumerate(CANALES):
+        muestras[c] = valores[:, k]
+    return ENCABEZADO.pack(MAGIC, VERSION, len(id_bytes), len(muestras), secuencia) + id_bytes + muestras.tobytes()
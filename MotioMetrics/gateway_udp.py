@@ -0,0 +1,220 @@
+# gateway_udp.py
+# Receptor UDP (asyncio) para despliegues locales con el firmware motiosensor_udp
+# (modo AP): cada sensor manda una línea por datagrama al puerto 4210:
+#     "HH:MM:SS.mmm,yaw,pitch,roll,ax,ay,az"   (hora = millis() del sensor)
+# - Muchos sensores a la vez: se separan por dirección de origen (IP). El
+#   dispositivo es "udp-<ip>" o el nombre que le dé MOTIO_UDP_DISPOSITIVOS
+#   ("192.168.4.1=muneca_izq,192.168.4.3=muneca_der").
+# - Los datagramas se acumulan INTERVALO_LOTE_S y se decodifican en bloque por
+#   dispositivo; el lote entra por el mismo camino que los lotes con reloj del
+#   sensor (sincronización de reloj, buffer, grabación). Sin secuencia: UDP no la trae.
+# - Sin datos no consume CPU: el loop de asyncio espera en el socket (el viejo
+#   udp_listener de archive/ giraba sobre un socket no bloqueante).
+#
+# Dos formas de usarlo:
+#   - dentro de app_asgi.py, con MOTIO_UDP_PUERTO=4210 (mismo loop, sin red de por medio)
+#   - suelto, reenviando al backend (sirve también con app.py + eventlet):
+#       python gateway_udp.py --url http://127.0.0.1:5000
+
+import os
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+PUERTO_UDP = int(os.environ.get("MOTIO_UDP_PUERTO", 4210))
+INTERVALO_LOTE_S = float(os.environ.get("MOTIO_UDP_LOTE_S", 0.05))
+DISPOSITIVOS_UDP = os.environ.get("MOTIO_UDP_DISPOSITIVOS", "")
+
+
+def nombres_dispositivos(texto=DISPOSITIVOS_UDP):
+    """"ip=nombre,ip=nombre" -> {ip: nombre}"""
+    nombres = {}
+    for par in texto.split(","):
+        if "=" in par:
+            ip, nombre = par.split("=", 1)
+            nombres[ip.strip()] = nombre.strip()
+    return nombres
+
+
+def decodificar_lineas(lineas, llegadas_ns, con_hora=None):
+    """
+    Decodifica en bloque líneas "HH:MM:SS.mmm,y,p,r,ax,ay,az".
+    Las que no traen hora ("y,p,r,ax,ay,az") toman la de llegada: para el
+    RelojSensor es un reloj más, con offset ~0.
+    con_hora: el reloj del emisor (True = hora del sensor, False = llegada); None lo
+    decide la primera línea válida. Las líneas del otro formato se cuentan como
+    inválidas, para no mezclar los dos relojes en un mismo t_ns.
+    Devuelve (t_sensor_ns (n,) int64, valores (n, 6), cantidad de líneas inválidas, con_hora).
+    """
+    filas, llegadas = [], []
+    invalidas = 0
+    for linea, llegada in zip(lineas, llegadas_ns):
+        campos = linea.split(",")
+        hora = ":" in campos[0]
+        if con_hora is None and len(campos) - hora >= 6:
+            con_hora = hora
+        if hora != con_hora or len(campos) - hora < 6:
+            invalidas += 1
+            continue
+        if hora:
+            hms = campos[0].split(":")
+            if len(hms) != 3:
+                invalidas += 1
+                continue
+            filas.append(hms + campos[1:7])
+        else:
+            filas.append(campos[:6])
+        llegadas.append(llegada)
+    if not filas:
+        return np.empty(0, dtype=np.int64), np.empty((0, 6)), invalidas, con_hora
+
+    try:
+        numeros = np.asarray(filas, dtype=float)
+    except ValueError:
+        # Alguna línea rota (en la hora o en los valores): se descarta sólo esa
+        validas = []
+        for i, fila in enumerate(filas):
+            try:
+                validas.append((i, [float(x) for x in fila]))
+            except ValueError:
+                invalidas += 1
+        llegadas = [llegadas[i] for i, _ in validas]
+        numeros = np.asarray([fila for _, fila in validas], dtype=float).reshape(-1, 9 if con_hora else 6)
+
+    if not con_hora:
+        return np.asarray(llegadas, dtype=np.int64), numeros, invalidas, con_hora
+    hms, valores = numeros[:, :3], numeros[:, 3:]
+    t_ns = np.round((hms[:, 0] * 3600 + hms[:, 1] * 60 + hms[:, 2]) * 1e9).astype(np.int64)
+    return t_ns, valores, invalidas, con_hora
+
+
+class EmisorUDP:
+    """Lo pendiente y los contadores de una dirección de origen"""
+
+    def __init__(self, dispositivo):
+        self.dispositivo = dispositivo
+        self.lineas = []
+        self.llegadas_ns = []
+        self.datagramas = 0
+        self.muestras = 0
+        self.invalidas = 0
+        self.ultimo = None
+        self.con_hora = None  # reloj del emisor: lo fija su primera línea válida (ver decodificar_lineas)
+
+    def estado(self):
+        return {
+            "dispositivo": self.dispositivo,
+            "datagramas": self.datagramas,
+            "muestras": self.muestras,
+            "invalidas": self.invalidas,
+            "reloj": {True: "sensor", False: "llegada"}.get(self.con_hora),
+            "ultimo_hace_s": None if self.ultimo is None else round(time.monotonic() - self.ultimo, 1)
+        }
+
+
+class GatewayUDP(asyncio.DatagramProtocol):
+    """
+    entregar(dispositivo, secuencia, t_sensor_ns, valores, llegada_ns) recibe cada lote
+    decodificado (secuencia siempre None), con la firma de ingresar_sensor.
+    """
+
+    def __init__(self, entregar, intervalo_lote_s=INTERVALO_LOTE_S, nombres=None):
+        self.entregar = entregar
+        self.intervalo_lote_s = intervalo_lote_s
+        self.nombres = nombres_dispositivos() if nombres is None else nombres
+        self.emisores = {}  # ip -> EmisorUDP
+        self.transport = None
+        self._vaciado = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        ip = addr[0]
+        emisor = self.emisores.get(ip)
+        if emisor is None:
+            emisor = self.emisores[ip] = EmisorUDP(self.nombres.get(ip, f"udp-{ip}"))
+            print(f"[UDP] Sensor nuevo {ip} -> {emisor.dispositivo}")
+        llegada_ns = time.time_ns()
+        emisor.datagramas += 1
+        emisor.ultimo = time.monotonic()
+        for linea in data.decode("utf-8", errors="replace").splitlines():
+            if linea.strip():
+                emisor.lineas.append(linea.strip())
+                emisor.llegadas_ns.append(llegada_ns)
+        if self._vaciado is None:
+            self._vaciado = asyncio.get_running_loop().call_later(self.intervalo_lote_s, self.vaciar)
+
+    def vaciar(self):
+        """Decodifica y entrega lo acumulado de cada sensor (un lote por dispositivo)"""
+        self._vaciado = None
+        for emisor in self.emisores.values():
+            if not emisor.lineas:
+                continue
+            lineas, llegadas = emisor.lineas, emisor.llegadas_ns
+            emisor.lineas, emisor.llegadas_ns = [], []
+            try:
+                t_ns, valores, invalidas, emisor.con_hora = decodificar_lineas(lineas, llegadas, emisor.con_hora)
+                emisor.invalidas += invalidas
+                if len(t_ns):
+                    emisor.muestras += len(t_ns)
+                    self.entregar(emisor.dispositivo, None, t_ns, valores, llegadas[-1])
+            except Exception as e:
+                print(f"Error procesando lote UDP ({emisor.dispositivo}): {e}")
+
+    def error_received(self, exc):
+        print(f"Error UDP: {exc}")
+
+    def estado(self):
+        return {ip: emisor.estado() for ip, emisor in self.emisores.items()}
+
+
+async def iniciar_gateway(entregar, puerto=PUERTO_UDP, host="0.0.0.0", **kwargs):
+    """Abre el puerto UDP en el loop actual; devuelve el GatewayUDP"""
+    loop = asyncio.get_running_loop()
+    _, gateway = await loop.create_datagram_endpoint(lambda: GatewayUDP(entregar, **kwargs),
+                                                     local_addr=(host, puerto))
+    print(f"[UDP] Escuchando sensores en {host}:{puerto}")
+    return gateway
+
+
+def reenviador_socketio(url):
+    """entregar() que manda cada lote al backend como 'muestras' (lote JSON con reloj del sensor)"""
+    import socketio
+    sio = socketio.Client(reconnection=True)
+    sio.connect(url, transports=["websocket"])
+
+    def entregar(dispositivo, secuencia, t_sensor_ns, valores, llegada_ns):
+        if sio.connected:
+            sio.emit("muestras", {"id": dispositivo, "t_us": (t_sensor_ns // 1000).tolist(),
+                                  "m": np.round(valores, 4).tolist()})
+    return entregar
+
+
+async def main_async(args):
+    gateway = await iniciar_gateway(reenviador_socketio(args.url), args.puerto, args.host)
+    if args.reporte <= 0:
+        await asyncio.Event().wait()
+    while True:
+        await asyncio.sleep(args.reporte)
+        if gateway.emisores:
+            print(f"[UDP] {gateway.estado()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gateway UDP -> backend MotioMetrics")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="backend (Socket.IO)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--puerto", type=int, default=PUERTO_UDP)
+    parser.add_argument("--reporte", type=float, default=30.0, help="segundos entre reportes de estado (0 = sin reportes)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
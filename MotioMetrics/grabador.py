@@ -0,0 +1,134 @@
+# grabador.py
+# Grabación "write-behind" de las muestras en vivo.
+# El handler de Socket.IO sólo encola la fila (deque.append, sin locks ni E/S);
+# un hilo del sistema operativo las escribe en bloque cada INTERVALO_FLUSH_S,
+# hace fsync cada INTERVALO_FSYNC_S y rota el archivo por tamaño o duración.
+# Si el proceso se cae, se pierden como mucho ~INTERVALO_FSYNC_S segundos.
+
+import os
+import csv
+import time
+from collections import deque
+
+# Con eventlet, `threading` y `time` están parcheados (green threads). El escritor
+# tiene que ser un hilo real para que la E/S a disco no frene el loop de eventlet
+# (también la del cierre: el último vaciado, el fsync y el close los hace ese hilo).
+try:
+    from eventlet import patcher
+    _threading = patcher.original('threading')
+    _time = patcher.original('time')
+except ImportError:
+    import threading as _threading
+    import time as _time
+
+INTERVALO_FLUSH_S = float(os.environ.get("MOTIO_GRABADOR_FLUSH_S", 1.0))
+INTERVALO_FSYNC_S = float(os.environ.get("MOTIO_GRABADOR_FSYNC_S", 5.0))
+MAX_BYTES_SEGMENTO = int(float(os.environ.get("MOTIO_GRABADOR_MAX_MB", 64)) * 1024 * 1024)
+MAX_DURACION_SEGMENTO_S = float(os.environ.get("MOTIO_GRABADOR_MAX_S", 60 * 60))
+
+
+class Grabador:
+    """
+    Escribe filas CSV desde un hilo propio.
+    - agregar(fila): lo llama el productor (no bloquea)
+    - cerrar(): el hilo vacía la cola, hace fsync y cierra; devuelve los nombres de los segmentos
+    El primer segmento se llama `nombre_archivo`; los siguientes `<base>_parte2.csv`, ...
+    """
+
+    def __init__(self, directorio, nombre_archivo, encabezado,
+                 intervalo_flush_s=INTERVALO_FLUSH_S, intervalo_fsync_s=INTERVALO_FSYNC_S,
+                 max_bytes=MAX_BYTES_SEGMENTO, max_duracion_s=MAX_DURACION_SEGMENTO_S):
+        self.directorio = directorio
+        self.base, self.extension = os.path.splitext(nombre_archivo)
+        self.encabezado = encabezado
+        self.intervalo_flush_s = intervalo_flush_s
+        self.intervalo_fsync_s = intervalo_fsync_s
+        self.max_bytes = max_bytes
+        self.max_duracion_s = max_duracion_s
+
+        self._cola = deque()
+        self._detener = _threading.Event()
+        self.segmentos = []
+        self.filas_escritas = 0
+        self.ultimo_error = None
+
+        os.makedirs(directorio, exist_ok=True)
+        self._abrir_segmento()
+        self._hilo = _threading.Thread(target=self._bucle, name="grabador", daemon=True)
+        self._hilo.start()
+
+    # --- Productor ---
+
+    def agregar(self, fila):
+        self._cola.append(fila)
+
+    def agregar_lote(self, filas):
+        self._cola.extend(filas)
+
+    @property
+    def pendientes(self):
+        return len(self._cola)
+
+    # --- Escritor (hilo propio) ---
+
+    def _abrir_segmento(self):
+        parte = len(self.segmentos) + 1
+        nombre = f"{self.base}{self.extension}" if parte == 1 else f"{self.base}_parte{parte}{self.extension}"
+        self._archivo = open(os.path.join(self.directorio, nombre), "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._archivo)
+        self._writer.writerow(self.encabezado)
+        self._inicio_segmento = _time.monotonic()
+        self._ultimo_fsync = self._inicio_segmento
+        self.segmentos.append(nombre)
+
+    def _cerrar_segmento(self):
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        self._archivo.close()
+
+    def _escribir_pendientes(self, forzar_fsync=False, rotar=True):
+        n = len(self._cola)
+        if n:
+            filas = [self._cola.popleft() for _ in range(n)]
+            self._writer.writerows(filas)
+            self.filas_escritas += n
+            self._archivo.flush()
+
+        ahora = _time.monotonic()
+        if forzar_fsync or ahora - self._ultimo_fsync >= self.intervalo_fsync_s:
+            os.fsync(self._archivo.fileno())
+            self._ultimo_fsync = ahora
+
+        if rotar and (self._archivo.tell() >= self.max_bytes or ahora - self._inicio_segmento >= self.max_duracion_s):
+            self._cerrar_segmento()
+            self._abrir_segmento()
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo_flush_s):
+            try:
+                self._escribir_pendientes()
+            except Exception as e:
+                self.ultimo_error = str(e)
+                print(f"Error en grabador ({self.segmentos[-1]}): {e}")
+        try:
+            self._escribir_pendientes(forzar_fsync=True, rotar=False)
+            self._archivo.close()
+        except Exception as e:
+            self.ultimo_error = str(e)
+            print(f"Error cerrando grabación ({self.segmentos[-1]}): {e}")
+
+    def cerrar(self):
+        self._detener.set()
+        # Sin join(): con eventlet bloquearía el loop hasta que termine el fsync. `time`
+        # (parcheado) cede el loop mientras el hilo escritor termina.
+        while self._hilo.is_alive():
+            time.sleep(0.01)
+        return list(self.segmentos)
+
+    def estado(self):
+        return {
+            "segmentos": list(self.segmentos),
+            "filas_escritas": self.filas_escritas,
+            "pendientes": self.pendientes,
+            "ultimo_error": self.ultimo_error
+        }
@@ -0,0 +1,127 @@
+# ingesta_ws.py
+# Endpoint WebSocket "crudo" para los sensores: ws://<host>/ws/ingresar_datos
+# Sin Engine.IO/Socket.IO (nada de "40", ping "2"/"3" ni envoltorio 42[...]):
+# cada mensaje WebSocket es directamente un dato.
+#   - texto:   el mismo JSON de siempre ({"y":..}) o un lote ({"seq","t_ms","m"})
+#   - binario: un frame de formato_binario.py
+# El dispositivo va en la URL (?dispositivo=<id>) o dentro del mensaje.
+# Si MOTIO_TOKEN_INGESTA está definido, hay que mandarlo en ?token= o en
+# "Authorization: Bearer <token>"; si no, se responde 401 antes del upgrade.
+# Los dashboards siguen en Socket.IO.
+# IngestaWSMiddleware es para app.py (WSGI + eventlet); IngestaWSASGI para app_asgi.py.
+
+import os
+import hmac
+from urllib.parse import parse_qs
+
+from analisis_vivo_core_websockets import procesar_datos_ws, procesar_frame_binario
+
+RUTA_INGESTA = "/ws/ingresar_datos"
+TOKEN_INGESTA = os.environ.get("MOTIO_TOKEN_INGESTA")
+
+
+class _IngestaWS:
+    """Token, despacho de mensajes y contadores (comunes a WSGI y ASGI)"""
+
+    def __init__(self, token=TOKEN_INGESTA):
+        self.token = token
+        self.conexiones = 0
+        self.mensajes = 0
+        self.rechazadas = 0
+
+    def _autorizado(self, query_string, autorizacion):
+        if not self.token:
+            return True
+        token = parse_qs(query_string).get("token", [""])[0]
+        if autorizacion.startswith("Bearer "):
+            token = autorizacion[len("Bearer "):]
+        # En bytes: compare_digest con str falla (TypeError) si el token trae caracteres no ASCII
+        return hmac.compare_digest(token.encode("utf-8", errors="replace"), self.token.encode("utf-8"))
+
+    def _recibir(self, mensaje, dispositivo):
+        self.mensajes += 1
+        if isinstance(mensaje, (bytes, bytearray)):
+            procesar_frame_binario(mensaje, dispositivo)
+        else:
+            procesar_datos_ws(mensaje, dispositivo)
+
+    def estado(self):
+        return {
+            "ruta": RUTA_INGESTA,
+            "conexiones": self.conexiones,
+            "mensajes": self.mensajes,
+            "rechazadas": self.rechazadas,
+            "requiere_token": bool(self.token)
+        }
+
+
+class IngestaWSMiddleware(_IngestaWS):
+    """Middleware WSGI: atiende RUTA_INGESTA y deja pasar todo lo demás a la app (Flask + Socket.IO)"""
+
+    def __init__(self, wsgi_app, token=TOKEN_INGESTA):
+        from eventlet import websocket  # sólo el camino WSGI necesita eventlet (app_asgi.py no lo importa)
+        super().__init__(token)
+        self.wsgi_app = wsgi_app
+        self._ws = websocket.WebSocketWSGI(self._atender)
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO") != RUTA_INGESTA:
+            return self.wsgi_app(environ, start_response)
+
+        if not self._autorizado(environ.get("QUERY_STRING", ""), environ.get("HTTP_AUTHORIZATION", "")):
+            self.rechazadas += 1
+            start_response("401 Unauthorized", [("Content-Type", "text/plain")])
+            return [b"Token de ingesta invalido"]
+        return self._ws(environ, start_response)
+
+    def _atender(self, ws):
+        dispositivo = parse_qs(ws.environ.get("QUERY_STRING", "")).get("dispositivo", [None])[0]
+        self.conexiones += 1
+        print(f"[WS-ingesta] Sensor conectado ({dispositivo or 'por defecto'})")
+        try:
+            while True:
+                mensaje = ws.wait()
+                if mensaje is None:
+                    break
+                self._recibir(mensaje, dispositivo)
+        finally:
+            self.conexiones -= 1
+            print(f"[WS-ingesta] Sensor desconectado ({dispositivo or 'por defecto'})")
+
+
+class IngestaWSASGI(_IngestaWS):
+    """
+    Lo mismo sobre ASGI: atiende el WebSocket de RUTA_INGESTA y pasa todo lo demás a asgi_app.
+    Sin token válido se cierra antes de aceptar (el servidor ASGI responde 403).
+    """
+
+    def __init__(self, asgi_app, token=TOKEN_INGESTA):
+        super().__init__(token)
+        self.asgi_app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket" or scope["path"] != RUTA_INGESTA:
+            return await self.asgi_app(scope, receive, send)
+
+        query_string = scope.get("query_string", b"").decode("latin-1")
+        encabezados = dict(scope.get("headers", []))
+        if not self._autorizado(query_string, encabezados.get(b"authorization", b"").decode("latin-1")):
+            self.rechazadas += 1
+            await send({"type": "websocket.close", "code": 1008})
+            return
+
+        dispositivo = parse_qs(query_string).get("dispositivo", [None])[0]
+        await receive()  # websocket.connect
+        await send({"type": "websocket.accept"})
+        self.conexiones += 1
+        print(f"[WS-ingesta] Sensor conectado ({dispositivo or 'por defecto'})")
+        try:
+            while True:
+                mensaje = await receive()
+                if mensaje["type"] != "websocket.receive":
+                    break
+                self._recibir(mensaje.get("bytes") if mensaje.get("bytes") is not None else mensaje.get("text"),
+                              dispositivo)
+        finally:
+            self.conexiones -= 1
+            print(f"[WS-ingesta] Sensor desconectado ({dispositivo or 'por defecto'})")
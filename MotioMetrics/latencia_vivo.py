@@ -0,0 +1,175 @@
+# latencia_vivo.py
+# Latencia del camino en vivo, muestra por muestra: sensor -> servidor -> dashboard.
+#
+# Para cada muestra del buffer (por su índice absoluto) se guardan:
+#   - t_muestra: su hora en el reloj del servidor. Con reloj del sensor (lotes JSON,
+#     binario, UDP) es la hora en que la tomó el sensor, vía RelojSensor; el JSON
+#     por muestra del firmware no trae hora y ahí es la llegada.
+#   - llegada:   cuando el mensaje llegó al servidor
+#   - procesada: cuando quedó en el buffer (y encolada para la grabación y el análisis)
+# y para cada frame 'datos_vivo': cuándo se emitió y qué muestras traía. Con el
+# 'ack_vivo' de cada dashboard se cierra la cuenta.
+#
+# Etapas (histogramas por dispositivo, últimos VENTANA_LATENCIA_S segundos):
+#   sensor   llegada - t_muestra   espera en el sensor (lotes) + red, sobre el mensaje más
+#                                  rápido (RelojSensor toma ese como offset). Sólo con reloj del sensor.
+#   proceso  procesada - llegada
+#   emision  emitido - procesada   espera hasta el próximo frame de bucle_difusion
+#   servidor emitido - llegada
+#   entrega  ack - emitido         ida y vuelta del frame hasta el dashboard (por frame)
+#   total    ack - t_muestra       de punta a punta: desde que el sensor tomó la muestra (o
+#                                  desde que llegó, si no trae hora) hasta el ack del dashboard
+# "entrega" y "total" también van por dashboard (sid).
+
+import os
+import time
+import bisect
+from collections import OrderedDict
+
+import numpy as np
+
+from buffer_vivo import CAPACIDAD_COMPLETA
+
+VENTANA_LATENCIA_S = float(os.environ.get("MOTIO_VENTANA_LATENCIA_S", 60))
+TRAMOS = 12  # la ventana rota de a VENTANA_LATENCIA_S / TRAMOS
+MAX_FRAMES = 256  # frames emitidos que se recuerdan esperando su ack (~25 s a 10 fps)
+
+ETAPAS = ("sensor", "proceso", "emision", "servidor", "entrega", "total")
+PERCENTILES = (50, 95, 99)
+
+# Bins logarítmicos de 10 us a 100 s, 20 por década (error relativo < 6 % en los percentiles)
+BORDES_NS = np.logspace(4, 11, 141)
+_BORDES_NS = BORDES_NS.tolist()  # para ubicar de a un valor con bisect (sin numpy por muestra)
+CENTROS_MS = np.concatenate([[BORDES_NS[0]], np.sqrt(BORDES_NS[:-1] * BORDES_NS[1:]), [BORDES_NS[-1]]]) / 1e6
+
+
+class HistogramaLatencia:
+    """Histograma de latencias de los últimos `ventana_s` segundos (ventana que rota por tramos)"""
+
+    def __init__(self, ventana_s=VENTANA_LATENCIA_S, tramos=TRAMOS):
+        self.tramo_s = ventana_s / tramos
+        self.conteos = np.zeros((tramos, len(BORDES_NS) + 1), dtype=np.int64)
+        self.maximos = np.zeros(tramos, dtype=np.int64)
+        self._tramo = int(time.monotonic() // self.tramo_s)
+
+    def _rotar(self):
+        tramo = int(time.monotonic() // self.tramo_s)
+        if tramo == self._tramo:
+            return tramo % len(self.conteos)
+        vencidos = min(tramo - self._tramo, len(self.conteos))
+        for k in range(1, vencidos + 1):
+            i = (self._tramo + k) % len(self.conteos)
+            self.conteos[i] = 0
+            self.maximos[i] = 0
+        self._tramo = tramo
+        return tramo % len(self.conteos)
+
+    def agregar_uno(self, latencia_ns):
+        """Como agregar, para un solo valor (la ingesta por muestra del firmware)"""
+        i = self._rotar()
+        self.conteos[i, bisect.bisect_left(_BORDES_NS, latencia_ns)] += 1
+        if latencia_ns > self.maximos[i]:
+            self.maximos[i] = latencia_ns
+
+    def agregar(self, latencias_ns):
+        latencias_ns = np.atleast_1d(np.asarray(latencias_ns, dtype=np.int64))
+        if len(latencias_ns) == 0:
+            return
+        i = self._rotar()
+        self.conteos[i] += np.bincount(np.searchsorted(BORDES_NS, latencias_ns), minlength=self.conteos.shape[1])
+        self.maximos[i] = max(self.maximos[i], int(latencias_ns.max()))
+
+    def resumen(self):
+        """{"n", "p50_ms", "p95_ms", "p99_ms", "max_ms"} de la ventana (None si no hubo nada)"""
+        self._rotar()
+        acumulado = np.cumsum(self.conteos.sum(axis=0))
+        n = int(acumulado[-1])
+        if n == 0:
+            return None
+        maximo_ms = float(self.maximos.max()) / 1e6
+        resumen = {"n": n}
+        for p in PERCENTILES:
+            centro_ms = float(CENTROS_MS[np.searchsorted(acumulado, p / 100 * n)])
+            resumen[f"p{p}_ms"] = round(min(centro_ms, maximo_ms), 2)
+        resumen["max_ms"] = round(maximo_ms, 2)
+        return resumen
+
+
+class LatenciaVivo:
+    """Tiempos por muestra y por frame de una SesionVivo, y sus histogramas"""
+
+    def __init__(self, capacidad=CAPACIDAD_COMPLETA):
+        self.capacidad = capacidad
+        self.t_muestra = np.zeros(capacidad, dtype=np.int64)
+        self.llegada = np.zeros(capacidad, dtype=np.int64)
+        self.procesada = np.zeros(capacidad, dtype=np.int64)
+        self.total = 0  # igual a buffer.total
+        self.frames = OrderedDict()  # número -> (emitido_ns, desde, hasta) índices absolutos [desde, hasta)
+        self.etapas = {etapa: HistogramaLatencia() for etapa in ETAPAS}
+        self.dashboards = {}  # sid -> {"entrega": HistogramaLatencia, "total": HistogramaLatencia}
+        self._primer_frame = {}  # sid -> frame con el que se suscribió (ese no se mide: se mandó aparte)
+
+    def _indices(self, desde, hasta):
+        """Posiciones en el anillo de las muestras [desde, hasta) que todavía están"""
+        desde = max(desde, self.total - self.capacidad)
+        return np.arange(desde, hasta) % self.capacidad
+
+    def registrar_muestra(self, llegada_ns, procesada_ns):
+        """Una muestra sin reloj del sensor (t_muestra = llegada), recién agregada al buffer"""
+        i = self.total % self.capacidad
+        self.t_muestra[i] = llegada_ns
+        self.llegada[i] = llegada_ns
+        self.procesada[i] = procesada_ns
+        self.total += 1
+        self.etapas["proceso"].agregar_uno(procesada_ns - llegada_ns)
+
+    def registrar_ingreso(self, t_muestra_ns, llegada_ns, procesada_ns, con_reloj):
+        """Muestras recién agregadas al buffer (las últimas len(t_muestra_ns))"""
+        t_muestra_ns = np.atleast_1d(np.asarray(t_muestra_ns, dtype=np.int64))
+        n = len(t_muestra_ns)
+        indices = (self.total + np.arange(max(0, n - self.capacidad), n)) % self.capacidad
+        self.t_muestra[indices] = t_muestra_ns[-len(indices):]
+        self.llegada[indices] = llegada_ns
+        self.procesada[indices] = procesada_ns
+        self.total += n
+        if con_reloj:
+            self.etapas["sensor"].agregar(np.maximum(llegada_ns - t_muestra_ns, 0))
+        self.etapas["proceso"].agregar(np.full(n, procesada_ns - llegada_ns))
+
+    def registrar_emision(self, numero, desde, hasta, emitido_ns):
+        """Frame `numero` emitido con las muestras nuevas [desde, hasta)"""
+        self.frames[numero] = (emitido_ns, desde, hasta)
+        while len(self.frames) > MAX_FRAMES:
+            self.frames.popitem(last=False)
+        indices = self._indices(desde, hasta)
+        self.etapas["emision"].agregar(emitido_ns - self.procesada[indices])
+        self.etapas["servidor"].agregar(emitido_ns - self.llegada[indices])
+
+    def registrar_suscripcion(self, sid, numero):
+        self._primer_frame[sid] = numero
+        self.dashboards.setdefault(sid, {"entrega": HistogramaLatencia(), "total": HistogramaLatencia()})
+
+    def registrar_ack(self, sid, numero, recibido_ns):
+        if numero is None or sid not in self.dashboards or int(numero) <= self._primer_frame.get(sid, 0):
+            return
+        frame = self.frames.get(int(numero))
+        if frame is None:
+            return
+        emitido_ns, desde, hasta = frame
+        entrega = max(recibido_ns - emitido_ns, 0)
+        total = np.maximum(recibido_ns - self.t_muestra[self._indices(desde, hasta)], 0)
+        for histogramas in (self.etapas, self.dashboards[sid]):
+            histogramas["entrega"].agregar([entrega])
+            histogramas["total"].agregar(total)
+
+    def quitar(self, sid):
+        self.dashboards.pop(sid, None)
+        self._primer_frame.pop(sid, None)
+
+    def estado(self):
+        return {
+            "ventana_s": VENTANA_LATENCIA_S,
+            "etapas": {etapa: h.resumen() for etapa, h in self.etapas.items()},
+            "dashboards": {sid: {etapa: h.resumen() for etapa, h in histogramas.items()}
+                           for sid, histogramas in list(self.dashboards.items())}
+        }
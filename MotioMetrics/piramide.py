@@ -0,0 +1,74 @@
+# piramide.py
+# Pirámide min/max multi-resolución para hacer zoom en grabaciones largas.
+# Se construye una vez por análisis: el nivel 0 son las muestras originales y
+# cada nivel siguiente agrupa FACTOR_PIRAMIDE muestras del anterior guardando el
+# mínimo y el máximo. Una consulta [t0, t1] elige el nivel más fino que entra en
+# `max_puntos`, así la respuesta tiene tamaño ~constante y la envolvente es exacta
+# (ningún pico queda afuera por diezmado).
+
+import numpy as np
+
+FACTOR_PIRAMIDE = 4
+PUNTOS_DEFECTO = 1000
+MAX_PUNTOS = 5000
+
+
+class PiramideMinMax:
+    def __init__(self, tiempos_s, series, factor=FACTOR_PIRAMIDE):
+        """
+        tiempos_s : array con el tiempo de cada muestra en segundos desde el inicio (creciente)
+        series    : dict nombre -> array del mismo largo que tiempos_s
+        """
+        self.factor = factor
+        self.tiempos_s = np.asarray(tiempos_s, dtype=float)
+        self.nombres = list(series)
+
+        # niveles[k] = (tiempos del primer elemento de cada bloque, {nombre: (min, max)})
+        nivel = {n: (np.asarray(v, dtype=float), np.asarray(v, dtype=float)) for n, v in series.items()}
+        self.niveles = [(self.tiempos_s, nivel)]
+        tiempos = self.tiempos_s
+        while len(tiempos) > factor:
+            inicios = np.arange(0, len(tiempos), factor)
+            tiempos = tiempos[inicios]
+            nivel = {
+                n: (np.minimum.reduceat(mn, inicios), np.maximum.reduceat(mx, inicios))
+                for n, (mn, mx) in nivel.items()
+            }
+            self.niveles.append((tiempos, nivel))
+
+    @property
+    def duracion_s(self):
+        return float(self.tiempos_s[-1]) if len(self.tiempos_s) else 0.0
+
+    def consulta(self, t0=None, t1=None, max_puntos=PUNTOS_DEFECTO, nombres=None):
+        """Envolvente min/max de las series pedidas en [t0, t1] (segundos desde el inicio)"""
+        max_puntos = int(min(max(max_puntos, 10), MAX_PUNTOS))
+        nombres = [n for n in (nombres or self.nombres) if n in self.nombres]
+        t0 = 0.0 if t0 is None else float(t0)
+        t1 = self.duracion_s if t1 is None else float(t1)
+        if t1 < t0:
+            t0, t1 = t1, t0
+
+        # Rango en muestras originales (incluye la muestra anterior/posterior para que la línea no se corte)
+        i0 = max(int(np.searchsorted(self.tiempos_s, t0, side='right')) - 1, 0)
+        i1 = min(int(np.searchsorted(self.tiempos_s, t1, side='left')) + 1, len(self.tiempos_s))
+
+        # Nivel más fino cuyo número de bloques en el rango entra en max_puntos
+        k = 0
+        while k < len(self.niveles) - 1 and -(-(i1 - i0) // self.factor**k) > max_puntos:
+            k += 1
+        bloque = self.factor**k
+        j0, j1 = i0 // bloque, -(-i1 // bloque)
+
+        tiempos, nivel = self.niveles[k]
+        respuesta = {
+            "nivel": k,
+            "muestras_por_punto": bloque,
+            "t0": t0,
+            "t1": t1,
+            "tiempo_s": np.round(tiempos[j0:j1], 3).tolist()
+        }
+        for n in nombres:
+            mn, mx = nivel[n]
+            respuesta[n] = {"min": np.round(mn[j0:j1], 4).tolist(), "max": np.round(mx[j0:j1], 4).tolist()}
+        return respuesta
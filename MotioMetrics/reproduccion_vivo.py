@@ -0,0 +1,255 @@
+# reproduccion_vivo.py
+# Reproduce una grabación guardada en una sesión en vivo, como si el sensor
+# estuviera transmitiendo: sirve para repetir sesiones de campo y para probar el
+# modo en vivo (dashboards, detector, grabación, análisis incremental) sin hardware.
+#
+# - Archivos: los CSV de grabaciones_vivo (Timestamp = epoch en ns, o 'HH:MM:SS.mmm'
+#   en las viejas), los mpu_dataNN.CSV de la SD del sensor ('HH:MM:SS.mmm' de
+#   millis(), las horas pueden pasar de 24) subidos a grabaciones_vivo/sd, y los
+#   de las carpetas de MOTIO_DIRS_REPRODUCCION.
+# - El archivo se lee de a FILAS_POR_BLOQUE filas (leer_grabacion es un generador):
+#   una grabación de horas no se carga entera en memoria.
+# - Las muestras conservan el espaciado de la grabación: su hora es la del inicio de
+#   la reproducción más el tiempo relativo en el archivo, y la velocidad sólo cambia
+#   el ritmo de entrega. A x10 la sesión recibe 10 s de grabación por segundo, pero
+#   el buffer, el CSV grabado, el detector y el análisis ven la frecuencia de
+#   muestreo original (las horas quedan adelantadas respecto del reloj de pared).
+#   Entran por agregar_lote (no por el reloj del sensor, que las volvería a
+#   comprimir al seguir la hora de llegada).
+# - Cada reproducción es una tarea de fondo (socketio.start_background_task) que
+#   entrega lo que corresponde cada INTERVALO_ENVIO_S.
+# Con varios workers la reproducción corre en el dueño del dispositivo (app.py le
+# pasa el pedido) y su estado se publica con el de la sesión en vivo.
+
+import os
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+import analisis_vivo_core_websockets as vivo
+
+DIRECTORIO_GRABACIONES = "grabaciones_vivo"
+DIRECTORIO_SD = os.path.join(DIRECTORIO_GRABACIONES, "sd")  # archivos de la SD subidos para reproducir
+DIRECTORIOS_REPRODUCCION = [DIRECTORIO_GRABACIONES, DIRECTORIO_SD] + [
+    d for d in os.environ.get("MOTIO_DIRS_REPRODUCCION", "").split(os.pathsep) if d]
+FILAS_POR_BLOQUE = int(os.environ.get("MOTIO_REPRODUCCION_FILAS", 1000))
+INTERVALO_ENVIO_S = float(os.environ.get("MOTIO_REPRODUCCION_ENVIO_S", 0.04))  # un lote cada 40 ms
+MAX_REPRODUCCIONES = int(os.environ.get("MOTIO_MAX_REPRODUCCIONES", 8))  # simultáneas
+VELOCIDAD_MIN, VELOCIDAD_MAX = 1.0, 50.0
+ESPERA_MAX_S = 0.5  # aunque la grabación tenga un hueco, se revisa seguido si la detuvieron
+
+COLUMNAS = ["Yaw", "Pitch", "Roll", "Ax", "Ay", "Az"]
+NS = 1_000_000_000
+DIA_NS = 24 * 3600 * NS
+
+
+def tiempos_ns(serie):
+    """
+    Columna Timestamp -> ns (int64, NaN -> -1).
+    Enteros: epoch en ns. Texto 'HH:MM:SS.mmm': ns desde las 00:00 (o desde que
+    arrancó el sensor, en los archivos de la SD). Cualquier otro formato, el de pandas.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.fillna(-1).astype(np.int64).to_numpy()
+    texto = serie.astype(str).str.strip()
+    hms = texto.str.split(":", expand=True)
+    if hms.shape[1] == 3:
+        hms = hms.apply(pd.to_numeric, errors="coerce")
+        segundos = hms[0] * 3600 + hms[1] * 60 + hms[2]
+        return (segundos * 1e9).round().fillna(-1).astype(np.int64).to_numpy()
+    return pd.to_datetime(texto, errors="coerce").astype(np.int64).to_numpy()
+
+
+def leer_grabacion(ruta, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Genera (t_ns (n,) int64, valores (n, 6)) de a bloques, con los tiempos en el
+    reloj del archivo y sin retroceder: si la hora 'HH:MM:SS.mmm' pasa la medianoche
+    se suma un día, y cualquier otro retroceso queda en el tiempo anterior.
+    Las filas rotas o incompletas se descartan (como en cargar_datos).
+    """
+    anterior = crudo_anterior = None
+    dias = 0
+    with pd.read_csv(ruta, sep=",", encoding="latin1", on_bad_lines="skip",
+                     chunksize=filas_por_bloque) as bloques:
+        for bloque in bloques:
+            bloque.columns = bloque.columns.str.strip()
+            valores = bloque[COLUMNAS].apply(lambda c: pd.to_numeric(c.astype(str).str.strip(), errors="coerce"))
+            t_ns = tiempos_ns(bloque["Timestamp"])
+            validas = valores.notna().all(axis=1).to_numpy() & (t_ns >= 0)
+            t_ns, valores = t_ns[validas], valores.to_numpy(dtype=float)[validas]
+            if len(t_ns) == 0:
+                continue
+
+            previos = np.concatenate([[t_ns[0] if crudo_anterior is None else crudo_anterior], t_ns[:-1]])
+            crudo_anterior = t_ns[-1]
+            dias_bloque = dias + np.cumsum(t_ns - previos < -DIA_NS // 2)
+            dias = dias_bloque[-1]
+            t_ns = np.maximum.accumulate(t_ns + DIA_NS * dias_bloque)
+            if anterior is not None:
+                t_ns = np.maximum(t_ns, anterior)
+            anterior = t_ns[-1]
+            yield t_ns, valores
+
+
+def resolver_archivo(nombre):
+    """Nombre de archivo (sin carpetas) -> ruta en DIRECTORIOS_REPRODUCCION"""
+    if not nombre or os.path.basename(nombre) != nombre or nombre.startswith("."):
+        raise ValueError("Nombre de archivo inválido")
+    if not nombre.lower().endswith(".csv"):
+        raise ValueError("Sólo se reproducen archivos CSV")
+    for directorio in DIRECTORIOS_REPRODUCCION:
+        ruta = os.path.join(directorio, nombre)
+        if os.path.isfile(ruta):
+            return ruta
+    raise FileNotFoundError(f"No existe la grabación {nombre}")
+
+
+class Reproduccion:
+    def __init__(self, ruta, dispositivo, velocidad=1.0, desde_s=0.0, repetir=False):
+        self.ruta = ruta
+        self.dispositivo = dispositivo
+        self.velocidad = velocidad
+        self.desde_ns = int(desde_s * NS)
+        self.repetir = repetir
+        self.estado_actual = "reproduciendo"
+        self.error = None
+        self.muestras = 0
+        self.lotes = 0
+        self.vueltas = 0
+        self.segundos_grabacion = 0.0  # hasta dónde se reprodujo, en tiempo de la grabación
+        self.inicio = None
+        self.epoch_inicio_ns = None
+
+    @property
+    def activa(self):
+        return self.estado_actual == "reproduciendo"
+
+    def detener(self):
+        if self.activa:
+            self.estado_actual = "detenida"
+
+    def correr(self):
+        """
+        Tarea de fondo. El momento de cada muestra en la reproducción es
+        (t - t_inicio) / velocidad; en cada vuelta se entrega todo lo que ya pasó
+        y se duerme hasta la próxima muestra (entre INTERVALO_ENVIO_S y ESPERA_MAX_S).
+        """
+        self.inicio = time.monotonic()
+        self.epoch_inicio_ns = time.time_ns()
+        base_ns = 0  # con repetir, cada vuelta sigue donde terminó la anterior (tiempo de grabación)
+        try:
+            while self.activa:
+                ultimo_ns = None
+                t_inicio = None
+                for t_ns, valores in leer_grabacion(self.ruta):
+                    if t_inicio is None:
+                        t_inicio = t_ns[0] + self.desde_ns
+                    desde = np.searchsorted(t_ns, t_inicio)
+                    if desde == len(t_ns):
+                        continue
+                    t_rel = t_ns[desde:] - t_inicio
+                    t_sesion = base_ns + t_rel
+                    momentos_s = t_sesion / (NS * self.velocidad)
+                    if not self._entregar_bloque(momentos_s, t_sesion, valores[desde:], t_rel):
+                        return
+                    ultimo_ns = t_sesion[-1]
+                if ultimo_ns is None:
+                    raise ValueError("La grabación no tiene muestras válidas")
+                self.vueltas += 1
+                if not self.repetir:
+                    break
+                base_ns = int(ultimo_ns) + int(INTERVALO_ENVIO_S * NS)
+            if self.activa:
+                self.estado_actual = "terminada"
+        except Exception as e:
+            print(f"Error en la reproducción de {self.ruta} ({self.dispositivo}): {e}")
+            self.estado_actual = "error"
+            self.error = str(e)
+
+    def _entregar_bloque(self, momentos_s, t_sesion, valores, t_rel):
+        """
+        Entrega un bloque a su ritmo (momentos_s, ya divididos por la velocidad) con las
+        horas t_sesion (ns desde el inicio, espaciado original); False si la detuvieron
+        """
+        i = 0
+        while i < len(momentos_s):
+            if not self.activa:
+                return False
+            ahora = time.monotonic() - self.inicio
+            j = int(np.searchsorted(momentos_s, ahora, side="right"))
+            if j > i:
+                vivo.agregar_lote(self.dispositivo, self.epoch_inicio_ns + t_sesion[i:j], valores[i:j])
+                self.muestras += j - i
+                self.lotes += 1
+                self.segundos_grabacion = (self.desde_ns + t_rel[j - 1]) / NS
+                i = j
+                continue
+            vivo.socketio.sleep(min(max(momentos_s[i] - ahora, INTERVALO_ENVIO_S), ESPERA_MAX_S))
+        return True
+
+    def estado(self):
+        return {
+            "dispositivo": self.dispositivo,
+            "archivo": os.path.basename(self.ruta),
+            "estado": self.estado_actual,
+            "error": self.error,
+            "velocidad": self.velocidad,
+            "repetir": self.repetir,
+            "vueltas": self.vueltas,
+            "muestras": self.muestras,
+            "lotes": self.lotes,
+            "segundos_grabacion": round(self.segundos_grabacion, 2),
+            "segundos": round(time.monotonic() - self.inicio, 1) if self.inicio is not None else 0.0
+        }
+
+
+def dispositivo_defecto(archivo):
+    """Dispositivo en el que se reproduce un archivo si no se indica otro"""
+    return f"reproduccion-{os.path.splitext(os.path.basename(archivo or ''))[0]}"
+
+
+class RegistroReproducciones:
+    """Reproducciones de este worker, una por dispositivo (la última, aunque haya terminado)"""
+
+    def __init__(self):
+        self._reproducciones = {}
+        self._lock = threading.Lock()
+
+    def iniciar(self, archivo, dispositivo=None, velocidad=1.0, desde_s=0.0, repetir=False):
+        velocidad = float(velocidad)
+        desde_s = float(desde_s or 0)
+        if not VELOCIDAD_MIN <= velocidad <= VELOCIDAD_MAX:
+            raise ValueError(f"La velocidad tiene que estar entre {VELOCIDAD_MIN:g} y {VELOCIDAD_MAX:g}")
+        if desde_s < 0:
+            raise ValueError("'desde' no puede ser negativo")
+        ruta = resolver_archivo(archivo)
+        dispositivo = dispositivo or dispositivo_defecto(archivo)
+
+        with self._lock:
+            # La que ya corre en este dispositivo se reemplaza: no cuenta para el tope, y se
+            # detiene recién cuando la nueva se aceptó
+            activas = sum(r.activa for d, r in self._reproducciones.items() if d != dispositivo)
+            if activas >= MAX_REPRODUCCIONES:
+                raise RuntimeError(f"Ya hay {activas} reproducciones en curso (máximo {MAX_REPRODUCCIONES})")
+            anterior = self._reproducciones.get(dispositivo)
+            reproduccion = Reproduccion(ruta, dispositivo, velocidad, desde_s, bool(repetir))
+            self._reproducciones[dispositivo] = reproduccion
+            if anterior is not None:
+                anterior.detener()
+        vivo.sesiones_vivo.obtener(dispositivo).reproduccion = reproduccion
+        vivo.socketio.start_background_task(reproduccion.correr)
+        print(f"Reproducción iniciada: {archivo} -> {dispositivo} (x{velocidad:g})")
+        return reproduccion
+
+    def detener(self, dispositivo):
+        with self._lock:
+            reproduccion = self._reproducciones.get(dispositivo)
+        if reproduccion is None:
+            return None
+        reproduccion.detener()
+        return reproduccion
+
+
+reproducciones = RegistroReproducciones()
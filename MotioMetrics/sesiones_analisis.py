@@ -0,0 +1,254 @@
+# sesiones_analisis.py
+# Sesiones de re-análisis para ajustar umbrales por paciente.
+# El CSV se sube y se parsea una sola vez; la sesión guarda en memoria los
+# intermedios que no dependen de los parámetros (datos parseados, señales
+# filtradas) y cachea los que sí dependen (PSD por ventana según la duración
+# de la ventana, RMS según la banda). Un cambio de umbral sólo vuelve a
+# umbralizar espectros ya calculados.
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from piramide import PiramideMinMax
+from espectrograma import calcular_espectrograma, N_FRECUENCIAS_DEFECTO
+from analisis_core import (
+    pasa_altos_iir,
+    ventaneo,
+    filtrar_deriva,
+    psd_burg_lote,
+    umbralizar_psd_lote,
+    eliminar_ventanas_aisladas,
+    unificar_ejes,
+    rms_banda_temblor,
+    detectar_episodios,
+    espectro_episodios,
+    calcular_factor_diezmo,
+    serializar_episodios
+)
+
+TTL_SESION = float(os.environ.get("MOTIO_TTL_SESION_ANALISIS", 30 * 60))  # segundos sin uso
+MAX_SESIONES = int(os.environ.get("MOTIO_MAX_SESIONES_ANALISIS", 8))
+
+PARAMETROS_DEFECTO = {
+    "flow": 3.5,             # Hz, borde inferior de la banda de temblor
+    "fhigh": 7.5,            # Hz, borde superior
+    "umbral": 0.05,          # amplitud normalizada mínima del pico dominante
+    "duracion_ventana": 3    # segundos
+}
+
+
+def validar_parametros(datos):
+    """Completa con los valores por defecto y valida. Lanza ValueError con un mensaje para el usuario."""
+    datos = datos or {}
+    try:
+        parametros = {
+            "flow": float(datos.get("flow", PARAMETROS_DEFECTO["flow"])),
+            "fhigh": float(datos.get("fhigh", PARAMETROS_DEFECTO["fhigh"])),
+            "umbral": float(datos.get("umbral", PARAMETROS_DEFECTO["umbral"])),
+            "duracion_ventana": int(datos.get("duracion_ventana", PARAMETROS_DEFECTO["duracion_ventana"]))
+        }
+    except (TypeError, ValueError):
+        raise ValueError("Parámetros inválidos: deben ser numéricos")
+
+    if not 0 < parametros["flow"] < parametros["fhigh"]:
+        raise ValueError("La banda debe cumplir 0 < flow < fhigh")
+    if not 0 < parametros["umbral"] < 1:
+        raise ValueError("El umbral debe estar entre 0 y 1")
+    if not 1 <= parametros["duracion_ventana"] <= 30:
+        raise ValueError("La ventana debe durar entre 1 y 30 segundos")
+    return parametros
+
+
+class SesionAnalisis:
+    """Datos de un CSV ya cargado + caché de intermedios para re-analizar"""
+
+    def __init__(self, df, SR, nombre=None):
+        self.id = uuid.uuid4().hex
+        self.nombre = nombre
+        self.df = df
+        self.SR = SR
+        self.ultimo_acceso = time.monotonic()
+        self._lock = threading.RLock()
+
+        # Intermedios que no dependen de los parámetros (se calculan al primer uso)
+        self._df_filtrado = None  # pasa altos 0.25 Hz (detección)
+        self._df_hp = None        # pasa altos 0.5 Hz (espectro de episodios)
+        self._tiempos_s = None
+
+        # Intermedios cacheados por parámetro
+        self._psd_ventanas = {}  # duracion_ventana -> (psd_yaw, psd_pitch, psd_roll)
+        self._rms = {}           # (flow, fhigh) -> rms_ypr
+        self._piramides = {}     # (flow, fhigh) -> PiramideMinMax
+        self._espectrogramas = {}  # (duracion_ventana, n_frecuencias) -> dict listo para JSON
+
+    @property
+    def df_filtrado(self):
+        if self._df_filtrado is None:
+            self._df_filtrado = filtrar_deriva(self.df, self.SR)
+        return self._df_filtrado
+
+    @property
+    def df_hp(self):
+        if self._df_hp is None:
+            df_hp = self.df.copy()
+            for col in ['Yaw', 'Pitch', 'Roll']:
+                df_hp[col] = pasa_altos_iir(self.df[col], self.SR, fc=0.5)
+            self._df_hp = df_hp
+        return self._df_hp
+
+    @property
+    def tiempos_s(self):
+        """Segundos desde la primera muestra (eje de tiempo de la pirámide de zoom)"""
+        if self._tiempos_s is None:
+            ts = self.df['Timestamp']
+            self._tiempos_s = (ts - ts.iloc[0]).dt.total_seconds().to_numpy()
+        return self._tiempos_s
+
+    def cachear(self, df_filtrado=None, rms=None, banda=(3.5, 7.5)):
+        """Guarda intermedios que ya calculó otro camino (p. ej. el análisis en streaming)"""
+        with self._lock:
+            if df_filtrado is not None:
+                self._df_filtrado = df_filtrado
+            if rms is not None:
+                self._rms[banda] = rms
+
+    def psd_ventanas(self, duracion_ventana):
+        """PSD de Burg de cada ventana y eje (se calcula una vez por duración de ventana)"""
+        if duracion_ventana not in self._psd_ventanas:
+            window_size = int(duracion_ventana * self.SR)
+            psds = []
+            for col in ['Yaw', 'Pitch', 'Roll']:
+                ventanas = ventaneo(self.df_filtrado[col].to_numpy(), window_size, 0)
+                psds.append(psd_burg_lote(ventanas) if len(ventanas) else np.empty((0, 0)))
+            self._psd_ventanas[duracion_ventana] = tuple(psds)
+        return self._psd_ventanas[duracion_ventana]
+
+    def rms(self, flow, fhigh):
+        if (flow, fhigh) not in self._rms:
+            self._rms[(flow, fhigh)] = rms_banda_temblor(self.df, self.SR, flow, fhigh)
+        return self._rms[(flow, fhigh)]
+
+    def piramide(self, flow=PARAMETROS_DEFECTO["flow"], fhigh=PARAMETROS_DEFECTO["fhigh"]):
+        """Pirámide min/max de Yaw, Pitch, Roll y RMS (una por banda, se construye una sola vez)"""
+        with self._lock:
+            if (flow, fhigh) not in self._piramides:
+                self._piramides[(flow, fhigh)] = PiramideMinMax(self.tiempos_s, {
+                    "yaw": self.df['Yaw'].to_numpy(),
+                    "pitch": self.df['Pitch'].to_numpy(),
+                    "roll": self.df['Roll'].to_numpy(),
+                    "rms": self.rms(flow, fhigh)
+                })
+            return self._piramides[(flow, fhigh)]
+
+    def espectrograma(self, duracion_ventana=PARAMETROS_DEFECTO["duracion_ventana"],
+                      n_frecuencias=N_FRECUENCIAS_DEFECTO):
+        """Espectrograma + traza de frecuencia dominante (reusa las PSD por ventana de la detección)"""
+        clave = (duracion_ventana, n_frecuencias)
+        with self._lock:
+            self.ultimo_acceso = time.monotonic()
+            if clave not in self._espectrogramas:
+                self._espectrogramas[clave] = calcular_espectrograma(
+                    self.df_filtrado, self.SR, duracion_ventana, n_frecuencias,
+                    psd_ventanas=self.psd_ventanas(duracion_ventana)
+                )
+            return self._espectrogramas[clave]
+
+    def analizar(self, parametros=None):
+        """Mismo resultado que procesar_csv_logic, con los parámetros indicados"""
+        p = validar_parametros(parametros)
+        with self._lock:
+            self.ultimo_acceso = time.monotonic()
+            psd_yaw, psd_pitch, psd_roll = self.psd_ventanas(p["duracion_ventana"])
+            rms_ypr = self.rms(p["flow"], p["fhigh"])
+
+        umbrales = dict(flow=p["flow"], fhigh=p["fhigh"], umbral=p["umbral"])
+        temblores = unificar_ejes(
+            eliminar_ventanas_aisladas(umbralizar_psd_lote(psd_yaw, self.SR, **umbrales)),
+            eliminar_ventanas_aisladas(umbralizar_psd_lote(psd_pitch, self.SR, **umbrales)),
+            eliminar_ventanas_aisladas(umbralizar_psd_lote(psd_roll, self.SR, **umbrales))
+        )
+        tiene_temblor = bool(np.any(temblores))
+        episodios = detectar_episodios(self.df, self.SR, temblores, rms_ypr, p["duracion_ventana"])
+        frecuencias, f_dom_mean, freqs_std, psd_mean = espectro_episodios(self.df_hp, episodios, self.SR, rapido=True)
+
+        psd_pico = np.max(psd_mean) if len(psd_mean) > 0 else 0
+        factor_diezmo = calcular_factor_diezmo(len(self.df))
+
+        return {
+            "metricas": {
+                "frecuencia_dominante": round(float(f_dom_mean), 2),
+                "psd_pico": round(float(psd_pico), 2),
+                "sr": self.SR,
+                "tiene_temblor": tiene_temblor,
+                "modo_rapido": True  # PSD de Burg por lote, como el camino rápido
+            },
+            "graficos": {
+                "tiempo": self.df['Timestamp'].astype(str).iloc[::factor_diezmo].tolist(),
+                "rms": rms_ypr[::factor_diezmo].tolist() if len(rms_ypr) > 0 else [],
+                "freq_x": freqs_std.tolist(),
+                "freq_y": psd_mean.tolist(),
+                "episodios": serializar_episodios(episodios)
+            },
+            "parametros": p
+        }
+
+
+class RegistroSesionesAnalisis:
+    """Sesiones en memoria con vencimiento por inactividad (TTL) y tope de cantidad (LRU)"""
+
+    def __init__(self, ttl=TTL_SESION, max_sesiones=MAX_SESIONES):
+        self.ttl = ttl
+        self.max_sesiones = max(1, max_sesiones)
+        self._sesiones = OrderedDict()
+        self._lock = threading.Lock()
+        # al_usar(sesion_id): se llama al crear o usar una sesión (app.py la anota en el
+        # backend en vivo, para que otros workers sepan en cuál está)
+        self.al_usar = None
+
+    def _purgar(self):
+        ahora = time.monotonic()
+        vencidas = [sid for sid, s in self._sesiones.items() if ahora - s.ultimo_acceso > self.ttl]
+        for sid in vencidas:
+            del self._sesiones[sid]
+        while len(self._sesiones) >= self.max_sesiones:
+            self._sesiones.popitem(last=False)  # la usada hace más tiempo
+
+    def crear(self, df, SR, nombre=None):
+        sesion = SesionAnalisis(df, SR, nombre)
+        with self._lock:
+            self._purgar()
+            self._sesiones[sesion.id] = sesion
+        self._usada(sesion.id)
+        return sesion
+
+    def obtener(self, sesion_id):
+        with self._lock:
+            sesion = self._sesiones.get(sesion_id)
+            if sesion is None:
+                return None
+            if time.monotonic() - sesion.ultimo_acceso > self.ttl:
+                del self._sesiones[sesion_id]
+                return None
+            sesion.ultimo_acceso = time.monotonic()
+            self._sesiones.move_to_end(sesion_id)
+        self._usada(sesion_id)
+        return sesion
+
+    def _usada(self, sesion_id):
+        if self.al_usar is not None:
+            try:
+                self.al_usar(sesion_id)
+            except Exception as e:
+                print(f"Error anotando la sesión de análisis {sesion_id}: {e}")
+
+    def eliminar(self, sesion_id):
+        with self._lock:
+            return self._sesiones.pop(sesion_id, None) is not None
+
+
+sesiones_analisis = RegistroSesionesAnalisis()
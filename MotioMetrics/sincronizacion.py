@@ -0,0 +1,140 @@
+# sincronizacion.py
+# Tiempo y orden de las muestras que llegan con reloj y secuencia del sensor
+# (lotes JSON y frames binarios).
+#
+# - RelojSensor: estima el offset reloj del sensor -> reloj del servidor con el
+#   mínimo móvil de (llegada - t_sensor): el mensaje que menos se demoró en la
+#   red es la mejor cota del offset, y la ventana móvil sigue la deriva del cristal.
+# - BufferReorden: entrega las muestras en orden de secuencia, descarta
+#   duplicadas (reenvíos tras reconexión) y, si falta alguna, espera un poco
+#   antes de darla por perdida.
+
+import os
+from collections import deque
+
+import numpy as np
+
+VENTANA_RELOJ_S = float(os.environ.get("MOTIO_VENTANA_RELOJ_S", 30))
+REORDEN_MAX_PENDIENTES = int(os.environ.get("MOTIO_REORDEN_MAX_PENDIENTES", 250))  # ~10 s a 25 Hz
+REORDEN_ESPERA_MAX_S = float(os.environ.get("MOTIO_REORDEN_ESPERA_S", 0.5))
+
+NS = 1_000_000_000
+
+
+class RelojSensor:
+    def __init__(self, ventana_s=VENTANA_RELOJ_S):
+        self.ventana_ns = int(ventana_s * NS)
+        self.reiniciar()
+
+    def reiniciar(self):
+        self._candidatos = deque()  # (llegada_ns, llegada - t_sensor), con el mínimo al frente
+        self._ultimo_t_sensor = None
+        self.offset_ns = None
+        self.reinicios = 0
+
+    def observar(self, t_sensor_ns, llegada_ns):
+        """Registra un mensaje (t_sensor de su última muestra, hora de llegada) y actualiza el offset"""
+        if self._ultimo_t_sensor is not None and t_sensor_ns < self._ultimo_t_sensor - NS:
+            # El reloj del sensor volvió atrás: se reinició el sensor
+            reinicios = self.reinicios + 1
+            self.reiniciar()
+            self.reinicios = reinicios
+        self._ultimo_t_sensor = max(t_sensor_ns, self._ultimo_t_sensor or t_sensor_ns)
+
+        d = llegada_ns - t_sensor_ns
+        while self._candidatos and self._candidatos[-1][1] >= d:
+            self._candidatos.pop()
+        self._candidatos.append((llegada_ns, d))
+        while self._candidatos[0][0] < llegada_ns - self.ventana_ns:
+            self._candidatos.popleft()
+        self.offset_ns = self._candidatos[0][1]
+        return self.offset_ns
+
+    def a_servidor(self, t_sensor_ns):
+        """Reloj del sensor (ns, escalar o array) -> epoch del servidor en ns"""
+        return t_sensor_ns + self.offset_ns
+
+
+class BufferReorden:
+    def __init__(self, max_pendientes=REORDEN_MAX_PENDIENTES, espera_max_s=REORDEN_ESPERA_MAX_S):
+        self.max_pendientes = max_pendientes
+        self.espera_max_s = espera_max_s
+        self.siguiente = None      # próxima secuencia a entregar
+        self._pendientes = {}      # secuencia -> (t_sensor_ns, fila) llegadas adelantadas
+        self._inicio_hueco = None  # desde cuándo se espera la secuencia `siguiente`
+        self.duplicadas = 0
+        self.perdidas = 0
+        self.reinicios = 0
+
+    def agregar(self, secuencia, t_sensor_ns, valores, ahora_s):
+        """
+        secuencia: la de la primera muestra; t_sensor_ns (n,), valores (n, k).
+        Devuelve (t_sensor_ns, valores) de las muestras que ya se pueden entregar, en orden.
+        """
+        n = len(t_sensor_ns)
+        if self.siguiente is None:
+            self.siguiente = secuencia
+        elif secuencia + n <= self.siguiente - 4 * self.max_pendientes:
+            # Secuencia muy por detrás: el sensor se reinició y volvió a contar desde 0
+            self.reiniciar(secuencia)
+
+        # Camino rápido: llega justo lo que se esperaba y no hay nada pendiente
+        if secuencia == self.siguiente and not self._pendientes:
+            self.siguiente += n
+            return t_sensor_ns, valores
+
+        for k in range(n):
+            s = secuencia + k
+            if s < self.siguiente or s in self._pendientes:
+                self.duplicadas += 1
+            else:
+                self._pendientes[s] = (t_sensor_ns[k], valores[k])
+        return self.entregar(ahora_s)
+
+    def reiniciar(self, secuencia=None):
+        """El sensor volvió a contar desde otra secuencia: lo pendiente del arranque anterior se da por perdido"""
+        if self._pendientes and self.siguiente is not None:
+            self.perdidas += len(self._pendientes)
+        self._pendientes.clear()
+        self._inicio_hueco = None
+        self.siguiente = secuencia
+        self.reinicios += 1
+
+    def entregar(self, ahora_s):
+        """Lo que ya está en orden (o cuya espera venció); se llama también periódicamente"""
+        t_listas, v_listas = [], []
+        while self._pendientes:
+            if self.siguiente in self._pendientes:
+                t, fila = self._pendientes.pop(self.siguiente)
+                t_listas.append(t)
+                v_listas.append(fila)
+                self.siguiente += 1
+                self._inicio_hueco = None
+                continue
+
+            # Falta `siguiente`: esperar, salvo que ya se esperó demasiado o hay demasiado acumulado
+            if self._inicio_hueco is None:
+                self._inicio_hueco = ahora_s
+            if (len(self._pendientes) <= self.max_pendientes
+                    and ahora_s - self._inicio_hueco < self.espera_max_s):
+                break
+            proxima = min(self._pendientes)
+            self.perdidas += proxima - self.siguiente
+            self.siguiente = proxima
+
+        if not t_listas:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0))
+        return np.asarray(t_listas, dtype=np.int64), np.asarray(v_listas, dtype=float)
+
+    @property
+    def hay_pendientes(self):
+        return bool(self._pendientes)
+
+    def estado(self):
+        return {
+            "siguiente": self.siguiente,
+            "pendientes": len(self._pendientes),
+            "duplicadas": self.duplicadas,
+            "perdidas": self.perdidas,
+            "reinicios": self.reinicios
+        }
@@ -9,6 +9,10 @@ import datetime as datetime
 import datetime
 from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay, accuracy_score, precision_score, recall_score, f1_score
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analisis_core import convertir_timestamps, fijar_fecha
 
 def cargar_datos(path):
     # Leer archivo
@@ -17,7 +21,8 @@ def cargar_datos(path):
     df.columns = df.columns.str.strip()  # limpiar nombres
 
     # Convertir la columna 'Timestamp' a formato datetime
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    # (epoch en ns del análisis en vivo, 'HH:MM:SS.mmm' de grabaciones viejas, o con fecha)
+    df['Timestamp'] = convertir_timestamps(df['Timestamp'])
     # Normalizar el tiempo para que comience en 0 segundos
     #df['Timestamp'] = (df['Timestamp'] - df['Timestamp'].iloc[0]).dt.total_seconds()
 
@@ -361,9 +366,10 @@ def graficar_temblor_coloreado(
     
     base_date = datetime.datetime.today().date()  # Fecha base (puede ser cualquier día)
 
-    # df['Timestamp']
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'], format='%H:%M:%S.%f')
-    df['Timestamp'] = df['Timestamp'].apply(lambda x: x.replace(year=base_date.year,month=base_date.month,day=base_date.day))
+    # df['Timestamp'] (las grabaciones en vivo ya traen fecha; las viejas, sólo la hora)
+    if not np.issubdtype(df['Timestamp'].dtype, np.datetime64):
+        df['Timestamp'] = convertir_timestamps(df['Timestamp'])
+    df['Timestamp'] = fijar_fecha(df['Timestamp'], base_date)
 
 
     if not np.issubdtype(df['Timestamp'].dtype, np.datetime64):
@@ -453,14 +459,9 @@ def graficar_temblor_coloreado(
         ann = anotaciones.copy()
 
         ann = anotaciones.copy()
-        ann['inicio'] = pd.to_datetime(ann['inicio'], format='%H:%M:%S.%f')
-        ann['inicio'] = ann['inicio'].apply(lambda x: x.replace(year=base_date.year,
-                                                                month=base_date.month,
-                                                                day=base_date.day))
-        ann['fin'] = pd.to_datetime(ann['fin'], format='%H:%M:%S.%f')
-        ann['fin'] = ann['fin'].apply(lambda x: x.replace(year=base_date.year,
-                                                        month=base_date.month,
-                                                        day=base_date.day))
+        fecha_ref = df['Timestamp'].iloc[0]
+        ann['inicio'] = fijar_fecha(convertir_timestamps(ann['inicio']), fecha_ref)
+        ann['fin'] = fijar_fecha(convertir_timestamps(ann['fin']), fecha_ref)
 
         ann = ann.sort_values('inicio')
         for _, row in ann.iterrows():
@@ -847,12 +848,8 @@ def evaluar_deteccion_temblor(df, anotaciones, SR):
 
     # Corregir fechas
     fecha_ref = pd.to_datetime(df['Timestamp'].iloc[0]).date()
-    anotaciones['inicio'] = pd.to_datetime(anotaciones['inicio'], format='%H:%M:%S.%f', errors='coerce').apply(
-        lambda t: pd.Timestamp.combine(fecha_ref, t.time()) if pd.notnull(t) else t
-    )
-    anotaciones['fin'] = pd.to_datetime(anotaciones['fin'], format='%H:%M:%S.%f', errors='coerce').apply(
-        lambda t: pd.Timestamp.combine(fecha_ref, t.time()) if pd.notnull(t) else t
-    )
+    anotaciones['inicio'] = fijar_fecha(convertir_timestamps(anotaciones['inicio']), fecha_ref)
+    anotaciones['fin'] = fijar_fecha(convertir_timestamps(anotaciones['fin']), fecha_ref)
 
     # Etiquetas verdaderas
     y_true = []
@@ -862,8 +859,8 @@ def evaluar_deteccion_temblor(df, anotaciones, SR):
 
         temblor_en_ventana = False
         for _, row in anotaciones.iterrows():
-            inicio_anno = pd.to_datetime(row['inicio'], format='%H:%M:%S.%f')
-            fin_anno = pd.to_datetime(row['fin'], format='%H:%M:%S.%f')
+            inicio_anno = row['inicio']
+            fin_anno = row['fin']
             actividad = str(row.get('actividad', '')).strip()
             grado = row.get('grado', 0)
 
@@ -0,0 +1,163 @@
+# Comparación A/B del backend servido con eventlet (app.py) y con asyncio (app_asgi.py).
+# Para cada servidor: lo levanta en un puerto propio, conecta --sensores sensores
+# simulados (un dispositivo cada uno, JSON como el firmware a --hz) y --dashboards
+# dashboards (con ack), y opcionalmente manda análisis de un CSV en paralelo para
+# cargar la CPU. Al final compara:
+#   - muestras enviadas / recibidas por el servidor (/api/sesiones_vivo)
+#   - muestras que llegaron a los dashboards
+#   - intervalo entre frames en los dashboards (p50/p95/máx): cuánto se traba la difusión
+#   - duración de los análisis
+#
+# Uso (desde MotioMetrics/):
+#   python tools/benchmark_servidores.py --sensores 20 --dashboards 40 --duracion 20 --csv datos.csv
+# Necesita el cliente de python-socketio (con websocket-client), requests y uvicorn.
+
+import os
+import sys
+import json
+import math
+import time
+import socket
+import argparse
+import threading
+import subprocess
+
+import numpy as np
+import requests
+import socketio
+
+DIRECTORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SERVIDORES = {
+    "eventlet": lambda puerto: [sys.executable, "app.py"],
+    "asgi": lambda puerto: [sys.executable, "-m", "uvicorn", "app_asgi:aplicacion",
+                            "--port", str(puerto), "--log-level", "warning"],
+}
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def levantar(nombre, puerto):
+    proceso = subprocess.Popen(SERVIDORES[nombre](puerto), cwd=DIRECTORIO, env={**os.environ, "PORT": str(puerto)},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{puerto}"
+    for _ in range(100):
+        try:
+            requests.get(url + "/", timeout=1)
+            return proceso, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proceso.kill()
+    raise RuntimeError(f"El servidor {nombre} no arrancó")
+
+
+def sensor(url, dispositivo, hz, duracion, enviadas):
+    sio = socketio.Client()
+    sio.connect(f"{url}?dispositivo={dispositivo}", transports=["websocket"])
+    inicio = time.monotonic()
+    i = 0
+    while time.monotonic() - inicio < duracion:
+        y = 30 + 2 * math.sin(2 * math.pi * 5 * i / hz)
+        sio.emit("message", json.dumps({"y": round(y, 2), "p": 0.0, "r": 0.0, "ax": 0.0, "ay": 0.0, "az": 1.0}))
+        i += 1
+        espera = inicio + i / hz - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+    enviadas[dispositivo] = i
+    time.sleep(1)  # que termine de llegar lo último
+    sio.disconnect()
+
+
+class Dashboard:
+    def __init__(self, url, dispositivo):
+        self.muestras = 0
+        self.llegadas = []
+        self.sio = socketio.Client()
+        self.sio.on("datos_vivo", self._frame)
+        self.sio.connect(url, transports=["websocket"])
+        self.dispositivo = dispositivo
+        self.sio.emit("suscribir", {"dispositivo": dispositivo, "ack": True})
+
+    def _frame(self, frame):
+        self.llegadas.append(time.monotonic())
+        if frame.get("tipo") == "delta":
+            self.muestras += len(frame["yaw"])
+        self.sio.emit("ack_vivo", {"dispositivo": self.dispositivo, "n": frame["n"]})
+
+
+def analisis(url, ruta_csv, duracion, tiempos):
+    fin = time.monotonic() + duracion
+    while time.monotonic() < fin:
+        with open(ruta_csv, "rb") as f:
+            inicio = time.monotonic()
+            r = requests.post(url + "/api/analizar_datos", files={"file": f}, timeout=300)
+        if r.status_code == 200:
+            tiempos.append(time.monotonic() - inicio)
+
+
+def correr(nombre, args):
+    puerto = puerto_libre()
+    proceso, url = levantar(nombre, puerto)
+    try:
+        dispositivos = [f"bench{i}" for i in range(args.sensores)]
+        dashboards = [Dashboard(url, dispositivos[i % len(dispositivos)]) for i in range(args.dashboards)]
+        enviadas, tiempos_analisis = {}, []
+        hilos = [threading.Thread(target=sensor, args=(url, d, args.hz, args.duracion, enviadas))
+                 for d in dispositivos]
+        hilos += [threading.Thread(target=analisis, args=(url, args.csv, args.duracion, tiempos_analisis))
+                  for _ in range(args.analisis if args.csv else 0)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+        sesiones = requests.get(url + "/api/sesiones_vivo", timeout=10).json()["sesiones"]
+        recibidas = sum(s["muestras"] for s in sesiones if s["dispositivo"] in enviadas)
+        intervalos = np.concatenate([np.diff(d.llegadas) for d in dashboards if len(d.llegadas) > 1] or [[np.nan]])
+        for d in dashboards:
+            d.sio.disconnect()
+        return {
+            "enviadas": sum(enviadas.values()),
+            "recibidas": recibidas,
+            "a_dashboards": sum(d.muestras for d in dashboards),
+            "intervalo_p50_ms": round(float(np.nanpercentile(intervalos, 50)) * 1000, 1),
+            "intervalo_p95_ms": round(float(np.nanpercentile(intervalos, 95)) * 1000, 1),
+            "intervalo_max_ms": round(float(np.nanmax(intervalos)) * 1000, 1),
+            "analisis": len(tiempos_analisis),
+            "analisis_medio_s": round(float(np.mean(tiempos_analisis)), 2) if tiempos_analisis else None
+        }
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark A/B eventlet vs. asyncio (ASGI)")
+    parser.add_argument("--servidores", nargs="+", choices=list(SERVIDORES), default=list(SERVIDORES))
+    parser.add_argument("--sensores", type=int, default=10)
+    parser.add_argument("--dashboards", type=int, default=10)
+    parser.add_argument("--hz", type=float, default=25.0)
+    parser.add_argument("--duracion", type=float, default=15.0, help="segundos de carga")
+    parser.add_argument("--csv", default=None, help="CSV para análisis en paralelo (carga de CPU)")
+    parser.add_argument("--analisis", type=int, default=2, help="análisis concurrentes (con --csv)")
+    args = parser.parse_args()
+
+    resultados = {}
+    for nombre in args.servidores:
+        print(f"== {nombre}: {args.sensores} sensores a {args.hz} Hz, {args.dashboards} dashboards, {args.duracion} s")
+        resultados[nombre] = correr(nombre, args)
+        print(json.dumps(resultados[nombre], indent=2))
+
+    if len(resultados) > 1:
+        claves = list(next(iter(resultados.values())))
+        print(f"\n{'':22}" + "".join(f"{n:>12}" for n in resultados))
+        for clave in claves:
+            print(f"{clave:22}" + "".join(f"{str(r[clave]):>12}" for r in resultados.values()))
+
+
+if __name__ == "__main__":
+    main()
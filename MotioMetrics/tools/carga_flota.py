@@ -0,0 +1,398 @@
+# Prueba de carga del modo en vivo: cuántos MotioSensors y dashboards aguanta una instancia.
+# Levanta app.py (o usa uno que ya esté corriendo, con --url) y sube la carga por escalones:
+#   - sensores simulados que hablan exactamente como el firmware (motiosensor_websockets.ino):
+#     WebSocket crudo a /socket.io/?EIO=4&transport=websocket, "40" al abrir, "3" a cada ping
+#     y una muestra por mensaje 42["message","{\"y\":..}"] a --hz. Cada uno es un dispositivo
+#     (?dispositivo=flotaN). La señal es temblor sintético (sensor_simulado.muestra, con
+#     frecuencia distinta por sensor) o las filas de un CSV real (--csv), cada sensor desde otro punto.
+#   - dashboards (python-socketio) suscriptos a 'datos_vivo' con ack, repartidos entre los sensores.
+# Los sensores no tienen un hilo cada uno: --hilos hilos emisores se los reparten (desfasados
+# dentro del período) y un solo hilo atiende lo que manda el servidor (pings).
+#
+# Por escalón reporta:
+#   - muestras enviadas / programadas (si el generador no da abasto) y recibidas por el servidor (/s)
+#   - perdidas (enviadas - recibidas) y frames descartados por el control de flujo. Por escalón es
+#     aproximado (lo que está en viaje en los bordes); el balance exacto es el total del final.
+#   - CPU (%) y memoria (RSS) del proceso del servidor (con psutil, o /proc en Linux)
+#   - latencia de entrega en los dashboards: llegada del frame - t_ms de cada muestra (p50/p95/p99;
+#     mismo host, mismo reloj) y las del servidor por etapa (GET /api/latencia_vivo, peor dispositivo)
+#
+# Uso (desde MotioMetrics/):
+#   python tools/carga_flota.py --escalones 10 50 100 200 --dashboards 10 50 100 200 --duracion 20
+#   python tools/carga_flota.py --escalones 20 40 --csv datos.csv --json resultado.json
+# Necesita websocket-client, el cliente de python-socketio, requests y (opcional) psutil.
+
+import os
+import json
+import time
+import random
+import argparse
+import selectors
+import threading
+
+import numpy as np
+import requests
+import socketio
+import websocket
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from benchmark_servidores import SERVIDORES, levantar, puerto_libre
+from sensor_simulado import muestra
+
+PREFIJO_DISPOSITIVO = "flota"
+
+
+# --- FUENTES DE SEÑAL ---
+
+class TemblorSintetico:
+    def __init__(self, hz):
+        self.hz = hz
+
+    def generador(self, i):
+        """Muestras del sensor i: temblor de 4 a 7 Hz, distinto para cada uno"""
+        temblor_hz = 4 + 3 * random.random()
+        k = 0
+        while True:
+            yield muestra(k / self.hz, temblor_hz)
+            k += 1
+
+
+class FilasCSV:
+    def __init__(self, ruta):
+        import pandas as pd
+        df = pd.read_csv(ruta, sep=",", encoding="latin1", on_bad_lines="skip")
+        df.columns = df.columns.str.strip()
+        columnas = ['Yaw', 'Pitch', 'Roll', 'Ax', 'Ay', 'Az']
+        self.filas = df[columnas].apply(pd.to_numeric, errors="coerce").dropna().to_numpy()
+        if len(self.filas) == 0:
+            raise ValueError(f"{ruta} no tiene muestras válidas")
+
+    def generador(self, i):
+        """Las filas del CSV en bucle, cada sensor desde un punto distinto"""
+        k = random.randrange(len(self.filas))
+        while True:
+            yield self.filas[k]
+            k = (k + 1) % len(self.filas)
+
+
+# --- SENSORES (protocolo del firmware) ---
+
+class SensorWS:
+    def __init__(self, url_ws, dispositivo, fuente):
+        self.dispositivo = dispositivo
+        self.fuente = fuente
+        self.enviadas = 0
+        self.errores = 0
+        self.activo = True
+        self._lock = threading.Lock()  # el emisor y el lector (pongs) escriben en el mismo socket
+        self.ws = websocket.create_connection(f"{url_ws}/socket.io/?EIO=4&transport=websocket&dispositivo={dispositivo}",
+                                              timeout=10)
+        if not self.ws.recv().startswith("0"):
+            raise RuntimeError("Handshake Engine.IO inesperado")
+        self.ws.send("40")  # como el firmware al recibir "0"
+        self.ws.settimeout(None)
+
+    def enviar(self):
+        y, p, r, ax, ay, az = next(self.fuente)
+        mensaje = json.dumps({"y": round(y, 2), "p": round(p, 2), "r": round(r, 2),
+                              "ax": int(round(ax)), "ay": int(round(ay)), "az": int(round(az))})
+        try:
+            with self._lock:
+                self.ws.send("42" + json.dumps(["message", mensaje]))
+            self.enviadas += 1
+        except Exception:
+            self.errores += 1
+            self.activo = False
+
+    def atender(self):
+        """Lo que manda el servidor: '2' (ping) -> '3' (pong); '40{..}' (conexión ok) se ignora"""
+        try:
+            paquete = self.ws.recv()
+            if paquete == "2":
+                with self._lock:
+                    self.ws.send("3")
+        except Exception:
+            self.activo = False
+
+    def cerrar(self):
+        self.activo = False
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+class FlotaSensores:
+    """Sensores a --hz repartidos en `hilos` emisores (cada grupo desfasado) y un lector para todos"""
+
+    def __init__(self, url, hz, fuente, hilos):
+        self.url_ws = url.replace("http", "ws", 1)
+        self.hz = hz
+        self.fuente = fuente
+        self.grupos = [[] for _ in range(hilos)]
+        self._programadas = [0] * hilos  # lo que se debió mandar: si supera mucho a enviadas, el generador es el cuello
+        self.detener = threading.Event()
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._hilos = [threading.Thread(target=self._emitir, args=(k,), daemon=True) for k in range(hilos)]
+        self._hilos.append(threading.Thread(target=self._leer, daemon=True))
+        for hilo in self._hilos:
+            hilo.start()
+
+    @property
+    def sensores(self):
+        return [s for grupo in self.grupos for s in grupo]
+
+    def agregar(self, n):
+        for _ in range(n):
+            i = len(self.sensores)
+            sensor = SensorWS(self.url_ws, f"{PREFIJO_DISPOSITIVO}{i}", self.fuente.generador(i))
+            with self._lock:
+                self.grupos[i % len(self.grupos)].append(sensor)
+                self._selector.register(sensor.ws.sock, selectors.EVENT_READ, sensor)
+
+    def _emitir(self, k):
+        periodo = 1.0 / self.hz
+        inicio = time.monotonic() + k * periodo / len(self.grupos)
+        tick = 0
+        while not self.detener.is_set():
+            espera = inicio + tick * periodo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            with self._lock:
+                grupo = list(self.grupos[k])
+            for sensor in grupo:
+                if sensor.activo:
+                    sensor.enviar()
+            self._programadas[k] += len(grupo)
+            tick += 1
+            # Si el hilo se atrasó más de un período, no intenta recuperar en ráfaga
+            atraso = time.monotonic() - (inicio + tick * periodo)
+            if atraso > periodo:
+                saltear = int(atraso / periodo)
+                tick += saltear
+                self._programadas[k] += saltear * len(grupo)
+
+    def _leer(self):
+        while not self.detener.is_set():
+            with self._lock:
+                vacio = not self._selector.get_map()
+            if vacio:
+                time.sleep(0.1)
+                continue
+            for clave, _ in self._selector.select(timeout=0.5):
+                clave.data.atender()
+
+    def contadores(self):
+        sensores = self.sensores
+        return {
+            "enviadas": sum(s.enviadas for s in sensores),
+            "programadas": sum(self._programadas),
+            "errores": sum(s.errores for s in sensores),
+            "desconectados": sum(not s.activo for s in sensores)
+        }
+
+    def cerrar(self):
+        self.detener.set()
+        for sensor in self.sensores:
+            sensor.cerrar()
+
+
+# --- DASHBOARDS ---
+
+class DashboardCarga:
+    def __init__(self, url, dispositivo):
+        self.dispositivo = dispositivo
+        self.muestras = 0
+        self.frames = 0
+        self.latencias_ms = []
+        self._lock = threading.Lock()
+        self.sio = socketio.Client()
+        self.sio.on("datos_vivo", self._frame)
+        self.sio.connect(url, transports=["websocket"])
+        self.sio.emit("suscribir", {"dispositivo": dispositivo, "ack": True})
+
+    def _frame(self, frame):
+        ahora_ms = time.time() * 1000
+        if frame.get("tipo") == "delta" and frame.get("t_ms"):
+            with self._lock:
+                self.frames += 1
+                self.muestras += len(frame["t_ms"])
+                self.latencias_ms.extend(ahora_ms - t for t in frame["t_ms"])
+        self.sio.emit("ack_vivo", {"dispositivo": self.dispositivo, "n": frame["n"]})
+
+    def tomar_latencias(self):
+        with self._lock:
+            latencias, self.latencias_ms = self.latencias_ms, []
+        return latencias
+
+    def cerrar(self):
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+# --- MEDICIONES DEL SERVIDOR ---
+
+def uso_proceso(pid):
+    """(segundos de CPU, RSS en MB) del proceso; (None, None) si no se puede medir"""
+    if pid is None:
+        return None, None
+    try:
+        if psutil is not None:
+            proceso = psutil.Process(pid)
+            cpu = proceso.cpu_times()
+            return cpu.user + cpu.system, proceso.memory_info().rss / 2**20
+        with open(f"/proc/{pid}/stat") as f:
+            campos = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        paginas = int(campos[21])
+        return (int(campos[11]) + int(campos[12])) / ticks, paginas * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, IndexError, ValueError):
+        return None, None
+    except Exception as e:  # psutil.NoSuchProcess, etc.
+        print(f"Error midiendo el proceso {pid}: {e}")
+        return None, None
+
+
+def estado_servidor(url):
+    """Muestras recibidas y frames descartados (suma de los dispositivos de la flota) y latencias por etapa"""
+    sesiones = requests.get(url + "/api/sesiones_vivo", timeout=30).json()["sesiones"]
+    flota = [s for s in sesiones if s["dispositivo"].startswith(PREFIJO_DISPOSITIVO)]
+    peor = {}
+    for s in flota:
+        for etapa, resumen in ((s.get("latencia") or {}).get("etapas") or {}).items():
+            if resumen:
+                peor[etapa] = max(peor.get(etapa, 0), resumen["p95_ms"])
+    return {
+        "recibidas": sum(s["muestras"] for s in flota),
+        "descartados": sum(s["flujo"]["descartados"] for s in flota),
+        "p95_ms_por_etapa": peor
+    }
+
+
+def percentiles(valores):
+    if not valores:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1)}
+
+
+# --- ESCALONES ---
+
+def medir_escalon(url, pid, flota, dashboards, duracion):
+    for d in dashboards:
+        d.tomar_latencias()
+    antes_flota, antes_srv = flota.contadores(), estado_servidor(url)
+    antes_dash = sum(d.muestras for d in dashboards)
+    cpu_antes, _ = uso_proceso(pid)
+    inicio = time.monotonic()
+
+    time.sleep(duracion)
+
+    segundos = time.monotonic() - inicio
+    cpu_despues, rss_mb = uso_proceso(pid)
+    despues_flota, despues_srv = flota.contadores(), estado_servidor(url)
+    latencias = [lat for d in dashboards for lat in d.tomar_latencias()]
+    enviadas = despues_flota["enviadas"] - antes_flota["enviadas"]
+    recibidas = despues_srv["recibidas"] - antes_srv["recibidas"]
+    return {
+        "sensores": len(flota.sensores),
+        "dashboards": len(dashboards),
+        "enviadas_s": round(enviadas / segundos, 1),
+        "programadas_s": round((despues_flota["programadas"] - antes_flota["programadas"]) / segundos, 1),
+        "recibidas_s": round(recibidas / segundos, 1),
+        "perdidas": enviadas - recibidas,
+        "errores_envio": despues_flota["errores"],
+        "sensores_caidos": despues_flota["desconectados"],
+        "frames_descartados": despues_srv["descartados"] - antes_srv["descartados"],
+        "a_dashboards_s": round((sum(d.muestras for d in dashboards) - antes_dash) / segundos, 1),
+        "cpu_pct": None if cpu_antes is None or cpu_despues is None else round(100 * (cpu_despues - cpu_antes) / segundos, 1),
+        "rss_mb": None if rss_mb is None else round(rss_mb, 1),
+        "latencia_dashboard_ms": percentiles(latencias),
+        "servidor_p95_ms": despues_srv["p95_ms_por_etapa"]
+    }
+
+
+def imprimir_tabla(resultados):
+    columnas = ["sensores", "dashboards", "enviadas_s", "recibidas_s", "perdidas", "frames_descartados",
+                "a_dashboards_s", "cpu_pct", "rss_mb"]
+    print("\n" + "".join(f"{c:>19}" for c in columnas + ["lat_p50/p95/p99_ms"]))
+    for r in resultados:
+        lat = r["latencia_dashboard_ms"]
+        print("".join(f"{str(r[c]):>19}" for c in columnas) + f"{lat['p50']}/{lat['p95']}/{lat['p99']}".rjust(19))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga: flota de sensores simulados + dashboards")
+    parser.add_argument("--url", default=None, help="servidor ya levantado (sin esto se levanta uno local)")
+    parser.add_argument("--pid", type=int, default=None, help="PID del servidor de --url, para medir CPU y memoria")
+    parser.add_argument("--servidor", choices=list(SERVIDORES), default="eventlet", help="servidor local a levantar")
+    parser.add_argument("--escalones", type=int, nargs="+", default=[10, 25, 50, 100], help="sensores en cada escalón")
+    parser.add_argument("--dashboards", type=int, nargs="+", default=None,
+                        help="dashboards en cada escalón (por defecto, uno por sensor)")
+    parser.add_argument("--hz", type=float, default=25.0)
+    parser.add_argument("--duracion", type=float, default=15.0, help="segundos de medición por escalón")
+    parser.add_argument("--csv", default=None, help="CSV a reproducir (sin esto, temblor sintético)")
+    parser.add_argument("--hilos", type=int, default=4, help="hilos emisores de los sensores")
+    parser.add_argument("--json", default=None, help="guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    dashboards_por_escalon = args.dashboards or args.escalones
+    if len(dashboards_por_escalon) != len(args.escalones):
+        parser.error("--dashboards tiene que tener un valor por escalón")
+    fuente = FilasCSV(args.csv) if args.csv else TemblorSintetico(args.hz)
+
+    proceso = None
+    if args.url:
+        url, pid = args.url.rstrip("/"), args.pid
+    else:
+        # La ventana de latencia del servidor, del largo de un escalón
+        os.environ.setdefault("MOTIO_VENTANA_LATENCIA_S", str(args.duracion))
+        proceso, url = levantar(args.servidor, puerto_libre())
+        pid = proceso.pid
+    if psutil is None and not os.path.exists("/proc"):
+        print("Sin psutil ni /proc: no se mide CPU ni memoria del servidor")
+
+    recibidas_antes = estado_servidor(url)["recibidas"]  # con --url puede haber quedado algo de otra corrida
+    flota = FlotaSensores(url, args.hz, fuente, args.hilos)
+    dashboards = []
+    resultados = []
+    try:
+        for sensores, n_dashboards in zip(args.escalones, dashboards_por_escalon):
+            flota.agregar(max(0, sensores - len(flota.sensores)))
+            while len(dashboards) < n_dashboards:
+                dashboards.append(DashboardCarga(url, f"{PREFIJO_DISPOSITIVO}{len(dashboards) % sensores}"))
+            time.sleep(1)  # que arranquen los nuevos antes de medir
+            print(f"== {sensores} sensores a {args.hz:g} Hz, {n_dashboards} dashboards, {args.duracion:g} s")
+            resultado = medir_escalon(url, pid, flota, dashboards, args.duracion)
+            print(json.dumps(resultado))
+            resultados.append(resultado)
+
+        # Balance final: se cortan los sensores y se espera que llegue lo último
+        flota.detener.set()
+        time.sleep(1.5)
+        enviadas = flota.contadores()["enviadas"]
+        recibidas = estado_servidor(url)["recibidas"] - recibidas_antes
+        imprimir_tabla(resultados)
+        print(f"\nTotal: {enviadas} muestras enviadas, {recibidas} recibidas, {enviadas - recibidas} perdidas")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"parametros": vars(args), "escalones": resultados,
+                           "total": {"enviadas": enviadas, "recibidas": recibidas}}, f, indent=2)
+    finally:
+        flota.cerrar()
+        for d in dashboards:
+            d.cerrar()
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
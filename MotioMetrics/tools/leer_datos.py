@@ -4,6 +4,8 @@ import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from collections import deque # deque es como una lista “cinta transportadora”: cuando se llena, tira lo más viejo y agrega lo nuevo.
 import csv
+import time # Para medir cada cuánto se fuerza la escritura del CSV.
+import threading # El socket se lee en un hilo aparte, así no se pierde ningún paquete mientras se dibuja.
 from datetime import datetime # Para tener la hora actual y poner timestamps.
 from matplotlib.widgets import Button, TextBox
 import tkinter as tk
@@ -21,7 +23,8 @@ UDP_IP = "0.0.0.0" # Significa: “escuchá en todas las interfaces de red de mi
 UDP_PORT = 4210 # Puerto donde va a escuchar (tu ESP debería mandar a ese puerto).
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) # Crea un socket UDP (SOCK_DGRAM = UDP).
 sock.bind((UDP_IP, UDP_PORT)) # Se “engancha” (bind) a esa IP/puerto para recibir datos.
-sock.setblocking(False) # Muy importante: hace que recvfrom() no trabe el programa esperando datos. Si no hay datos, tira error BlockingIOError y seguimos.
+sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20) # Buffer de recepción grande (1 MB): si el gráfico tarda, los paquetes esperan ahí en vez de perderse.
+sock.settimeout(0.5) # recvfrom() espera datos hasta 0.5 s; así el hilo receptor puede revisar si tiene que terminar.
 
 # --- CSV DE DATOS ---
 csv_path = f"/Users/gross/Interfaz-Guante-PD/{filename}.csv" # Arma el path final del archivo usando el nombre que pusiste.
@@ -36,11 +39,20 @@ act_writer = csv.writer(act_csv)
 act_writer.writerow(["inicio", "fin", "actividad"]) # ENCABEZADO
 
 # --- VARIABLES DE ANIMACIÓN ---
-max_len = 50 # Cantidad de puntos que vas a mostrar en pantalla (últimos 50).
-# Tres “colas” que guardan los últimos 50 valores de yaw/pitch/roll. Arrancan llenas de ceros.
+max_len = 250 # Cantidad de puntos que vas a mostrar en pantalla (últimos 250: ahora llegan todos, no uno por cuadro).
+FPS_GRAFICO = 30 # Cuadros por segundo del gráfico: no hace falta redibujar más rápido de lo que el ojo ve.
+# Tres “colas” (buffer circular) que guardan los últimos valores de yaw/pitch/roll. Arrancan llenas de ceros.
 yaw_data = deque([0]*max_len, maxlen=max_len) 
 pitch_data = deque([0]*max_len, maxlen=max_len)
 roll_data = deque([0]*max_len, maxlen=max_len)
+lock_datos = threading.Lock() # Candado: el hilo receptor escribe en las colas y el gráfico las lee, nunca los dos a la vez.
+
+# --- CONTADORES ---
+recibidos = 0 # Paquetes UDP que llegaron.
+invalidos = 0 # Paquetes mal formateados (no se guardan).
+perdidos = 0 # Muestras que faltan según la hora del sensor (saltos más grandes que el período normal).
+ultimo_t_sensor = None # Hora del sensor (en ms) de la última muestra, para detectar saltos.
+periodo_ms = None # Período “normal” entre muestras del sensor (se va estimando solo).
 
 fig, ax = plt.subplots()
 plt.subplots_adjust(bottom=0.2)  # espacio para botones y textbox abajo
@@ -52,8 +64,10 @@ ax.set_ylim(-180, 180) # Rango vertical: grados.
 ax.set_xlim(0, max_len) # Rango horizontal: 0 a 50 puntos.
 ax.set_xlabel('Tiempo')
 ax.set_ylabel('Grados')
-ax.legend()
+ax.legend(loc='upper left')
 ax.grid(True)
+# Texto con los contadores, dentro del gráfico (así se actualiza junto con las líneas):
+texto_contadores = ax.text(0.99, 0.02, "", transform=ax.transAxes, ha='right', va='bottom', fontsize=9)
 
 # --- ACTIVIDAD ACTUAL ---
 actividad_actual = None # No hay actividad iniciada todavía.
@@ -92,40 +106,83 @@ axbtn = plt.axes([0.65, 0.05, 0.2, 0.05])
 btn = Button(axbtn, "Registrar")
 btn.on_clicked(lambda event: nueva_actividad(None))  # Cuando clickeás el botón, llama a la misma función (como si fuera Enter).
 
-# --- FUNCION DE ANIMACIÓN ---
-def update(frame): # Esta función la llama Matplotlib todo el tiempo para actualizar el gráfico.
-    last_data = None # Variable para quedarte con el último paquete UDP (yaw,pitch,roll,ax,ay,az) recibido.
-    while True: # lee TODOS los paquetes que llegaron desde la última vez, y se queda solo con el más reciente e ignora los viejos.
+# --- HILO RECEPTOR ---
+def hora_sensor_ms(texto): # "HH:MM:SS.mmm" (millis() del sensor) -> milisegundos. Si no se puede leer, devuelve None.
+    try:
+        h, m, seg = texto.split(':')
+        return (int(h) * 3600 + int(m) * 60 + float(seg)) * 1000
+    except ValueError:
+        return None
+
+def contar_perdidos(t_ms): # Compara la hora del sensor con la de la muestra anterior para estimar cuántas se perdieron en el camino.
+    global ultimo_t_sensor, periodo_ms, perdidos
+    if t_ms is None:
+        return
+    if ultimo_t_sensor is not None:
+        paso = t_ms - ultimo_t_sensor
+        if paso > 0:
+            if periodo_ms is None or paso < periodo_ms * 1.5:
+                # Promedio que se va moviendo: aprende el período normal del sensor (no hace falta saber a cuántos Hz manda).
+                periodo_ms = paso if periodo_ms is None else 0.95 * periodo_ms + 0.05 * paso
+            else:
+                perdidos += round(paso / periodo_ms) - 1 # Un salto de 3 períodos = 2 muestras que no llegaron.
+    ultimo_t_sensor = t_ms
+
+def recibir(): # Corre en su propio hilo: lee TODOS los paquetes y los guarda en el CSV y en las colas, sin perder ninguno.
+    global recibidos, invalidos
+    ultimo_flush = time.monotonic()
+    while not detener.is_set(): # Hasta que se cierre la ventana.
         try:
             data, addr = sock.recvfrom(1024) # data → el contenido del paquete (bytes); addr → quién lo mandó (IP y puerto); 1024 → tamaño máximo del mensaje
-            last_data = data
-        except BlockingIOError: # Si no hay más datos, corta el loop.
+        except socket.timeout: # No llegó nada en 0.5 s: vuelve a revisar si hay que terminar.
+            continue
+        except OSError: # El socket se cerró.
             break
+        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3] # Hora de llegada con milisegundos (la toma apenas llega el paquete).
+        for linea in data.decode('utf-8', errors='replace').strip().splitlines(): # Normalmente es una línea por paquete.
+            campos = linea.split(',')
+            try:
+                yaw, pitch, roll, ax_val, ay_val, az_val = [float(x) for x in campos[1:]] # lo separa por comas y lo pasa a float (el primer campo es la hora del sensor).
+            except ValueError: # Si el paquete vino mal formateado, lo cuenta y lo ignora.
+                invalidos += 1
+                continue
+            recibidos += 1
+            contar_perdidos(hora_sensor_ms(campos[0]))
+            data_writer.writerow([timestamp, yaw, pitch, roll, ax_val, ay_val, az_val]) # Guarda una fila en el CSV de datos (TODAS las muestras).
+            with lock_datos: # Mete los valores nuevos en las colas (y si se llenan, se cae el más viejo).
+                yaw_data.append(yaw)
+                pitch_data.append(pitch)
+                roll_data.append(roll)
+        if time.monotonic() - ultimo_flush > 1: # Una vez por segundo fuerza la escritura a disco (por si se cuelga algo).
+            data_csv.flush()
+            ultimo_flush = time.monotonic()
+
+detener = threading.Event() # Bandera para avisarle al hilo que termine.
+hilo_receptor = threading.Thread(target=recibir, daemon=True)
+hilo_receptor.start()
 
-    if last_data is not None: # si llegó algo
-        try:
-            values = [float(x) for x in last_data.decode('utf-8').strip().split(',')[1:]] # lo convierte de bytes a texto, lo separa por comas, lo pasa a float y asigna a variables.
-            yaw, pitch, roll, ax_val, ay_val, az_val = values
-            # Mete los valores nuevos en las colas (y si hay más de 50, se cae el más viejo).
-            yaw_data.append(yaw)
-            pitch_data.append(pitch)
-            roll_data.append(roll)
-            timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3] # Hora actual con milisegundos.
-            data_writer.writerow([timestamp, yaw, pitch, roll, ax_val, ay_val, az_val]) # Guarda una fila en el CSV de datos.
-        except ValueError: # Si el paquete vino mal formateado, lo ignora.
-            pass
-
-    line_yaw.set_data(range(len(yaw_data)), yaw_data) # Eje X: 0..49, Eje Y: valores de yaw
-    line_pitch.set_data(range(len(pitch_data)), pitch_data)
-    line_roll.set_data(range(len(roll_data)), roll_data)
-    return line_yaw, line_pitch, line_roll # Devuelve las líneas para que Matplotlib las repinte.
+# --- FUNCION DE ANIMACIÓN ---
+def update(frame): # Matplotlib la llama FPS_GRAFICO veces por segundo: sólo dibuja, ya no lee el socket.
+    with lock_datos: # Copia rápida de las colas para no frenar al hilo receptor.
+        yaw, pitch, roll = list(yaw_data), list(pitch_data), list(roll_data)
+    x = range(max_len) # Eje X: 0..max_len-1
+    line_yaw.set_data(x, yaw) # Eje Y: valores de yaw
+    line_pitch.set_data(x, pitch)
+    line_roll.set_data(x, roll)
+    texto_contadores.set_text(f"recibidos: {recibidos}   perdidos: {perdidos}   inválidos: {invalidos}")
+    return line_yaw, line_pitch, line_roll, texto_contadores # Devuelve lo que cambió: con blit sólo se repinta eso.
 
 # --- ANIMACION ---
-ani = animation.FuncAnimation(fig, update, interval=5, blit=False) # Cada 20 ms llama a update(). blit=False repinta todo (más simple, menos optimización).
+# blit=True: el fondo (ejes, grilla, leyenda) se dibuja una sola vez y en cada cuadro sólo se repintan las líneas y el texto.
+ani = animation.FuncAnimation(fig, update, interval=1000 / FPS_GRAFICO, blit=True, cache_frame_data=False)
 plt.show() # Abre la ventana del gráfico y queda corriendo hasta que la cierres.
 
 # --- AL CERRAR ---
+detener.set() # Le avisa al hilo receptor que termine...
+hilo_receptor.join() # ...y espera a que lo haga (escribe lo último que haya llegado).
+sock.close()
 data_csv.close() # Cierra el CSV principal.
+print(f"Recibidos: {recibidos}, perdidos: {perdidos}, inválidos: {invalidos}")
 # cerrar última actividad si existe
 if actividad_actual is not None: # Si había una actividad activa, la cierra automáticamente al momento de salir.
     ahora = datetime.now()
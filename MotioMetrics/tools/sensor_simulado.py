@@ -0,0 +1,95 @@
+# Sensor simulado para probar la ingesta en vivo sin el MotioSensor.
+# Genera Yaw/Pitch/Roll con deriva lenta + temblor de 5 Hz y los manda al backend:
+#   --formato json     como el firmware actual: 42["message","{\"y\":..}"] (una muestra por mensaje)
+#   --formato lote     lotes JSON 'muestras' con reloj y secuencia del sensor, --por-frame muestras por mensaje
+#   --formato binario  frames 'muestras_bin' (formato_binario.py), --por-frame muestras por mensaje
+#
+# Uso (desde MotioMetrics/):
+#   python tools/sensor_simulado.py --url http://127.0.0.1:5000 --formato binario --por-frame 10
+# Necesita el cliente de python-socketio con transporte websocket (pip install "python-socketio[client]").
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+
+import numpy as np
+import socketio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from formato_binario import codificar_frame
+
+
+def muestra(t, temblor_hz=5.0, amplitud=2.0):
+    """Yaw, Pitch, Roll, Ax, Ay, Az en el instante t (segundos)"""
+    temblor = amplitud * math.sin(2 * math.pi * temblor_hz * t)
+    return (
+        30 + 10 * math.sin(2 * math.pi * 0.05 * t) + temblor,
+        5 + 0.5 * temblor,
+        -10 + 0.2 * math.sin(2 * math.pi * 0.2 * t),
+        0.01 * temblor, 0.0, 1.0
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensor simulado para MotioMetrics")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--dispositivo", default="", help="id del dispositivo (vacío = el por defecto)")
+    parser.add_argument("--formato", choices=["json", "lote", "binario"], default="json")
+    parser.add_argument("--hz", type=float, default=25.0, help="muestras por segundo")
+    parser.add_argument("--por-frame", type=int, default=1, help="muestras por mensaje (lote y binario)")
+    parser.add_argument("--duracion", type=float, default=60.0, help="segundos (0 = sin fin)")
+    parser.add_argument("--temblor-hz", type=float, default=5.0)
+    args = parser.parse_args()
+
+    url = args.url
+    if args.dispositivo:
+        url += f"?dispositivo={args.dispositivo}"
+
+    sio = socketio.Client()
+    sio.connect(url, transports=["websocket"])
+    print(f"Conectado a {args.url} ({args.formato}, {args.hz} Hz)")
+
+    periodo = 1.0 / args.hz
+    por_frame = max(1, args.por_frame) if args.formato != "json" else 1
+    inicio = time.monotonic()
+    secuencia = 0
+    pendientes_t, pendientes_v = [], []
+    try:
+        while args.duracion <= 0 or time.monotonic() - inicio < args.duracion:
+            t = secuencia * periodo
+            valores = muestra(t, args.temblor_hz)
+
+            if args.formato == "json":
+                y, p, r, ax, ay, az = valores
+                sio.emit("message", json.dumps({"y": round(y, 2), "p": round(p, 2), "r": round(r, 2),
+                                                "ax": round(ax, 3), "ay": round(ay, 3), "az": round(az, 3)}))
+            else:
+                pendientes_t.append(int(t * 1e6))
+                pendientes_v.append(valores)
+                if len(pendientes_t) >= por_frame:
+                    primera = secuencia - len(pendientes_t) + 1
+                    if args.formato == "binario":
+                        sio.emit("muestras_bin", codificar_frame(primera, np.array(pendientes_t, dtype=np.uint64),
+                                                                 pendientes_v))
+                    else:
+                        sio.emit("muestras", {"seq": primera, "t_ms": [t_us // 1000 for t_us in pendientes_t],
+                                              "m": [[round(x, 3) for x in v] for v in pendientes_v]})
+                    pendientes_t, pendientes_v = [], []
+            secuencia += 1
+
+            # Ritmo fijo (sin acumular el error de sleep)
+            espera = inicio + secuencia * periodo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sio.disconnect()
+        print(f"Enviadas {secuencia} muestras")
+
+
+if __name__ == "__main__":
+    main()
@@ -43,8 +43,26 @@ fileInput.addEventListener('change', (e) => {
 document.addEventListener('DOMContentLoaded', () => {
   // document.getElementById('btnGuardarPaciente').disabled = true; (dejar botón siempre habilitado, en el clic despues analiza si desabilitar)
   actualizarTablaHistoria();
+  mostrarAnalisisVivo();
 });
 
+// Viniendo de "Analizar" en el modo en vivo: el backend ya analizó la grabación
+// mientras se grababa (respuesta del stop), no hace falta subir el CSV
+function mostrarAnalisisVivo() {
+    const guardado = sessionStorage.getItem('analisis_vivo');
+    if (!guardado) return;
+    sessionStorage.removeItem('analisis_vivo');
+    const data = JSON.parse(guardado);
+    const nombre = new URLSearchParams(window.location.search).get('csv') || 'Grabación en vivo';
+
+    datosAnalisis = data; // Guardamos datos para el reporte
+    toggleLoadingState(false);
+    mostrarResultados(data);
+    mostrarEspectrograma(data);
+    dropzone.classList.add('success');
+    dropzone.innerHTML = `<strong>${nombre}</strong> analizado durante la grabación.`;
+}
+
 async function handleFileUpload(file) {
     if (!file.name.toLowerCase().endsWith('.csv')) {
         alert("Por favor sube un archivo .csv válido.");
@@ -149,17 +167,14 @@ async function procesarArchivoPendiente(horaInicio) {
     formData.append('file', file);
 
     try {
-        const response = await fetch(`${API_URL}/api/analizar_datos`, {
-            method: 'POST',
-            body: formData
+        // Streaming NDJSON: el RMS se va dibujando mientras el backend procesa las ventanas
+        const data = await analizarEnStreaming(formData, (progreso) => {
+            dropzone.innerHTML = `Analizando <strong>${file.name}</strong>... ${progreso}%`;
         });
-
-        if (!response.ok) throw new Error('Error en el análisis del servidor');
-
-        const data = await response.json();
         datosAnalisis = data; // Guardamos datos para el reporte
         toggleLoadingState(false);
         mostrarResultados(data);
+        mostrarEspectrograma(data); // no bloquea: se dibuja cuando llega
 
         dropzone.classList.remove('loading');
         dropzone.classList.add('success');
@@ -179,6 +194,96 @@ async function procesarArchivoPendiente(horaInicio) {
     window.filePendiente = null; // limpia
 }
 
+// Consume /api/analizar_datos_stream (una línea JSON por mensaje) y arma el mismo
+// objeto que devuelve /api/analizar_datos. Mientras tanto muestra el RMS parcial.
+async function analizarEnStreaming(formData, onProgreso) {
+    const response = await fetch(`${API_URL}/api/analizar_datos_stream`, {
+        method: 'POST',
+        body: formData
+    });
+    if (!response.ok || !response.body) throw new Error('Error en el análisis del servidor');
+
+    const data = {
+        metricas: { frecuencia_dominante: 0, psd_pico: 0, sr: 0, tiene_temblor: false },
+        graficos: { tiempo: [], rms: [], freq_x: [], freq_y: [], episodios: [] }
+    };
+    let nVentanas = 0;
+    let ventanasRecibidas = 0;
+    let terminado = false;
+
+    const procesarMensaje = (msg) => {
+        switch (msg.tipo) {
+            case 'meta':
+                data.sesion = msg.sesion; // sesión del servidor (zoom / re-análisis)
+                data.metricas.sr = msg.sr;
+                nVentanas = msg.n_ventanas;
+                break;
+            case 'ventanas':
+                data.graficos.tiempo.push(...msg.tiempo);
+                data.graficos.rms.push(...msg.rms);
+                ventanasRecibidas += msg.ventanas.length;
+                graficarRMSParcial(data.graficos.tiempo, data.graficos.rms);
+                if (onProgreso && nVentanas > 0) onProgreso(Math.round(100 * ventanasRecibidas / nVentanas));
+                break;
+            case 'episodios':
+                data.metricas.tiene_temblor = msg.tiene_temblor;
+                data.graficos.episodios = msg.episodios;
+                break;
+            case 'espectro':
+                data.metricas.frecuencia_dominante = msg.frecuencia_dominante;
+                data.metricas.psd_pico = msg.psd_pico;
+                data.graficos.freq_x = msg.freq_x;
+                data.graficos.freq_y = msg.freq_y;
+                break;
+            case 'error':
+                throw new Error(msg.error);
+            case 'fin':
+                terminado = true;
+                break;
+        }
+    };
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let pendiente = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        pendiente += decoder.decode(value, { stream: true });
+        const lineas = pendiente.split('\n');
+        pendiente = lineas.pop(); // la última puede estar incompleta
+        lineas.filter(l => l.trim()).forEach(l => procesarMensaje(JSON.parse(l)));
+    }
+    if (pendiente.trim()) procesarMensaje(JSON.parse(pendiente));
+    if (!terminado) throw new Error('El análisis se interrumpió antes de terminar');
+
+    return data;
+}
+
+// Vista previa del RMS mientras llega el streaming (mostrarResultados la redibuja al final)
+function graficarRMSParcial(tiempo, rms) {
+    const loaderChart2 = document.getElementById('loader-chart2');
+    const chartTime = document.getElementById('chartRMSTime');
+    if (loaderChart2) loaderChart2.style.display = 'none';
+    if (chartTime) chartTime.style.display = 'block';
+
+    const x = tiempo.map(t => new Date(t.includes(' ') ? t.replace(' ', 'T') : t));
+    Plotly.react('chartRMSTime', [{
+        x: x,
+        y: rms,
+        type: 'scatter',
+        mode: 'lines',
+        name: 'RMS Combinado',
+        line: { color: '#2e7cf1ff', width: 2 }
+    }], {
+        title: 'Energía del Temblor (RMS) en el Tiempo (procesando...)',
+        xaxis: { tickformat: '%H:%M:%S' },
+        yaxis: { title: 'Amplitud RMS (°)' },
+        height: 420,
+        margin: { t: 50, b: 50, l: 60, r: 30 }
+    }, {responsive: true});
+}
+
 function mostrarResultados(data) {
     // VER SI SIRVE: si horaInicioMedicion existe, se pone como label
     const labelHora = horaInicioMedicion ? ` (inicio: ${horaInicioMedicion})` : '';
@@ -397,12 +502,105 @@ function mostrarResultados(data) {
         annotations: annotations // <<< Etiquetas de amplitud (opcional, podés borrar si no querés)
     }, {responsive: true});
 
+    activarZoomRMS(data, ejeTiempo);
+
     console.log('Episodios recibidos:', episodios);
     
     // Actualizar si hay temblor (el backend devuelve "tiene_temblor" en data.metricas)
     const detectoTemblor = data.metricas.tiene_temblor || false; 
 }
 
+// Al hacer zoom en el RMS se pide al backend el tramo visible con detalle
+// (envolvente máxima de la pirámide min/max), así un burst de 10 s en una
+// grabación de horas se ve con todas sus muestras.
+function activarZoomRMS(data, ejeTiempo) {
+    const chart = document.getElementById('chartRMSTime');
+    if (!data.sesion || !ejeTiempo.length || !chart.on) return;
+
+    const t0Ms = ejeTiempo[0].getTime();
+    const aFecha = (v) => new Date(String(v).replace(' ', 'T'));
+    let ultimoPedido = 0;
+
+    if (chart.removeAllListeners) chart.removeAllListeners('plotly_relayout');
+    chart.on('plotly_relayout', async (ev) => {
+        const pedido = ++ultimoPedido;
+
+        if (ev['xaxis.autorange']) {
+            // Vista completa: volvemos a la serie diezmada original
+            Plotly.restyle(chart, { x: [ejeTiempo], y: [data.graficos.rms] }, [0]);
+            return;
+        }
+        const r0 = ev['xaxis.range[0]'] ?? (ev['xaxis.range'] || [])[0];
+        const r1 = ev['xaxis.range[1]'] ?? (ev['xaxis.range'] || [])[1];
+        if (r0 === undefined || r1 === undefined) return;
+
+        const t0 = (aFecha(r0).getTime() - t0Ms) / 1000;
+        const t1 = (aFecha(r1).getTime() - t0Ms) / 1000;
+        const ancho = chart.clientWidth || 1000;
+
+        try {
+            const res = await fetch(`${API_URL}/api/sesiones_analisis/${data.sesion}/zoom?t0=${t0}&t1=${t1}&puntos=${ancho}&series=rms`);
+            if (!res.ok || pedido !== ultimoPedido) return; // sesión vencida o llegó un zoom más nuevo
+            const zoom = await res.json();
+            Plotly.restyle(chart, {
+                x: [zoom.tiempo_s.map(t => new Date(t0Ms + t * 1000))],
+                y: [zoom.rms.max]
+            }, [0]);
+        } catch (e) {
+            console.error("Error pidiendo zoom:", e);
+        }
+    });
+}
+
+// Espectrograma (ventana x frecuencia) + frecuencia dominante de cada ventana.
+// El backend lo manda cuantizado en uint8 (dB) y en base64.
+async function mostrarEspectrograma(data) {
+    if (!data.sesion) return;
+    try {
+        const res = await fetch(`${API_URL}/api/sesiones_analisis/${data.sesion}/espectrograma`);
+        if (!res.ok) return;
+        const esp = await res.json();
+
+        const bytes = Uint8Array.from(atob(esp.potencia.datos), c => c.charCodeAt(0));
+        const { filas, columnas, db_min, db_max } = esp.potencia;
+        // Plotly espera z[frecuencia][ventana]
+        const z = esp.frecuencias.map((_, j) => {
+            const fila = new Array(filas);
+            for (let i = 0; i < filas; i++) fila[i] = db_min + bytes[i * columnas + j] / 255 * (db_max - db_min);
+            return fila;
+        });
+
+        const heatmap = {
+            x: esp.tiempo_s,
+            y: esp.frecuencias,
+            z: z,
+            type: 'heatmap',
+            colorscale: 'Viridis',
+            colorbar: { title: 'dB' },
+            name: 'Potencia'
+        };
+        const trazaFdom = {
+            x: esp.tiempo_s,
+            y: esp.f_dom.combinada,
+            mode: 'lines+markers',
+            line: { color: 'red', width: 2 },
+            marker: { size: 4 },
+            name: 'F. dominante'
+        };
+
+        Plotly.newPlot('chartEspectrograma', [heatmap, trazaFdom], {
+            title: 'Evolución de la frecuencia del temblor',
+            xaxis: { title: `Inicio de ventana (s, ventanas de ${esp.duracion_ventana} s)` },
+            yaxis: { title: 'Frecuencia (Hz)', range: [0, esp.sr / 2] },
+            height: 420,
+            margin: { t: 50, b: 50, l: 60, r: 30 },
+            showlegend: false
+        }, {responsive: true});
+    } catch (e) {
+        console.error("Error cargando espectrograma:", e);
+    }
+}
+
 // --- 2. GESTIÓN DE OBSERVACIONES ---
 
 document.getElementById('btnAddObservation').addEventListener('click', () => {
@@ -734,6 +932,7 @@ function limpiarResultados() {
     try {
         Plotly.purge('chartFreqAmp');
         Plotly.purge('chartRMSTime');
+        Plotly.purge('chartEspectrograma');
     } catch (e) {
         // Si no había gráficos creados, no pasa nada
         document.getElementById('chartFreqAmp').innerHTML = "";
@@ -8,6 +8,9 @@ const socket = io(API_URL, {
 });
 
 let chart;
+let chartEspectro;
+// Dispositivo que muestra este dashboard (?dispositivo=<id> en la URL; vacío = el por defecto)
+const DISPOSITIVO = new URLSearchParams(window.location.search).get('dispositivo') || '';
 //let pollingInterval;
 let isConnected = false;
 
@@ -35,14 +38,76 @@ function initChart() {
     });
 }
 
+// El backend manda los tiempos como epoch en ms (t_ms); se formatean recién acá
+const formatoHora = new Intl.DateTimeFormat('es-AR', {
+    timeZone: 'America/Argentina/Salta',
+    hour: '2-digit', minute: '2-digit', second: '2-digit',
+    fractionalSecondDigits: 3, hour12: false
+});
+const etiquetasHora = (tMs) => tMs.map(t => formatoHora.format(t));
+
+function initChartEspectro() {
+    const ctx = document.getElementById('liveChartEspectro').getContext('2d');
+    chartEspectro = new Chart(ctx, {
+        type: 'line',
+        data: {
+            labels: [], // Frecuencias (Hz)
+            datasets: [
+                { label: 'Yaw', data: [], borderColor: 'red', borderWidth: 2, pointRadius: 0 },
+                { label: 'Pitch', data: [], borderColor: 'orange', borderWidth: 2, pointRadius: 0 },
+                { label: 'Roll', data: [], borderColor: 'green', borderWidth: 2, pointRadius: 0 }
+            ]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            animation: false,
+            scales: { x: { title: { display: true, text: 'Hz' } } }
+        }
+    });
+}
+
+// Espectro de la última ventana, calculado en el servidor ~2 veces por segundo
+socket.on('espectro_vivo', function(data) {
+    if (!chartEspectro) return;
+    chartEspectro.data.labels = data.frecuencias.map(f => f.toFixed(1));
+    chartEspectro.data.datasets[0].data = data.psd.yaw;
+    chartEspectro.data.datasets[1].data = data.psd.pitch;
+    chartEspectro.data.datasets[2].data = data.psd.roll;
+    chartEspectro.update('none');
+    const f = data.f_dom;
+    document.getElementById('frecuenciaDominante').textContent =
+        `Frecuencia dominante: Yaw ${f.yaw} Hz · Pitch ${f.pitch} Hz · Roll ${f.roll} Hz`;
+});
+
 // Recibe datos en tiempo real del backend
 socket.on('datos_vivo', function(data) {
-    if (data.labels) {
+    if (data.t_ms) {
         updateChart(data);
     }
+    // Confirmar el frame: si este cliente se atrasa, el servidor le saltea frames
+    // y después le manda uno completo (en vez de acumularle datos viejos)
+    if (data.n !== undefined) {
+        socket.emit('ack_vivo', { dispositivo: DISPOSITIVO, n: data.n });
+    }
+});
+
+// Detección causal en el servidor, cada ~0.5 s
+socket.on('tremor_estado', function(estado) {
+    const el = document.getElementById('estadoTemblor');
+    if (!el) return;
+    if (!estado.ventana_completa) {
+        el.textContent = "Temblor: esperando datos...";
+        return;
+    }
+    el.textContent = estado.temblor
+        ? `Temblor: SÍ (RMS ${estado.rms.combinado.toFixed(2)}°)`
+        : "Temblor: no";
+    el.style.color = estado.temblor ? 'green' : '';
 });
 
 socket.on('connect', () => {
+    socket.emit('suscribir', { dispositivo: DISPOSITIVO, ack: true });
     document.getElementById('connectionStatus').textContent = "Estado: Conectado (Real Time)";
 });
 
@@ -67,7 +132,7 @@ document.getElementById('btnConnect').addEventListener('click', async () => {
             const res = await fetch(`${API_URL}/api/leer_datos`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ action: 'start', nombre_sesion: nombreSesion })
+                body: JSON.stringify({ action: 'start', nombre_sesion: nombreSesion, dispositivo: DISPOSITIVO })
             });
             
             if (res.ok) {
@@ -93,13 +158,19 @@ document.getElementById('btnConnect').addEventListener('click', async () => {
             const res = await fetch(`${API_URL}/api/leer_datos`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ action: 'stop' })
+                body: JSON.stringify({ action: 'stop', dispositivo: DISPOSITIVO })
             });
             const data = await res.json();
             window.csvGenerado = data.csv;
+            // El servidor analizó la grabación mientras llegaba: se pasa a analisis_csv.html
+            if (data.analisis) sessionStorage.setItem('analisis_vivo', JSON.stringify(data.analisis));
 
             // Descargar archivos (forzado via fetch->blob para que el navegador no bloquee)
-            await descargarArchivo(`${API_URL}/grabaciones_vivo/${data.csv}`, data.csv);
+            // (si la grabación fue larga, el servidor la partió en varios segmentos)
+            const segmentos = (data.segmentos && data.segmentos.length) ? data.segmentos : [data.csv];
+            for (const segmento of segmentos) {
+                await descargarArchivo(`${API_URL}/grabaciones_vivo/${segmento}`, segmento);
+            }
             await new Promise(r => setTimeout(r, 300));
             await descargarArchivo(`${API_URL}/grabaciones_vivo/${"Notas_" + data.csv}`, "Notas_" + data.csv);
 
@@ -117,12 +188,26 @@ document.getElementById('btnConnect').addEventListener('click', async () => {
 });
 
 // 4. Actualizar Gráfico
+// El backend manda frames "completo" (ventana entera) y "delta" (sólo muestras nuevas)
 function updateChart(data) {
-    chart.data.labels = data.labels;
-    chart.data.datasets[0].data = data.yaw;
-    chart.data.datasets[1].data = data.pitch;
-    chart.data.datasets[2].data = data.roll;
-    chart.update({duration: 0});
+    if (!chart) return;
+    if (data.tipo === 'delta') {
+        const maxLen = data.max_len || 50;
+        const agregar = (arr, nuevos) => {
+            arr.push(...nuevos);
+            if (arr.length > maxLen) arr.splice(0, arr.length - maxLen);
+        };
+        agregar(chart.data.labels, etiquetasHora(data.t_ms));
+        agregar(chart.data.datasets[0].data, data.yaw);
+        agregar(chart.data.datasets[1].data, data.pitch);
+        agregar(chart.data.datasets[2].data, data.roll);
+    } else {
+        chart.data.labels = etiquetasHora(data.t_ms);
+        chart.data.datasets[0].data = data.yaw;
+        chart.data.datasets[1].data = data.pitch;
+        chart.data.datasets[2].data = data.roll;
+    }
+    chart.update('none');
 }
 
 document.getElementById('btnNewActivity').addEventListener('click', async () => {
@@ -137,7 +222,7 @@ document.getElementById('btnNewActivity').addEventListener('click', async () =>
     await fetch(`${API_URL}/api/leer_datos`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ action: 'anotacion', descripcion: desc })
+        body: JSON.stringify({ action: 'anotacion', descripcion: desc, dispositivo: DISPOSITIVO })
     });
     
     // AGREGAR VISUALMENTE A LA LISTA
@@ -183,7 +268,10 @@ document.getElementById('modalOverlay').addEventListener('click', () => {
 });
 
 // Inicializar al cargar
-document.addEventListener('DOMContentLoaded', initChart);
+document.addEventListener('DOMContentLoaded', () => {
+    initChart();
+    initChartEspectro();
+});
 
 async function descargarArchivo(url, filename) {
     // 1. Descargamos el contenido del Backend (Render) a la memoria
@@ -4,6 +4,8 @@ import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from collections import deque
 import csv
+import time
+import threading
 from datetime import datetime
 from matplotlib.widgets import Button, TextBox
 import tkinter as tk
@@ -21,7 +23,8 @@ UDP_IP = "0.0.0.0"
 UDP_PORT = 4210
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 sock.bind((UDP_IP, UDP_PORT))
-sock.setblocking(False)
+sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)  # margen si el gráfico se atrasa
+sock.settimeout(0.5)  # para que el hilo receptor pueda terminar
 
 # --- CSV DE DATOS ---
 csv_path = f"/Users/alexasessarego/Documents/DatosPacientes/{filename}.csv"
@@ -36,10 +39,19 @@ act_writer = csv.writer(act_csv)
 act_writer.writerow(["inicio", "fin", "actividad"])
 
 # --- VARIABLES DE ANIMACIÓN ---
-max_len = 50
+max_len = 250
+FPS_GRAFICO = 30
 yaw_data = deque([0]*max_len, maxlen=max_len)
 pitch_data = deque([0]*max_len, maxlen=max_len)
 roll_data = deque([0]*max_len, maxlen=max_len)
+lock_datos = threading.Lock()
+
+# --- CONTADORES ---
+recibidos = 0
+invalidos = 0
+perdidos = 0  # estimados por saltos en la hora del sensor
+ultimo_t_sensor = None
+periodo_ms = None
 
 fig, ax = plt.subplots()
 plt.subplots_adjust(bottom=0.2)  # espacio para botones
@@ -50,8 +62,9 @@ ax.set_ylim(-180, 180)
 ax.set_xlim(0, max_len)
 ax.set_xlabel('Tiempo')
 ax.set_ylabel('Grados')
-ax.legend()
+ax.legend(loc='upper left')
 ax.grid(True)
+texto_contadores = ax.text(0.99, 0.02, "", transform=ax.transAxes, ha='right', va='bottom', fontsize=9)
 
 # --- ACTIVIDAD ACTUAL ---
 actividad_actual = None
@@ -89,39 +102,82 @@ axbtn = plt.axes([0.65, 0.05, 0.2, 0.05])
 btn = Button(axbtn, "Registrar")
 btn.on_clicked(lambda event: nueva_actividad(None))  # mismo efecto que Enter
 
-# --- FUNCION DE ANIMACIÓN ---
-def update(frame):
-    last_data = None
-    while True:
+# --- HILO RECEPTOR ---
+def hora_sensor_ms(texto):
+    try:
+        h, m, seg = texto.split(':')
+        return (int(h) * 3600 + int(m) * 60 + float(seg)) * 1000
+    except ValueError:
+        return None
+
+def contar_perdidos(t_ms):
+    global ultimo_t_sensor, periodo_ms, perdidos
+    if t_ms is None:
+        return
+    if ultimo_t_sensor is not None:
+        paso = t_ms - ultimo_t_sensor
+        if paso > 0:
+            if periodo_ms is None or paso < periodo_ms * 1.5:
+                periodo_ms = paso if periodo_ms is None else 0.95 * periodo_ms + 0.05 * paso
+            else:
+                perdidos += round(paso / periodo_ms) - 1
+    ultimo_t_sensor = t_ms
+
+def recibir():
+    # todos los paquetes van al CSV y a las colas; el gráfico sólo lee las colas
+    global recibidos, invalidos
+    ultimo_flush = time.monotonic()
+    while not detener.is_set():
         try:
             data, addr = sock.recvfrom(1024)
-            last_data = data
-        except BlockingIOError:
+        except socket.timeout:
+            continue
+        except OSError:
             break
-
-    if last_data is not None:
-        try:
-            values = [float(x) for x in last_data.decode('utf-8').strip().split(',')[1:]]
-            yaw, pitch, roll, ax_val, ay_val, az_val = values
-            yaw_data.append(yaw)
-            pitch_data.append(pitch)
-            roll_data.append(roll)
-            timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        for linea in data.decode('utf-8', errors='replace').strip().splitlines():
+            campos = linea.split(',')
+            try:
+                yaw, pitch, roll, ax_val, ay_val, az_val = [float(x) for x in campos[1:]]
+            except ValueError:
+                invalidos += 1
+                continue
+            recibidos += 1
+            contar_perdidos(hora_sensor_ms(campos[0]))
             data_writer.writerow([timestamp, yaw, pitch, roll, ax_val, ay_val, az_val])
-        except ValueError:
-            pass
+            with lock_datos:
+                yaw_data.append(yaw)
+                pitch_data.append(pitch)
+                roll_data.append(roll)
+        if time.monotonic() - ultimo_flush > 1:
+            data_csv.flush()
+            ultimo_flush = time.monotonic()
+
+detener = threading.Event()
+hilo_receptor = threading.Thread(target=recibir, daemon=True)
+hilo_receptor.start()
 
-    line_yaw.set_data(range(len(yaw_data)), yaw_data)
-    line_pitch.set_data(range(len(pitch_data)), pitch_data)
-    line_roll.set_data(range(len(roll_data)), roll_data)
-    return line_yaw, line_pitch, line_roll
+# --- FUNCION DE ANIMACIÓN ---
+def update(frame):
+    with lock_datos:
+        yaw, pitch, roll = list(yaw_data), list(pitch_data), list(roll_data)
+    x = range(max_len)
+    line_yaw.set_data(x, yaw)
+    line_pitch.set_data(x, pitch)
+    line_roll.set_data(x, roll)
+    texto_contadores.set_text(f"recibidos: {recibidos}   perdidos: {perdidos}   inválidos: {invalidos}")
+    return line_yaw, line_pitch, line_roll, texto_contadores
 
 # --- ANIMACION ---
-ani = animation.FuncAnimation(fig, update, interval=5, blit=False)
+ani = animation.FuncAnimation(fig, update, interval=1000 / FPS_GRAFICO, blit=True, cache_frame_data=False)
 plt.show()
 
 # --- AL CERRAR ---
+detener.set()
+hilo_receptor.join()
+sock.close()
 data_csv.close()
+print(f"Recibidos: {recibidos}, perdidos: {perdidos}, inválidos: {invalidos}")
 # cerrar última actividad si existe
 if actividad_actual is not None:
     ahora = datetime.now()